@@ -0,0 +1,48 @@
+# ZOA alias search: the original linear scan over command names vs. the
+# prebuilt AliasIndex, over a mix of command, fix/airway and misspelled queries
+#
+#   python benchmarks/bench_alias.py [--data-dir data] [--repeat 200]
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zoa_data import load_alias_data
+from zoa_alias import AliasIndex
+
+QUERIES = ['.SFO1LAX', 'sfolax', 'SNS', 'J84', 'OAKEY', 'LOZIT STLER3', 'RNO', '.sof1lax', 'SJC', 'ZZZZ']
+
+def linear_scan(aliases, search_string):
+    return [[k, v] for k, v in aliases.items() if search_string.upper() in k.upper()]
+
+def per_query(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    aliases = load_alias_data(os.path.join(args.data_dir, 'ZOA_Alias.txt'))
+    start = time.perf_counter()
+    index = AliasIndex(aliases)
+    # The indexes are built lazily by the first search needing them; build
+    # them here so that isn't timed as part of the first query
+    index.name_grams, index.name_deletes, index.route_ids
+    print('Index build: %.1f ms over %d aliases\n' % ((time.perf_counter() - start) * 1000, len(index)))
+
+    print('%-14s %10s %8s %10s %10s %8s' % ('Query', 'scan (ms)', 'hits', 'index (ms)', 'top-10 (ms)', 'hits'))
+    for q in QUERIES:
+        t_scan = per_query(lambda: linear_scan(aliases, q), args.repeat)
+        t_index = per_query(lambda: index.search(q), args.repeat)
+        t_top = per_query(lambda: index.search(q, limit=10), args.repeat)
+        print('%-14s %10.3f %8d %10.3f %10.3f %8d' % (q, t_scan * 1000, len(linear_scan(aliases, q)),
+                                                     t_index * 1000, t_top * 1000, len(index.search(q))))
+
+if __name__ == '__main__':
+    main()
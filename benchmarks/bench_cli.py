@@ -0,0 +1,110 @@
+# Startup benchmark for the scriptable commands (python zoa_helper.py <command>):
+# wall time of each command as a fresh process, the same over a bare
+# interpreter, and the import time over a bare interpreter (python -X importtime).
+# Weather, FlightAware routes and charts are served from local stores seeded
+# in a temporary working directory, so no network access is needed.
+#
+#   python benchmarks/bench_cli.py [--data-dir data] [--repeat 5]
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+HELPER = os.path.join(ROOT, 'zoa_helper.py')
+sys.path.insert(0, ROOT)
+
+COMMANDS = [
+    ['airport', 'KSFO'],
+    ['airline', 'SKW'],
+    ['aircraft', 'B738'],
+    ['routes', 'KSFO', 'KLAX'],
+    ['loa', 'KSFO', 'KLAX'],
+    ['alias', 'SNS'],
+    ['check', 'KSFO', 'KLAX', 'SSTIK5', 'SSTIK', 'LEGGS', 'BSR', 'J501', 'DINTY', 'IRNMN2'],
+    ['flightaware', 'KSFO', 'KLAX'],
+    ['charts', 'KSFO', '-t', 'STARS'],
+    ['metar', 'KSFO', 'KOAK'],
+    ['metar', 'KSFO', 'KOAK', '--runway-config'],
+    ['atis', 'KSFO']
+]
+
+METAR = {'raw_text': 'KSFO 181756Z 28015KT 10SM FEW010 18/12 A3001 RMK AO2', 'station_id': 'KSFO',
+         'observation_time': '2022-10-18T17:56:00Z', 'wind_dir_degrees': '280', 'wind_speed_kt': '15',
+         'flight_category': 'VFR'}
+
+def seed_stores(workdir):
+    # The local stores the commands read before going to the network, with a
+    # long expiry so every run is a hit
+    from zoa_cache import TTLCache
+    from zoa_flightaware import RouteStore
+    from zoa_charts import ChartIndex, CHART_CATEGORIES
+    os.makedirs(os.path.join(workdir, 'data'))
+    cache = TTLCache(disk_path=os.path.join(workdir, 'data', 'zoa_cache.db'))
+    for station in ['KSFO', 'KOAK']:
+        cache.set('metar', station, dict(METAR, raw_text=METAR['raw_text'].replace('KSFO', station), station_id=station), ttl=86400)
+        cache.set('atis', station, '%s ATIS INFO A 1756Z. 28015KT 10SM FEW010 18/12 A3001.' % station[1:], ttl=86400)
+    cache.close()
+    store = RouteStore(os.path.join(workdir, 'data', 'flightaware_routes.db'))
+    store.put('KSFO', 'KLAX', [{'Frequency': '120', 'Altitude': 'FL340', 'Full Route': 'SSTIK5 SSTIK LEGGS BSR J501 DINTY IRNMN2'}])
+    store.close()
+    index = ChartIndex(os.path.join(workdir, 'data', 'faa_charts.db'))
+    index.put('KSFO', {heading: {'%s %d' % (kind, i): 'https://aeronav.faa.gov/%s%d.pdf' % (kind, i) for i in range(10)}
+                       for kind, heading in CHART_CATEGORIES.items()})
+    index.close()
+
+def run(argv, workdir, env):
+    start = time.perf_counter()
+    r = subprocess.run([sys.executable] + argv, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    return time.perf_counter() - start, r
+
+def best_of(argv, workdir, env, repeat):
+    return min(run(argv, workdir, env)[0] for _ in range(repeat))
+
+def import_seconds(argv, workdir, env):
+    # Total of the top-level entries of -X importtime (cumulative microseconds)
+    r = run(['-X', 'importtime'] + argv, workdir, env)[1]
+    total = 0
+    for line in r.stderr.decode('utf8', 'replace').splitlines():
+        if line.startswith('import time:') and '|' in line:
+            self_us, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit() and not name.startswith('  '):
+                total += int(cumulative)
+    return total / 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--format', default='json', choices=['table', 'json', 'csv'])
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    workdir = tempfile.mkdtemp(prefix='zoa-cli-')
+    env = dict(os.environ)
+    try:
+        seed_stores(workdir)
+        # Build the snapshot once so no command pays for it
+        run([HELPER, 'aircraft', 'B738', '--data-dir', data_dir], workdir, env)
+        baseline = best_of(['-c', 'pass'], workdir, env, args.repeat)
+        baseline_imports = import_seconds(['-c', 'pass'], workdir, env)
+        interactive = best_of(['-c', 'import sys; sys.path.insert(0, %r); import zoa_helper' % ROOT], workdir, env, args.repeat)
+        print('interpreter: %.0f ms, interactive module imports: %.0f ms over it' % (baseline * 1000, (interactive - baseline) * 1000))
+        print('%-42s %9s %9s %11s' % ('command', 'wall ms', 'over ms', 'imports ms'))
+        for command in COMMANDS:
+            argv = [HELPER] + command + ['--format', args.format, '--data-dir', data_dir]
+            elapsed, r = run(argv, workdir, env)
+            if r.returncode:
+                print('%-42s exit %d: %s' % (' '.join(command), r.returncode, r.stderr.decode('utf8', 'replace').strip()))
+                continue
+            elapsed = best_of(argv, workdir, env, args.repeat)
+            print('%-42s %9.0f %9.0f %11.0f' % (' '.join(command)[:42], elapsed * 1000, (elapsed - baseline) * 1000,
+                                                 (import_seconds(argv, workdir, env) - baseline_imports) * 1000))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
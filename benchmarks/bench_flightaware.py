@@ -0,0 +1,76 @@
+# FlightAware IFR Route Analyzer page parsing: BeautifulSoup with
+# html.parser (the former get_flightaware_routes) vs. zoa_flightaware's
+# lxml parse of just the route table. Runs offline on pages saved with
+# `python zoa_flightaware.py --pair KSFO KLAX --save-html DIR`, or on
+# synthetic pages of a similar size and structure.
+#
+#   python benchmarks/bench_flightaware.py [--html DIR] [--pages 20]
+import io
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zoa_flightaware import parse_flightaware_routes
+
+FIXES = ['SSTIK', 'LEGGS', 'OFFSH', 'BSR', 'RZS', 'SEBBY', 'SADDE', 'ANJEE', 'IRNMN', 'HYPER', 'SYRAH',
+         'LOSHN', 'MOD', 'SNS', 'AVE', 'GMN', 'HEC', 'J501', 'Q90', 'J110', 'PYE', 'ENI', 'OAK', 'SAC']
+
+def bs4_routes(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    table_raw = soup.find('table', class_ = 'prettyTable fullWidth')
+    headers = [header.text for header in table_raw.find_all('th', class_ = 'secondaryHeader')]
+    results = [{headers[i]: cell.text for i, cell in enumerate(row.find_all('td'))} for row in table_raw.find_all('tr')]
+    return [{k: v for k, v in i.items() if k in ['Frequency', 'Altitude', 'Full Route']} for i in results if i]
+
+def synthetic_page(rng, rows=40):
+    # Navigation, scripts and ads around the route table, roughly like the real page
+    filler = ''.join('<div class="nav"><ul>%s</ul></div><script>var x%d = %r;</script>'
+                     % (''.join('<li><a href="/live/%d">Link %d</a></li>' % (j, j) for j in range(20)), i, 'x' * 400)
+                     for i in range(60))
+    body = []
+    for i in range(rows):
+        route = ' '.join('<a href="/resources/airport/%s">%s</a>' % (f, f) for f in rng.sample(FIXES, rng.randint(4, 9)))
+        body.append('<tr class="%s"><td>%d</td><td>%s</td><td>FL%d</td><td>B738</td><td>%s</td><td>%d</td></tr>'
+                    % ('smallrow1' if i % 2 else 'smallrow2', rng.randint(1, 400), 'KSFO', rng.randint(28, 41) * 10,
+                       route, rng.randint(300, 400)))
+    table = ('<table class="prettyTable fullWidth"><thead><tr><th class="mainHeader" colspan="6">IFR Routes</th></tr>'
+             '<tr><th class="secondaryHeader">Frequency</th><th class="secondaryHeader">Origin</th>'
+             '<th class="secondaryHeader">Altitude</th><th class="secondaryHeader">Aircraft</th>'
+             '<th class="secondaryHeader">Full Route</th><th class="secondaryHeader">Distance</th></tr></thead>'
+             '<tbody>%s</tbody></table>' % ''.join(body))
+    return '<html><head><title>IFR Route Analyzer</title></head><body>%s%s%s</body></html>' % (filler, table, filler)
+
+def timed(fn, pages):
+    start = time.perf_counter()
+    results = [fn(p) for p in pages]
+    return time.perf_counter() - start, results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--html', help='directory of saved route analyzer pages')
+    parser.add_argument('--pages', type=int, default=20, help='synthetic pages when --html is not given')
+    args = parser.parse_args()
+
+    if args.html:
+        pages = []
+        for name in sorted(glob.glob(os.path.join(args.html, '*.html'))):
+            with io.open(name, 'r', encoding='utf8', errors='replace') as file:
+                pages.append(file.read())
+    else:
+        rng = random.Random(13)
+        pages = [synthetic_page(rng) for i in range(args.pages)]
+
+    old_time, old = timed(bs4_routes, pages)
+    new_time, new = timed(parse_flightaware_routes, pages)
+    assert old == new, 'lxml parse differs from BeautifulSoup'
+
+    print('%d pages, %.0f KB average' % (len(pages), sum(map(len, pages)) / len(pages) / 1024.0))
+    print('%-28s %10s' % ('parser', 'ms/page'))
+    print('%-28s %10.2f' % ('BeautifulSoup html.parser', 1000 * old_time / len(pages)))
+    print('%-28s %10.2f' % ('lxml route table', 1000 * new_time / len(pages)))
+    print('speedup: %.1fx' % (old_time / new_time))
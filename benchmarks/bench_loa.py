@@ -0,0 +1,67 @@
+# LOA route check: the original per-query re.match filter over routes.csv vs.
+# LOARuleEngine, for single lookups and a batch of (departure, arrival) pairs
+#
+#   python benchmarks/bench_loa.py [--data-dir data] [--pairs 20000] [--scale 1]
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zoa_data import load_route_data
+from zoa_loa import LOARuleEngine
+
+DEPARTURES = ['KSFO', 'KOAK', 'KSJC', 'KSMF', 'KRNO', 'KFAT', 'KMRY', 'KSCK', 'KMOD', 'KSTS']
+ARRIVALS = ['KLAX', 'KSAN', 'KLAS', 'KSEA', 'KPDX', 'KSLC', 'KBUR', 'KSNA', 'KLGB', 'KPSP', 'MMSD',
+            'KBOI', 'KSMO', 'KONT', 'KSBA', 'KJFK', 'KORD', 'KDEN', 'KPHX', 'KBFL']
+
+def regex_filter(route_data, departure, arrival):
+    return [i for i in route_data if re.match(i['Departure_Regex'], departure.upper()) and re.match(i['Arrival_Regex'], arrival.upper())]
+
+def scaled_rules(route_data, scale):
+    # Simulate a larger LOA table (ZLA/ZSE/ZLC in detail) by duplicating rules
+    # under made-up arrival codes
+    rules = list(route_data)
+    for n in range(1, scale):
+        for row in route_data:
+            row = dict(row)
+            if row['Arrival_Regex'].startswith('K'):
+                row['Arrival_Regex'] = '|'.join('X%s%d' % (a[1:], n) for a in row['Arrival_Regex'].split('|'))
+            rules.append(row)
+    return rules
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--scale', type=int, default=1)
+    args = parser.parse_args()
+
+    route_data = scaled_rules(load_route_data(os.path.join(args.data_dir, 'routes.csv')), args.scale)
+    random.seed(0)
+    pairs = [(random.choice(DEPARTURES), random.choice(ARRIVALS)) for _ in range(args.pairs)]
+
+    start = time.perf_counter()
+    engine = LOARuleEngine(route_data)
+    build = time.perf_counter() - start
+    print('%d rules, engine build %.2f ms, %d pairs\n' % (len(engine), build * 1000, len(pairs)))
+
+    start = time.perf_counter()
+    expected = [regex_filter(route_data, d, a) for d, a in pairs]
+    t_regex = time.perf_counter() - start
+    start = time.perf_counter()
+    single = [engine.match(d, a) for d, a in pairs]
+    t_single = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = engine.match_batch(pairs)
+    t_batch = time.perf_counter() - start
+    assert expected == single == batch
+
+    print('%-20s %12s %14s' % ('', 'us / pair', 'pairs / s'))
+    for label, t in [('re.match filter', t_regex), ('engine.match', t_single), ('engine.match_batch', t_batch)]:
+        print('%-20s %12.2f %14.0f' % (label, t / len(pairs) * 1e6, len(pairs) / t))
+
+if __name__ == '__main__':
+    main()
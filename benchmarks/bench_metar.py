@@ -0,0 +1,96 @@
+# METAR parsing: the per-station xmltodict path (one response document per
+# station, as get_latest_metar did) vs. one bulk response parsed with
+# zoa_metar's streaming iterparse. Runs offline on a saved data server
+# response or a synthetic one.
+#
+#   python benchmarks/bench_metar.py [--xml response.xml] [--stations 500]
+import os
+import sys
+import time
+import random
+import argparse
+import xmltodict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zoa_metar import parse_metars, iter_metar_records
+
+METAR_TEMPLATE = '''  <METAR>
+    <raw_text>%(station)s 181756Z %(wdir)03d%(wspd)02dKT 10SM FEW010 SCT250 18/12 A3001 RMK AO2 SLP162 T01830122</raw_text>
+    <station_id>%(station)s</station_id>
+    <observation_time>2022-10-18T17:56:00Z</observation_time>
+    <latitude>37.62</latitude>
+    <longitude>-122.37</longitude>
+    <temp_c>18.3</temp_c>
+    <dewpoint_c>12.2</dewpoint_c>
+    <wind_dir_degrees>%(wdir)d</wind_dir_degrees>
+    <wind_speed_kt>%(wspd)d</wind_speed_kt>
+    <visibility_statute_mi>10.0</visibility_statute_mi>
+    <altim_in_hg>30.008858</altim_in_hg>
+    <sea_level_pressure_mb>1016.2</sea_level_pressure_mb>
+    <quality_control_flags>
+      <auto_station>TRUE</auto_station>
+    </quality_control_flags>
+    <sky_condition sky_cover="FEW" cloud_base_ft_agl="1000" />
+    <sky_condition sky_cover="SCT" cloud_base_ft_agl="25000" />
+    <flight_category>VFR</flight_category>
+    <metar_type>METAR</metar_type>
+    <elevation_m>3.0</elevation_m>
+  </METAR>
+'''
+
+def response(metars):
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n<response version="1.2">\n<data num_results="%d">\n%s</data>\n</response>\n'
+            % (len(metars), ''.join(metars))).encode()
+
+def synthetic_metars(count):
+    random.seed(0)
+    return [METAR_TEMPLATE % {'station': 'K%03d' % i, 'wdir': random.randrange(0, 360, 10), 'wspd': random.randrange(0, 30)}
+            for i in range(count)]
+
+def split_response(xml):
+    # Per-station documents, as the old one-request-per-station path received them
+    start_tag, end_tag = b'<METAR>', b'</METAR>'
+    docs = []
+    pos = xml.find(start_tag)
+    while pos != -1:
+        end = xml.index(end_tag, pos) + len(end_tag)
+        docs.append(response([xml[pos:end].decode()]))
+        pos = xml.find(start_tag, end)
+    return docs
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--xml', help='saved data server response (default: synthetic)')
+    parser.add_argument('--stations', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.xml:
+        with open(args.xml, 'rb') as file:
+            xml = file.read()
+    else:
+        xml = response(synthetic_metars(args.stations))
+    docs = split_response(xml)
+
+    def per_station():
+        return {m['station_id']: m for m in (xmltodict.parse(d)['response']['data']['METAR'] for d in docs)}
+    def bulk_xmltodict():
+        return {m['station_id']: m for m in xmltodict.parse(xml)['response']['data']['METAR']}
+    def bulk_iterparse():
+        return parse_metars(xml)
+
+    count = sum(1 for _ in iter_metar_records(xml))
+    print('%d METARs, %.0f KB\n' % (count, len(xml) / 1024))
+    print('%-28s %10s %12s' % ('', 'total (ms)', 'us / METAR'))
+    for label, fn in [('xmltodict, per station', per_station), ('xmltodict, bulk', bulk_xmltodict),
+                      ('iterparse, bulk', bulk_iterparse)]:
+        best = min(timed(fn) for _ in range(args.repeat))
+        print('%-28s %10.2f %12.1f' % (label, best * 1000, best / count * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# Shared data benchmark: several processes attach to the same snapshot at once
+# and each reports its attach time, lookup latency and memory. Run against the
+# memory-mapped snapshot (zoa_mmap) and a pickled copy of the same data, both
+# built into a temporary directory. Memory comes from /proc (Linux): Pss counts
+# pages shared between the processes once, split among them.
+#
+#   python benchmarks/bench_mmap.py [--data-dir data] [--processes 4] [--lookups 20000]
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import zoa_data
+import zoa_mmap
+
+DATASETS = ['airports', 'airlines', 'aircraft', 'faa_routes', 'aliases']
+
+# Record datasets the lookups can use -> field read per lookup, the first
+# one that is available is used
+LOOKUP_FIELDS = {
+    'airports' : 'name',
+    'airlines' : 'Airline',
+    'aircraft' : 'WTC'
+}
+
+def memory():
+    # kB: Rss, Pss and Private_Dirty (the process's own heap) of this process
+    fields = {}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Dirty:'):
+                fields[parts[0][:-1]] = int(parts[1])
+    return fields
+
+def child(path, datasets, lookups):
+    # Attach, look up, then wait for every other process before measuring
+    before = memory()
+    start = time.perf_counter()
+    snapshot = zoa_data.open_snapshot(os.path.dirname(path), path)
+    data = {name: snapshot.load(name) for name in datasets}
+    attach = time.perf_counter() - start
+    name = next(n for n in LOOKUP_FIELDS if n in data)
+    table, field = data[name], LOOKUP_FIELDS[name]
+    codes = random.Random(os.getpid()).choices(list(table.keys())[:5000], k=lookups)
+    start = time.perf_counter()
+    for code in codes:
+        table[code][field]
+    lookup = time.perf_counter() - start
+    print('ready', flush=True)
+    sys.stdin.readline()
+    after = memory()
+    print(json.dumps({'attach_ms': attach * 1000, 'lookup_us': lookup * 1e6 / lookups,
+                      'rss': after['Rss'], 'pss': after['Pss'], 'heap': after['Private_Dirty'] - before['Private_Dirty']}), flush=True)
+
+def build(data_dir, directory, mapped):
+    path = os.path.join(directory, zoa_data.SNAPSHOT_FILENAME)
+    encode = zoa_mmap.encode
+    if not mapped:
+        zoa_mmap.encode = lambda value: None
+    try:
+        zoa_data.build_snapshot(data_dir, path)
+    finally:
+        zoa_mmap.encode = encode
+    # open_snapshot checks the sources next to the snapshot
+    for filename, loader in zoa_data.DATASETS.values():
+        target = os.path.join(directory, filename)
+        if os.path.exists(os.path.join(data_dir, filename)) and not os.path.exists(target):
+            os.symlink(os.path.abspath(os.path.join(data_dir, filename)), target)
+    return path
+
+def run(path, datasets, processes, lookups):
+    children = [subprocess.Popen([sys.executable, __file__, '--child', path, '--lookups', str(lookups),
+                                  '--datasets'] + datasets,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+                for _ in range(processes)]
+
+    def failed(c):
+        # A child exited early (its traceback is on stderr): stop the others
+        for other in children:
+            other.kill()
+            other.wait()
+        raise SystemExit('bench_mmap.py: a benchmark process failed with exit code %d' % c.returncode)
+
+    for c in children:
+        if c.stdout.readline().strip() != 'ready':
+            failed(c)
+    results = []
+    for c in children:
+        try:
+            c.stdin.write('go\n')
+            c.stdin.flush()
+            line = c.stdout.readline()
+        except BrokenPipeError:
+            line = ''
+        if not line:
+            failed(c)
+        results.append(json.loads(line))
+        c.wait()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--lookups', type=int, default=20000)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--datasets', nargs='+', default=DATASETS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.datasets, args.lookups)
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit('bench_mmap.py needs Linux (/proc/self/smaps_rollup)')
+
+    # Datasets whose source file is missing are left out
+    datasets = [name for name in DATASETS
+                if os.path.exists(os.path.join(args.data_dir, zoa_data.DATASETS[name][0]))]
+    skipped = [name for name in DATASETS if name not in datasets]
+    if skipped:
+        print('skipped (data file missing): %s' % ', '.join(skipped))
+    if not any(name in LOOKUP_FIELDS for name in datasets):
+        sys.exit('bench_mmap.py needs one of %s' % ', '.join(zoa_data.DATASETS[n][0] for n in LOOKUP_FIELDS))
+
+    print('%-8s %10s %11s %9s %9s %9s' % ('Snapshot', 'Attach ms', 'Lookup us', 'Rss MB', 'Pss MB', 'Heap MB'))
+    with tempfile.TemporaryDirectory() as directory:
+        for label, mapped in (('pickled', False), ('mapped', True)):
+            os.mkdir(os.path.join(directory, label))
+            path = build(args.data_dir, os.path.join(directory, label), mapped)
+            results = run(path, datasets, args.processes, args.lookups)
+            def mean(key):
+                return sum(r[key] for r in results) / len(results)
+            print('%-8s %10.1f %11.2f %9.1f %9.1f %9.1f' % (label, mean('attach_ms'), mean('lookup_us'),
+                                                           mean('rss') / 1024, mean('pss') / 1024, mean('heap') / 1024))
+    print('(means over %d processes attached at the same time)' % args.processes)
+
+if __name__ == '__main__':
+    main()
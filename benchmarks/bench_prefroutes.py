@@ -0,0 +1,60 @@
+# FAA preferred routes: memory footprint and lookup latency of the original
+# dict-of-lists layout vs. the columnar FAARouteTable
+#
+#   python benchmarks/bench_prefroutes.py [--data-dir data]
+import os
+import sys
+import time
+import pickle
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zoa_data import load_FAA_route_data
+from zoa_prefroutes import load_FAA_route_table, FAA_ROUTE_DISPLAY_COLUMNS
+
+def resident_bytes(loader, filename):
+    # Measure what stays allocated after the structure is built (unpickled,
+    # as the tool does at runtime) rather than the transient parse cost
+    blob = pickle.dumps(loader(filename), pickle.HIGHEST_PROTOCOL)
+    tracemalloc.start()
+    obj = pickle.loads(blob)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+def dict_lookup(route_data, orig, dest):
+    return [{k: v for k, v in i.items() if k in FAA_ROUTE_DISPLAY_COLUMNS}
+            for i in route_data.get(orig, []) if i['Dest'] == dest]
+
+def time_lookups(fn, pairs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for orig, dest in pairs:
+            fn(orig, dest)
+    return (time.perf_counter() - start) / (repeat * len(pairs))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    filename = os.path.join(args.data_dir, 'prefroutes_db.csv')
+
+    route_dict, dict_size = resident_bytes(load_FAA_route_data, filename)
+    route_table, table_size = resident_bytes(load_FAA_route_table, filename)
+    pairs = list(route_table.pairs())
+    # Busy origins dominate real use, weight them the same way the data does
+    busy = [(o, d) for o, d in pairs if len(route_dict[o]) > 100]
+
+    print('%-22s %14s %14s' % ('', 'dict-of-lists', 'FAARouteTable'))
+    print('%-22s %13.1fM %13.1fM' % ('resident memory', dict_size / 1e6, table_size / 1e6))
+    for label, sample in [('lookup, all pairs', pairs), ('lookup, busy origins', busy)]:
+        if not sample:
+            continue
+        t_dict = time_lookups(lambda o, d: dict_lookup(route_dict, o, d), sample, args.repeat)
+        t_table = time_lookups(route_table.lookup, sample, args.repeat)
+        print('%-22s %12.2fus %12.2fus' % (label, t_dict * 1e6, t_table * 1e6))
+
+if __name__ == '__main__':
+    main()
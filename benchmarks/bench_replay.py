@@ -0,0 +1,62 @@
+# Runway configuration replay: the per-METAR path (regex + engine.recommend
+# per line, as sfo_runway_config does) vs. zoa_replay's block tokenizer and
+# vectorized evaluation. The bundled sample (a synthetic year of hourly KSFO
+# METARs from make_metar_sample.py) is repeated to the requested size.
+#
+#   python benchmarks/bench_replay.py [--archive sample.csv] [--repeat 50]
+import io
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zoa_metar import parse_raw_metar
+from zoa_runways import load_runway_engine, metar_wind
+from zoa_replay import replay
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'ksfo_metar_sample.csv')
+
+def per_metar(lines, engine):
+    labels = []
+    for line in lines:
+        metar = parse_raw_metar(line)
+        if metar and metar.get('wind_speed_kt') and metar['station_id'] in engine:
+            wind_deg, wind_kts, gust = metar_wind(metar)
+            labels.append(engine.recommend(metar['station_id'], wind_deg, wind_kts, None if gust != gust else gust))
+    return labels
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--archive', default=FIXTURE)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args()
+
+    with io.open(args.archive, 'r', encoding='utf8') as file:
+        sample = file.read()
+    text = sample * args.repeat
+    lines = sample.splitlines()
+    engine = load_runway_engine(args.data_dir)
+
+    start = time.perf_counter()
+    labels = per_metar(lines, engine)
+    per_metar_rate = len(labels) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = replay(io.StringIO(text), engine)
+    elapsed = time.perf_counter() - start
+    total = sum(r.metars for r in results.values())
+
+    # The replay must agree with the per-METAR recommendations on the sample
+    check = replay(io.StringIO(sample), engine)['KSFO']
+    expected = {}
+    for label in labels:
+        label = label[len('Use '):].split(' with')[0] if label.startswith('Use ') else label
+        expected[label] = expected.get(label, 0) + 1
+    assert expected == {l: c for l, c in zip(check.labels, check.counts) if c}, 'replay disagrees with per-METAR path'
+
+    print('%-28s %12s' % ('path', 'METARs/s'))
+    print('%-28s %12.0f' % ('per METAR (%d lines)' % len(labels), per_metar_rate))
+    print('%-28s %12.0f' % ('replay (%d lines)' % total, total / elapsed))
+    print('speedup: %.1fx' % (total / elapsed / per_metar_rate))
@@ -0,0 +1,64 @@
+# Route index: building zoa_route's RouteIndex over every route string in
+# data/ (FAA preferred routes, LOA routes, aliases), then "which routes pass
+# through fix X" and "which LOA routes does this filed route satisfy" as
+# index lookups vs. scanning the route strings.
+#
+#   python benchmarks/bench_route.py [--data-dir data] [--queries 200]
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from zoa_data import DataRegistry
+from zoa_route import build_route_index, loa_alternatives, route_tokens, LOA
+
+def scan_through(texts, fix):
+    exp = re.compile(r'(?<![A-Z0-9])%s\d?(?![A-Z0-9])' % re.escape(fix))
+    return [i for i, text in enumerate(texts) if exp.search(text.upper())]
+
+def scan_loa(loa_routes, route):
+    filed = set(route_tokens(route))
+    return [row for row in loa_routes
+            if any(groups and all(options & filed for options in groups) for groups in loa_alternatives(row['Route']))]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    data = DataRegistry(args.data_dir)
+    faa_routes, loa_routes, aliases = data.faa_routes, data.loa_routes, data.aliases
+
+    start = time.perf_counter()
+    index = build_route_index(faa_routes, loa_routes, aliases)
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(15)
+    fixes = rng.sample(sorted(t for t in index.postings if len(t) == 5), args.queries)
+    filed = [index.texts[i] for i in rng.sample(list(index.ids()), args.queries)]
+
+    start = time.perf_counter()
+    for fix in fixes:
+        index.through(fix)
+    index_through = time.perf_counter() - start
+    start = time.perf_counter()
+    for fix in fixes[:20]:
+        scan_through(index.texts, fix)
+    scan_through_time = (time.perf_counter() - start) / 20 * len(fixes)
+
+    start = time.perf_counter()
+    matched = sum(len(index.covered_by(route, LOA)) for route in filed)
+    index_loa = time.perf_counter() - start
+    start = time.perf_counter()
+    expected = sum(len(scan_loa(loa_routes, route)) for route in filed)
+    scan_loa_time = time.perf_counter() - start
+    assert matched == expected, 'index and scan disagree on LOA matches'
+
+    print('%d routes, %d distinct tokens, built in %.0f ms' % (len(index), len(index.postings), 1000 * build_time))
+    print('%-34s %12s %12s' % ('query (x%d)' % args.queries, 'scan ms', 'index ms'))
+    print('%-34s %12.1f %12.2f' % ('routes through fix', 1000 * scan_through_time, 1000 * index_through))
+    print('%-34s %12.1f %12.2f' % ('LOA routes covered by a route', 1000 * scan_loa_time, 1000 * index_loa))
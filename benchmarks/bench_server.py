@@ -0,0 +1,160 @@
+# Load test for zoa_server.py: concurrent clients hit a mix of lookup,
+# route and weather endpoints for a fixed time and the harness reports
+# requests/s and latency percentiles per endpoint. By default the API server
+# is started as a separate process with its weather requests going to
+# benchmarks/standin.py, so no network access is needed; --url targets a
+# server that is already running.
+#
+#   python benchmarks/bench_server.py [--clients 16] [--duration 10] [--delay 0.3] [--url http://127.0.0.1:8080]
+import os
+import sys
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from zoa_data import DataRegistry
+import standin
+
+# Endpoint kind -> relative weight in the request mix
+MIX = {
+    'airport'  : 30,
+    'airline'  : 15,
+    'aircraft' : 15,
+    'aliases'  : 10,
+    'faa'      : 10,
+    'loa'      : 8,
+    'check'    : 7,
+    'weather'  : 5
+}
+
+def sample_paths(data, rng, n=200):
+    # A fixed pool of request paths per kind, so the response cache sees a
+    # realistic mix of repeated and new requests. Kinds whose dataset is
+    # missing from the data directory get no paths.
+    def sample(name, keys):
+        if not data.available(name):
+            return []
+        keys = sorted(keys())
+        return rng.sample(keys, min(n, len(keys)))
+    airports = sample('airports', lambda: data.airports)
+    airlines = sample('airlines', lambda: data.airlines)
+    aircraft = sample('aircraft', lambda: data.aircraft)
+    pairs = sample('faa_routes', lambda: data.faa_routes.pairs())
+    queries = ['SFO', 'OAK', 'SJC', 'LAX', 'SUNOL', 'V334', 'BSR', 'SSTIK', 'SFO1', 'OAKLAX', 'MOD', 'SNS']
+    majors = ['KSFO', 'KOAK', 'KSJC', 'KSMF', 'KRNO']
+    checkable = all(data.available(name) for name in ('faa_routes', 'loa_routes', 'aliases'))
+    return {
+        'airport'  : ['/api/airports/%s' % a for a in airports],
+        'airline'  : ['/api/airlines/%s' % a for a in airlines],
+        'aircraft' : ['/api/aircraft/%s' % a for a in aircraft],
+        'aliases'  : ['/api/aliases?q=%s&limit=20' % q for q in queries] if data.available('aliases') else [],
+        'faa'      : ['/api/routes/faa/K%s/K%s' % p for p in pairs],
+        'loa'      : ['/api/routes/loa/%s/KLAX' % a for a in majors] if data.available('loa_routes') else [],
+        'check'    : ['/api/routes/check/K%s/K%s?route=%s' % (o, d, r['Route String'].replace(' ', '+'))
+                      for o, d in pairs[:50] for r in data.faa_routes.lookup(o, d)[:1]] if checkable else [],
+        'weather'  : ['/api/weather/%s' % a for a in majors]
+    }
+
+def client(base, paths, kinds, weights, deadline, results, seed):
+    rng = random.Random(seed)
+    session = requests.Session()
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        path = rng.choice(paths[kind])
+        start = time.perf_counter()
+        try:
+            ok = session.get(base + path, timeout=30).status_code < 500
+        except requests.RequestException:
+            ok = False
+        results.append((kind, time.perf_counter() - start, ok))
+    session.close()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(data_dir, upstream, extra_args=()):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'zoa_server.py'), '--port', str(port),
+                                '--data-dir', data_dir, '--weather-standin', standin.base_url(upstream)] + list(extra_args),
+                               cwd=ROOT, stdout=subprocess.DEVNULL)
+    base = 'http://127.0.0.1:%d' % port
+    for i in range(600):
+        try:
+            requests.get(base + '/api/health', timeout=1)
+            return process, base
+        except requests.RequestException:
+            if process.poll() is not None:
+                raise SystemExit('zoa_server.py exited with %d' % process.returncode)
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit('zoa_server.py did not start')
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+def run(args, base):
+    data = DataRegistry(args.data_dir)
+    paths = sample_paths(data, random.Random(17))
+    skipped = [k for k in MIX if not paths[k]]
+    if skipped:
+        print('skipped (data file missing): %s' % ', '.join(skipped))
+    kinds = [k for k in MIX if paths[k]]
+    weights = [MIX[k] for k in kinds]
+
+    results = []
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=client, args=(base, paths, kinds, weights, deadline, results, i))
+               for i in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    print('%d clients, %.1fs: %d requests, %.0f req/s, %d errors' % (
+        args.clients, elapsed, len(results), len(results) / elapsed, sum(1 for r in results if not r[2])))
+    print('%-10s %8s %9s %9s %9s %9s' % ('endpoint', 'requests', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for kind in kinds + ['all']:
+        latencies = sorted(r[1] for r in results if kind == 'all' or r[0] == kind)
+        if latencies:
+            print('%-10s %8d %9.1f %9.1f %9.1f %9.1f' % (kind, len(latencies), 1000 * percentile(latencies, 50),
+                  1000 * percentile(latencies, 90), 1000 * percentile(latencies, 99), 1000 * latencies[-1]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--delay', type=float, default=0.3, help='stand-in upstream latency in seconds')
+    parser.add_argument('--url', help='load test a running server instead of starting one')
+    parser.add_argument('--gevent', action='store_true', help='start the server with --gevent')
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args()
+
+    upstream = process = None
+    try:
+        if args.url:
+            base = args.url.rstrip('/')
+        else:
+            upstream = standin.start(delay=args.delay)
+            process, base = start_server(os.path.abspath(args.data_dir), upstream, ['--gevent'] if args.gevent else [])
+        run(args, base)
+        if upstream:
+            print('upstream requests: %d' % upstream.requests)
+    finally:
+        # The server inherits stderr, so it has to be stopped even when the
+        # benchmark fails or it keeps the caller's pipe open
+        if process:
+            process.terminate()
+            process.wait()
+        if upstream:
+            upstream.shutdown()
+            upstream.server_close()
@@ -0,0 +1,51 @@
+# Startup benchmark: cold CSV/TXT parse of every dataset vs. loading the
+# precompiled snapshot built by zoa_data.py
+#
+#   python benchmarks/bench_startup.py [--data-dir data] [--repeat 5]
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import zoa_data
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    snapshot = zoa_data.open_snapshot(args.data_dir)
+
+    print('%-12s %12s %12s %8s' % ('Dataset', 'CSV (ms)', 'Snapshot (ms)', 'Speedup'))
+    total_csv = 0
+    total_snap = 0
+    for name, (filename, loader) in zoa_data.DATASETS.items():
+        full_filename = os.path.join(args.data_dir, filename)
+        if not os.path.exists(full_filename) or name not in snapshot:
+            print('%-12s skipped: %s not found' % (name, full_filename))
+            continue
+        csv_time = best_of(lambda: loader(full_filename), args.repeat)
+        snap_time = best_of(lambda: zoa_data.open_snapshot(args.data_dir).load(name), args.repeat)
+        total_csv += csv_time
+        total_snap += snap_time
+        print('%-12s %12.1f %12.1f %7.1fx' % (name, csv_time * 1000, snap_time * 1000, csv_time / snap_time))
+
+    # Time-to-prompt: opening (and validating) the snapshot without loading any dataset
+    open_time = best_of(lambda: zoa_data.open_snapshot(args.data_dir), args.repeat)
+    if total_snap:
+        print('%-12s %12.1f %12.1f %7.1fx' % ('total', total_csv * 1000, total_snap * 1000, total_csv / total_snap))
+    print('Snapshot open/validate only: %.2f ms' % (open_time * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+# Offline benchmark suite: every pipeline timed end to end without network
+# access. Upstream responses are replayed from the recorded fixtures
+# (record_fixtures.py) by the stand-in server (standin.py) with no added
+# latency, so the numbers are this code's own cost.
+#
+#   loaders      the six data loaders on the files in --data-dir
+#   lookups      alias search, FAA preferred route, LOA and code lookups over synthetic query mixes
+#   flightaware  route analyzer fetch + parse (fetch_flightaware_routes), and the parse alone
+#   charts       NFDC airport page fetch + parse (fetch_chart_page), and the parse alone
+#   weather      bulk METAR and D-ATIS fetches, METAR parsing and sfo_runway_config
+#
+# Each benchmark reports throughput, latency percentiles and the peak memory
+# allocated during one pass (tracemalloc). Results are compared with the stored
+# baseline and the run fails (exit status 1) when a metric is worse by more
+# than --tolerance. Baselines are machine specific: store one with
+# --save-baseline before changing code. Run from the repository root.
+#
+#   python benchmarks/bench_suite.py [--only lookups] [--save-baseline] [--tolerance 0.25]
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import standin
+from record_fixtures import FIXTURES, PAIRS, AIRPORTS
+from zoa_data import DATASETS, DERIVED, derived_sources
+
+MIN_CALLS = 5
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A metric regresses when it is worse than the baseline by more than the
+# tolerance and, for latencies and memory, by more than this much
+HIGHER_IS_BETTER = ['ops_per_s']
+LOWER_IS_BETTER = ['p50_ms', 'p90_ms', 'peak_kb']
+ABSOLUTE_SLACK = {
+    'p50_ms'  : 0.05,
+    'p90_ms'  : 0.05,
+    'peak_kb' : 64
+}
+
+class Context:
+    # What the benchmarks share: datasets and indexes, a stand-in serving the
+    # fixtures and one HTTP session to it. Datasets are read with their loaders
+    # (not the snapshot), so a missing data file only skips what needs it.
+    def __init__(self, data_dir, fixtures, seed=22):
+        self.data_dir = data_dir
+        self._data = {}
+        self.rng = random.Random(seed)
+        self.upstream = standin.start(delay=0, fixtures=fixtures)
+        standin.point_all_at(self.upstream)
+        self.fixtures = self.upstream.fixtures
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def get(self, name):
+        if name not in self._data:
+            if name in DERIVED:
+                self._data[name] = DERIVED[name][1](*[self.get(s) for s in derived_sources(name)])
+            else:
+                filename, loader = DATASETS[name]
+                self._data[name] = loader(os.path.join(self.data_dir, filename))
+        return self._data[name]
+
+    def fixture(self, kind, name):
+        import gzip
+        return gzip.decompress(self.fixtures[(kind, name)])
+
+# Setups return (fn, items) with fn called once per item in each pass, or a
+# string saying why the benchmark was skipped
+
+def loader_setup(name):
+    def setup(ctx):
+        filename, loader = DATASETS[name]
+        path = os.path.join(ctx.data_dir, filename)
+        if not os.path.exists(path):
+            return '%s not found' % path
+        return loader, [path]
+    return setup
+
+def alias_setup(ctx):
+    aliases = ctx.get('aliases')
+    commands = sorted(aliases)
+    words = sorted({w for text in aliases.values() for w in text.split() if len(w) > 2})
+    queries = []
+    for i in range(1000):
+        kind = ctx.rng.random()
+        if kind < 0.4:
+            queries.append(ctx.rng.choice(commands))
+        elif kind < 0.5:
+            # Partial command as typed
+            command = ctx.rng.choice(commands)
+            queries.append(command[:ctx.rng.randint(2, max(2, len(command)))])
+        elif kind < 0.85:
+            queries.append(ctx.rng.choice(words))
+        else:
+            # Two adjacent characters swapped
+            word = list(ctx.rng.choice(commands))
+            i = ctx.rng.randrange(len(word) - 1)
+            word[i], word[i + 1] = word[i + 1], word[i]
+            queries.append(''.join(word))
+    index = ctx.get('alias_index')
+    return (lambda q: index.search(q, 50)), queries
+
+def faa_setup(ctx):
+    faa_routes = ctx.get('faa_routes')
+    pairs = sorted(faa_routes.pairs())
+    origins = sorted({o for o, d in pairs})
+    # Mostly pairs with routes, some without
+    queries = [ctx.rng.choice(pairs) if ctx.rng.random() < 0.8 else (ctx.rng.choice(origins), ctx.rng.choice(origins))
+               for i in range(5000)]
+    return (lambda pair: faa_routes.lookup(*pair)), queries
+
+def loa_setup(ctx):
+    from zoa_metar import ZOA_TOWERED
+    engine = ctx.get('loa_engine')
+    arrivals = sorted({row['Arrival_Regex'] for row in ctx.get('loa_routes') if row['Arrival_Regex'].isalnum()})
+    queries = [(ctx.rng.choice(ZOA_TOWERED), ctx.rng.choice(arrivals)) for i in range(5000)]
+    return (lambda pair: engine.match(*pair)), queries
+
+def codes_setup(ctx):
+    # As-you-type prefixes of airline names and callsigns
+    airlines = ctx.get('airlines')
+    index = ctx.get('airline_search')
+    names = [row.get('Call sign') or row['Airline'] for row in airlines.values()]
+    queries = [name[:ctx.rng.randint(1, len(name))] for name in ctx.rng.sample(names, min(1000, len(names)))]
+    return (lambda q: index.search(q, 12)), queries
+
+def flightaware_fetch_setup(ctx):
+    from zoa_flightaware import fetch_flightaware_routes
+    return (lambda pair: fetch_flightaware_routes(pair[0], pair[1], ctx.session)), PAIRS
+
+def flightaware_parse_setup(ctx):
+    from zoa_flightaware import parse_flightaware_routes
+    return parse_flightaware_routes, [ctx.fixture('flightaware', '%s-%s.html' % pair).decode('utf8') for pair in PAIRS]
+
+def charts_fetch_setup(ctx):
+    from zoa_charts import fetch_chart_page
+    return (lambda airport: fetch_chart_page(airport, ctx.session)), AIRPORTS
+
+def charts_parse_setup(ctx):
+    from zoa_charts import parse_chart_page
+    return parse_chart_page, [ctx.fixture('nfdc', '%s.html' % airport).decode('utf8') for airport in AIRPORTS]
+
+def metar_fetch_setup(ctx):
+    from zoa_wx import WeatherClient
+    client = WeatherClient(cache=None)
+    return client.fetch_metars, [AIRPORTS]
+
+def atis_fetch_setup(ctx):
+    from zoa_wx import WeatherClient
+    client = WeatherClient(cache=None)
+    return client.fetch_atis, AIRPORTS
+
+def metar_parse_setup(ctx):
+    # One bulk response of 500 stations, as a whole-ARTCC refresh gets
+    from zoa_metar import parse_metars
+    from bench_metar import response, synthetic_metars
+    return parse_metars, [response(synthetic_metars(500))]
+
+def runway_setup(ctx):
+    from zoa_wx import sfo_runway_config
+    from zoa_metar import parse_metars
+    from bench_metar import response, synthetic_metars
+    metars = list(parse_metars(response(synthetic_metars(500))).values())
+    return (lambda metar: sfo_runway_config(metar, print_table=False)), metars
+
+BENCHMARKS = [('loaders.%s' % name, loader_setup(name)) for name in DATASETS] + [
+    ('lookups.alias', alias_setup),
+    ('lookups.faa', faa_setup),
+    ('lookups.loa', loa_setup),
+    ('lookups.codes', codes_setup),
+    ('flightaware.fetch', flightaware_fetch_setup),
+    ('flightaware.parse', flightaware_parse_setup),
+    ('charts.fetch', charts_fetch_setup),
+    ('charts.parse', charts_parse_setup),
+    ('weather.metars', metar_fetch_setup),
+    ('weather.atis', atis_fetch_setup),
+    ('weather.metar_parse', metar_parse_setup),
+    ('weather.sfo_runway_config', runway_setup)
+]
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+def measure(fn, items, min_seconds, min_calls=MIN_CALLS):
+    # Passes over items until min_seconds have gone by and at least min_calls
+    # were made, each call timed
+    latencies = []
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            t = time.perf_counter()
+            fn(item)
+            latencies.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds and len(latencies) >= min_calls:
+            break
+    latencies.sort()
+    return {'ops_per_s': len(latencies) / elapsed, 'p50_ms': 1000 * percentile(latencies, 50),
+            'p90_ms': 1000 * percentile(latencies, 90), 'p99_ms': 1000 * percentile(latencies, 99), 'calls': len(latencies)}
+
+def peak_kb(fn, items):
+    # Peak memory allocated during one pass
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for item in items:
+            fn(item)
+        return tracemalloc.get_traced_memory()[1] / 1024.0
+    finally:
+        tracemalloc.stop()
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in HIGHER_IS_BETTER:
+            if metrics[metric] < base[metric] * (1 - tolerance):
+                found.append((name, metric, base[metric], metrics[metric]))
+        for metric in LOWER_IS_BETTER:
+            if metrics[metric] > base[metric] * (1 + tolerance) and metrics[metric] - base[metric] > ABSOLUTE_SLACK[metric]:
+                found.append((name, metric, base[metric], metrics[metric]))
+    return found
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--fixtures', default=FIXTURES, help='recorded upstream responses (record_fixtures.py)')
+    parser.add_argument('--only', action='append', help='run benchmarks starting with this name (repeatable)')
+    parser.add_argument('--min-seconds', type=float, default=1.0, help='minimum time spent on each benchmark')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed fraction a metric may be worse (default: %(default)s)')
+    args = parser.parse_args()
+
+    ctx = Context(args.data_dir, args.fixtures)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            stored = json.load(file)
+        if stored.get('python') != platform.python_version():
+            print('Baseline was stored with Python %s, this is %s' % (stored.get('python'), platform.python_version()))
+        baseline = stored['results']
+
+    results = {}
+    print('%-28s %10s %9s %9s %9s %10s %8s' % ('benchmark', 'ops/s', 'p50 ms', 'p90 ms', 'p99 ms', 'peak KB', 'vs base'))
+    for name, setup in BENCHMARKS:
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        prepared = setup(ctx)
+        if isinstance(prepared, str):
+            print('%-28s skipped: %s' % (name, prepared))
+            continue
+        fn, items = prepared
+        metrics = measure(fn, items, args.min_seconds)
+        metrics['peak_kb'] = peak_kb(fn, items)
+        results[name] = metrics
+        change = ''
+        if name in baseline:
+            change = '%+.0f%%' % (100.0 * (metrics['ops_per_s'] / baseline[name]['ops_per_s'] - 1))
+        print('%-28s %10.1f %9.3f %9.3f %9.3f %10.0f %8s' % (name, metrics['ops_per_s'], metrics['p50_ms'], metrics['p90_ms'],
+                                                          metrics['p99_ms'], metrics['peak_kb'], change))
+    print('upstream requests: %d' % ctx.upstream.requests)
+
+    if args.save_baseline:
+        if os.path.exists(args.baseline):
+            # Benchmarks not run this time keep their stored results
+            with open(args.baseline) as file:
+                results = dict(json.load(file)['results'], **results)
+        with open(args.baseline, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, file, indent=1, sort_keys=True)
+        print('Baseline saved to %s' % args.baseline)
+        return 0
+
+    if not baseline:
+        print('No baseline at %s (store one with --save-baseline)' % args.baseline)
+        return 0
+    found = regressions(results, baseline, args.tolerance)
+    for name, metric, base, value in found:
+        print('REGRESSION %s %s: %.3f -> %.3f' % (name, metric, base, value))
+    return 1 if found else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Writes a reproducible year of hourly KSFO METARs in the IEM ASOS archive
+# export format (station,valid,metar) for bench_replay.py and zoa_replay.py.
+# The winds are synthetic: mostly the afternoon westerly sea breeze, calm or
+# light nights, and a few southerly frontal days in winter.
+#
+#   python benchmarks/make_metar_sample.py [-o benchmarks/fixtures/ksfo_metar_sample.csv]
+import io
+import os
+import random
+import datetime
+import argparse
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'ksfo_metar_sample.csv')
+
+def wind_group(rng, when, frontal):
+    if frontal:
+        wdir, wspd = rng.randint(14, 21) * 10, rng.randint(10, 28)
+    elif 11 <= when.hour <= 23:
+        wdir, wspd = rng.randint(27, 31) * 10, rng.randint(8, 25)
+    else:
+        wdir, wspd = rng.randint(0, 35) * 10, rng.randint(0, 8)
+    if wspd == 0:
+        return '00000KT'
+    if wspd <= 5 and rng.random() < 0.3:
+        return 'VRB%02dKT' % wspd
+    if wspd >= 15 and rng.random() < 0.4:
+        return '%03d%02dG%02dKT' % (wdir or 360, wspd, wspd + rng.randint(6, 12))
+    return '%03d%02dKT' % (wdir or 360, wspd)
+
+def sample_lines(year=2021, seed=11):
+    rng = random.Random(seed)
+    when = datetime.datetime(year, 1, 1, 0, 56)
+    frontal = False
+    while when.year == year:
+        if when.hour == 0:
+            frontal = when.month in (11, 12, 1, 2, 3) and rng.random() < 0.15
+        temp = rng.randint(8, 22)
+        yield 'SFO,%s,KSFO %sZ %s 10SM FEW012 %02d/%02d A30%02d RMK AO2' % (
+            when.strftime('%Y-%m-%d %H:%M'), when.strftime('%d%H%M'), wind_group(rng, when, frontal),
+            temp, temp - rng.randint(2, 8), rng.randint(0, 20))
+        when += datetime.timedelta(hours=1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', default=FIXTURE)
+    parser.add_argument('--year', type=int, default=2021)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+    with io.open(args.output, 'w', encoding='utf8', newline='\n') as file:
+        file.write('station,valid,metar\n')
+        for line in sample_lines(args.year, args.seed):
+            file.write(line + '\n')
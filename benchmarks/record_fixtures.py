@@ -0,0 +1,98 @@
+# Records upstream responses for the offline benchmark suite (bench_suite.py)
+# and the stand-in server (standin.py --fixtures) into
+# benchmarks/fixtures/upstream, gzipped as the services send them:
+#
+#   flightaware/KSFO-KLAX.html.gz   FlightAware IFR Route Analyzer page
+#   nfdc/KSFO.html.gz               NFDC airport page (chart links)
+#   datis/KSFO.json.gz              clowd.io D-ATIS response
+#   metar/KSFO.xml.gz               aviationweather.gov data server response
+#
+# --synthetic writes look-alike responses instead (same structure and about the
+# same size) for machines without network access; the bundled fixtures were
+# made that way. Re-record on a connected machine before tuning against them.
+#
+#   python benchmarks/record_fixtures.py [--synthetic] [--out benchmarks/fixtures/upstream]
+import io
+import os
+import sys
+import gzip
+import json
+import random
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from zoa_wx import ZOA_MAJORS
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'upstream')
+
+# City pairs with FlightAware pages, and airports with NFDC pages, D-ATIS and METARs
+PAIRS = [('KSFO', 'KLAX'), ('KOAK', 'KLAS'), ('KSJC', 'KSEA'), ('KSMF', 'KPHX')]
+AIRPORTS = ZOA_MAJORS
+
+CHART_TYPES = {
+    'Departure Procedure (DP) Charts'            : ['SSTIK', 'GNNRR', 'TRUKN', 'WESLA', 'NIITE', 'PORTE', 'SAHEY'],
+    'Standard Terminal Arrival (STAR) Charts'    : ['BDEGA', 'DYAMD', 'SERFR', 'STLER', 'GOLDN', 'ALWYS', 'OAKES'],
+    'Instrument Approach Procedure (IAP) Charts' : ['ILS OR LOC RWY %s' % r for r in ('28L', '28R', '19L', '10R', '12', '30')] +
+                                                   ['RNAV (GPS) RWY %s' % r for r in ('28L', '28R', '19L', '19R', '10L', '10R', '1L', '1R')]
+}
+
+def fixture_path(out, kind, name):
+    return os.path.join(out, kind, name + '.gz')
+
+def save(out, kind, name, body):
+    os.makedirs(os.path.join(out, kind), exist_ok=True)
+    # mtime=0 so re-recording identical responses leaves the files unchanged
+    with io.open(fixture_path(out, kind, name), 'wb') as file:
+        file.write(gzip.compress(body, mtime=0))
+
+def synthetic_chart_page(rng, airport):
+    filler = ''.join('<div class="panel"><p>%s</p><table><tr><td>%s</td></tr></table></div>' % ('x' * 300, 'y' * 200)
+                     for i in range(40))
+    sections = []
+    for heading, names in CHART_TYPES.items():
+        links = ''.join('<span><a href="https://aeronav.faa.gov/d-tpp/2210/%05d%s.PDF">%s</a><br></span>'
+                        % (rng.randrange(100000), name.replace(' ', ''), name) for name in names)
+        sections.append('<h3>%s</h3>%s' % (heading, links))
+    return ('<html><head><title>%s Airport Data</title></head><body>%s<div id="charts">%s<h3>Notes</h3><p>none</p></div>%s</body></html>'
+            % (airport, filler, ''.join(sections), filler))
+
+def synthetic(out):
+    from bench_flightaware import synthetic_page
+    from bench_metar import METAR_TEMPLATE, response
+    rng = random.Random(22)
+    for departure, arrival in PAIRS:
+        save(out, 'flightaware', '%s-%s.html' % (departure, arrival), synthetic_page(rng).replace('KSFO', departure).encode('utf8'))
+    for airport in AIRPORTS:
+        save(out, 'nfdc', '%s.html' % airport, synthetic_chart_page(rng, airport).encode('utf8'))
+        atis = '%s ATIS INFO %s %02d56Z. %03d%02dKT 10SM FEW010 18/12 A3001. SIMUL APCHS IN USE. NOTAMS... ADVS YOU HAVE INFO %s.' % (
+            airport[1:], rng.choice('ABCDEFGH'), rng.randrange(24), rng.randrange(0, 360, 10), rng.randrange(30), 'A')
+        save(out, 'datis', '%s.json' % airport, json.dumps([{'airport': airport, 'type': 'combined', 'code': 'A', 'datis': atis,
+                                                              'time': '1756', 'updatedAt': '2022-10-18T17:56:00Z'}]).encode('utf8'))
+        metar = METAR_TEMPLATE % {'station': airport, 'wdir': rng.randrange(0, 360, 10), 'wspd': rng.randrange(0, 30)}
+        save(out, 'metar', '%s.xml' % airport, response([metar]))
+
+def record(out):
+    import requests
+    import zoa_wx
+    from zoa_flightaware import flightaware_url
+    from zoa_charts import NFDC_URL
+    session = requests.Session()
+    def fetch(url):
+        r = session.get(url, timeout=(3.05, 30))
+        r.raise_for_status()
+        return r.content
+    for departure, arrival in PAIRS:
+        save(out, 'flightaware', '%s-%s.html' % (departure, arrival), fetch(flightaware_url(departure, arrival)))
+    for airport in AIRPORTS:
+        save(out, 'nfdc', '%s.html' % airport, fetch(NFDC_URL % airport))
+        save(out, 'datis', '%s.json' % airport, fetch(zoa_wx.DATIS_URL + airport))
+        save(out, 'metar', '%s.xml' % airport, fetch(zoa_wx.metar_url(airport)))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--synthetic', action='store_true', help='generate look-alike responses instead of fetching')
+    parser.add_argument('--out', default=FIXTURES)
+    args = parser.parse_args()
+    (synthetic if args.synthetic else record)(args.out)
+    print('Fixtures written to %s' % args.out)
@@ -0,0 +1,130 @@
+# Local stand-in for the upstream services (D-ATIS API, the aviationweather.gov
+# data server, FlightAware and NFDC) so benchmarks and load tests run offline
+# with a controlled latency. With fixtures (record_fixtures.py) it replays the
+# recorded responses; weather for stations without one, and without fixtures
+# all weather, comes from templates of the same shape as the real responses.
+#
+#   python benchmarks/standin.py [--port 8765] [--delay 0.3] [--fixtures benchmarks/fixtures/upstream]
+#
+# In-process use: server = start(port=0, delay=0.3); point_weather_at(server)
+# or point_all_at(server)
+import os
+import re
+import glob
+import gzip
+import json
+import time
+import argparse
+import threading
+import urllib.parse
+import http.server
+
+METAR_TEMPLATE = ('<METAR><raw_text>%(station)s 181756Z 28015KT 10SM FEW010 18/12 A3001 RMK AO2</raw_text>'
+                  '<station_id>%(station)s</station_id><observation_time>2022-10-18T17:56:00Z</observation_time>'
+                  '<temp_c>18.3</temp_c><dewpoint_c>12.2</dewpoint_c><wind_dir_degrees>280</wind_dir_degrees>'
+                  '<wind_speed_kt>15</wind_speed_kt><visibility_statute_mi>10.0</visibility_statute_mi>'
+                  '<altim_in_hg>30.008858</altim_in_hg><sky_condition sky_cover="FEW" cloud_base_ft_agl="1000" />'
+                  '<flight_category>VFR</flight_category><metar_type>METAR</metar_type></METAR>')
+
+METAR_EXP = re.compile(br'<METAR>.*?</METAR>', re.S)
+
+def load_fixtures(path):
+    # {(kind, name): gzipped body}, e.g. ('flightaware', 'KSFO-KLAX.html')
+    fixtures = {}
+    for filename in glob.glob(os.path.join(path, '*', '*.gz')):
+        with open(filename, 'rb') as file:
+            fixtures[(os.path.basename(os.path.dirname(filename)), os.path.basename(filename)[:-3])] = file.read()
+    return fixtures
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; with Nagle on, a keep-alive client
+    # waits out a delayed ACK (~40 ms) on every response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        fixtures = self.server.fixtures
+        if url.path.startswith('/api/'):
+            station = url.path[len('/api/'):].upper()
+            content_type = 'application/json'
+            body = fixtures.get(('datis', station + '.json'))
+            if body is None:
+                body = json.dumps([{'airport': station, 'type': 'combined', 'code': 'A',
+                                    'datis': '%s ATIS INFO A 1756Z. 28015KT 10SM FEW010 18/12 A3001.' % station[1:]}]).encode('utf8')
+        elif url.path.startswith('/flightaware'):
+            content_type = 'text/html'
+            body = fixtures.get(('flightaware', '%s-%s.html' % (query.get('origin', [''])[0], query.get('destination', [''])[0])))
+        elif url.path.startswith('/nfdc'):
+            content_type = 'text/html'
+            body = fixtures.get(('nfdc', '%s.html' % query.get('airportId', [''])[0].upper()))
+        else:
+            stations = query.get('stationString', [''])[0].split(',')
+            content_type = 'text/xml'
+            body = b'<response><data num_results="%d">%s</data></response>' % (len(stations), b''.join(self.metar(s) for s in stations if s))
+        if body is None:
+            self.send_error(404)
+            return
+        gzipped = body[:2] == b'\x1f\x8b'
+        if gzipped and 'gzip' not in self.headers.get('Accept-Encoding', ''):
+            body = gzip.decompress(body)
+            gzipped = False
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def metar(self, station):
+        recorded = self.server.fixtures.get(('metar', station + '.xml'))
+        if recorded is None:
+            return (METAR_TEMPLATE % {'station': station}).encode('utf8')
+        return b''.join(METAR_EXP.findall(gzip.decompress(recorded)))
+
+    def log_message(self, *args):
+        pass
+
+def start(host='127.0.0.1', port=0, delay=0.3, fixtures=None):
+    # Serves on a daemon thread; port 0 picks a free port (server.server_port)
+    server = http.server.ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.requests = 0
+    server.fixtures = load_fixtures(fixtures) if fixtures else {}
+    threading.Thread(target=server.serve_forever, name='standin', daemon=True).start()
+    return server
+
+def base_url(server):
+    return 'http://%s:%d/' % server.server_address[:2]
+
+def point_weather_at(server):
+    # Sends zoa_wx's requests to the stand-in instead of the real services
+    import zoa_wx
+    zoa_wx.DATIS_URL = base_url(server) + 'api/'
+    zoa_wx.METAR_URL = base_url(server) + 'metar?'
+
+def point_all_at(server):
+    # Weather, FlightAware and NFDC chart requests all go to the stand-in
+    import zoa_flightaware, zoa_charts
+    point_weather_at(server)
+    zoa_flightaware.FLIGHTAWARE_URL = base_url(server) + 'flightaware?'
+    zoa_charts.NFDC_URL = base_url(server) + 'nfdc?airportId=%s'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.3, help='seconds before each response')
+    parser.add_argument('--fixtures', help='directory of recorded responses (record_fixtures.py)')
+    args = parser.parse_args()
+    server = start(port=args.port, delay=args.delay, fixtures=args.fixtures)
+    print('Stand-in upstream services on %s (Ctrl-C to stop)' % base_url(server))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,108 @@
+# The compliance checker and the batch validator have to agree on a flight.
+#
+#   python -m pytest tests
+import os
+import sys
+import shutil
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from zoa_data import DataRegistry, DATASETS
+from zoa_compliance import ComplianceChecker, COMPLIANT, AMEND, ALIAS_MATCH
+from zoa_batch import FlightValidator
+
+DATA_DIR = os.path.join(ROOT, 'data')
+
+@pytest.fixture(scope='module')
+def data(tmp_path_factory):
+    # The source files copied to a temporary directory, so the snapshot is
+    # built there and not in data/
+    directory = tmp_path_factory.mktemp('data')
+    for filename, loader in DATASETS.values():
+        if os.path.exists(os.path.join(DATA_DIR, filename)):
+            shutil.copy(os.path.join(DATA_DIR, filename), str(directory))
+    return DataRegistry(str(directory))
+
+# Matches the '..SADDE STAR' LOA route but not the KSFO-KLAX preferred route
+FLIGHT = {'callsign': 'TEST1', 'aircraft': 'B738', 'departure': 'KSFO', 'arrival': 'KLAX',
+          'route': 'SSTIK4 SNS AVE SADDE8'}
+
+def test_faa_and_loa_are_scored_separately(data):
+    result = ComplianceChecker(data).check(FLIGHT['departure'], FLIGHT['arrival'], FLIGHT['route'])
+    assert result['sources']['loa']['status'] == COMPLIANT
+    assert result['sources']['faa']['status'] == AMEND
+    assert result['status'] == AMEND
+    assert result['closest_route'] == result['sources']['faa']['closest_route']
+    assert result['amendment']
+
+def test_batch_agrees_with_compliance(data):
+    result = ComplianceChecker(data).check(FLIGHT['departure'], FLIGHT['arrival'], FLIGHT['route'])
+    report = FlightValidator(data).check(FLIGHT)
+    assert report['status'] == 'CHECK'
+    assert report['faa_status'] == 'DEVIATION'
+    assert report['loa_status'] == 'COMPLIANT'
+    assert report['closest_route'] == result['sources']['faa']['closest_route']
+    assert report['amendment'] == result['sources']['faa']['amendment']
+
+def test_matching_both_sources_is_compliant(data):
+    route = 'V27 VTU V299 SADDE V107'
+    result = ComplianceChecker(data).check('KSFO', 'KLAX', route)
+    assert result['status'] == COMPLIANT
+    assert all(r['status'] == COMPLIANT for r in result['sources'].values())
+    assert FlightValidator(data).check(dict(FLIGHT, route=route))['status'] == 'OK'
+
+def replacements(amendment):
+    # [(replaced, replacement)] of the 'replace X with Y' edits of an amendment
+    edits = [e.split(': ', 1)[-1] for e in amendment.split('; ')]
+    return [tuple(e[len('replace '):].split(' with ')) for e in edits if e.startswith('replace ')]
+
+def test_loa_fixes_may_have_airways_between_them(data):
+    result = ComplianceChecker(data).check('KFAT', 'KLAX', 'PONDD V23 TAFTO MUPTT IRNMN2')
+    assert result['sources']['loa']['status'] == COMPLIANT
+    assert result['status'] == COMPLIANT
+
+def test_loa_fixes_in_the_wrong_order_are_amended(data):
+    checker = ComplianceChecker(data)
+    for departure, route in [('KFAT', 'MUPTT TAFTO PONDD IRNMN2'), ('KMRY', 'SADDE8 VTU')]:
+        result = checker.check(departure, 'KLAX', route)
+        assert result['sources']['loa']['status'] == AMEND
+        assert result['amendment']
+        assert all(old != new for old, new in replacements(result['amendment']))
+
+def sample_flights(data):
+    # Flights between ZOA and a few busy airports: the FAA preferred routes,
+    # LOA routes and alias segments of each pair as filed (with an airway
+    # between the fixes) and backwards
+    from zoa_route import loa_alternatives, alias_alternatives
+    flights = [FLIGHT]
+    for departure in ['KSFO', 'KOAK', 'KSJC', 'KSMF', 'KFAT', 'KMRY']:
+        for arrival in ['KLAX', 'KSAN', 'KLAS', 'KSEA', 'KPHX', 'KBUR', 'KSFO']:
+            routes = [r['Route String'].split() for r in data.faa_routes.lookup(departure[1:], arrival[1:])]
+            for r in data.loa_engine.match(departure, arrival):
+                routes.extend([sorted(g)[0] for g in groups] for groups in loa_alternatives(r['Route']))
+            for command, text in data.alias_index.for_pair(departure, arrival):
+                routes.extend(segment.replace('.', ' ').split() for segment in alias_alternatives(text))
+            for tokens in routes:
+                for route in (' V23 '.join(tokens), ' '.join(reversed(tokens))):
+                    flights.append({'callsign': 'TEST', 'aircraft': 'B738', 'departure': departure,
+                                    'arrival': arrival, 'route': route})
+    return flights
+
+def test_batch_and_compliance_give_the_same_verdicts(data):
+    checker = ComplianceChecker(data)
+    validator = FlightValidator(data)
+    flights = sample_flights(data)
+    assert len(flights) > 100
+    for flight in flights:
+        result = checker.check(flight['departure'], flight['arrival'], flight['route'])
+        report = validator.check(flight)
+        sources = result['sources']
+        if 'faa' in sources:
+            assert (report['faa_status'] == 'MATCH') == (sources['faa']['status'] == COMPLIANT), flight
+        if 'loa' in sources:
+            assert (report['loa_status'] == 'COMPLIANT') == (sources['loa']['status'] == COMPLIANT), flight
+        if sources:
+            assert (report['status'] == 'OK') == (result['status'] == COMPLIANT), flight
+        elif report['alias_status'] != 'NONE':
+            assert (report['alias_status'] == 'MATCH') == (result['status'] == ALIAS_MATCH), flight
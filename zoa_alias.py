@@ -0,0 +1,236 @@
+import re
+import heapq
+from zoa_prefroutes import faa_identifier
+
+TOKEN_EXP = re.compile(r'\$?[A-Za-z0-9]+')
+
+# Ranking weights for the different kinds of hit
+SCORE_EXACT = 100
+SCORE_PREFIX = 80
+SCORE_SUBSTRING = 60
+SCORE_ROUTE = 40
+SCORE_FUZZY = 30
+
+def route_tokens(text):
+    # Fixes, airways and procedures in alias route text, without $variables
+    return [t.upper() for t in TOKEN_EXP.findall(text) if not t.startswith('$')]
+
+def edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def deletions(s):
+    return {s[:i] + s[i+1:] for i in range(len(s))}
+
+def name_variants(s):
+    return deletions(s) | {s}
+
+def trigrams(s):
+    s = '.%s.' % s
+    return {s[i:i+3] for i in range(len(s) - 2)}
+
+def normalize_command(s):
+    return s.strip().upper().lstrip('.')
+
+def name_ranks(order, size):
+    # rank[i] = position of alias i in name order, the tie-break of every
+    # score; a list lookup is a much cheaper sort key than the name itself
+    rank = [0] * size
+    for position, i in enumerate(order):
+        rank[i] = position
+    return rank
+
+class AliasIndex:
+    # Inverted indexes over ZOA alias commands: a trigram index over command
+    # names (substring matches), a deletion index (fuzzy matches) and a token
+    # index over route text. Each one is built the first time a search needs it.
+    def __init__(self, aliases):
+        self.commands = list(aliases)
+        self.texts = list(aliases.values())
+        self.names = [normalize_command(k) for k in self.commands]
+        self.ids = {k: i for i, k in enumerate(self.commands)}
+        self.order = sorted(range(len(self.names)), key=lambda i: self.names[i])
+        self.rank = name_ranks(self.order, len(self.names))
+        self._name_grams = None
+        self._name_deletes = None
+        self._route_ids = None
+
+    @property
+    def name_grams(self):
+        if self._name_grams is None:
+            grams = {}
+            for i in self.order:
+                for g in trigrams(self.names[i]):
+                    grams.setdefault(g, set()).add(i)
+            self._name_grams = grams
+        return self._name_grams
+
+    @property
+    def name_deletes(self):
+        if self._name_deletes is None:
+            deletes = {}
+            for i in self.order:
+                for d in name_variants(self.names[i]):
+                    deletes.setdefault(d, set()).add(i)
+            self._name_deletes = deletes
+        return self._name_deletes
+
+    @property
+    def route_ids(self):
+        if self._route_ids is None:
+            route_ids = {}
+            for i in self.order:
+                for t in set(route_tokens(self.texts[i])):
+                    route_ids.setdefault(t, set()).add(i)
+            self._route_ids = route_ids
+        return self._route_ids
+
+    def __len__(self):
+        return len(self.order)
+
+    def updated(self, aliases):
+        # Index of a new version of the alias table. Only the postings of added,
+        # removed and changed commands are redone, everything else is shared
+        # with this index, which is left untouched for searches still using it.
+        # Removed commands keep their id slot but drop out of every posting.
+        ids = self.ids
+        removed = [c for c in ids if c not in aliases]
+        changed = [c for c, text in aliases.items() if c not in ids or self.texts[ids[c]] != text]
+        if not removed and not changed:
+            return self
+
+        new = AliasIndex.__new__(AliasIndex)
+        new.commands = list(self.commands)
+        new.texts = list(self.texts)
+        new.names = list(self.names)
+        new.ids = dict(ids)
+        new._name_grams, new._name_deletes, new._route_ids = [
+            None if postings is None else dict(postings) for postings in (self._name_grams, self._name_deletes, self._route_ids)]
+        copied = set()
+
+        def edit(postings, keys, i, add):
+            if postings is None:
+                return
+            for k in keys:
+                if (id(postings), k) not in copied:
+                    copied.add((id(postings), k))
+                    postings[k] = set(postings.get(k, ()))
+                if add:
+                    postings[k].add(i)
+                else:
+                    postings[k].discard(i)
+
+        for command in removed:
+            i = new.ids.pop(command)
+            edit(new._name_grams, trigrams(new.names[i]), i, False)
+            edit(new._name_deletes, name_variants(new.names[i]), i, False)
+            edit(new._route_ids, set(route_tokens(new.texts[i])), i, False)
+        for command in changed:
+            text = aliases[command]
+            i = new.ids.get(command)
+            if i is None:
+                i = new.ids[command] = len(new.commands)
+                new.commands.append(command)
+                new.texts.append(text)
+                new.names.append(normalize_command(command))
+                edit(new._name_grams, trigrams(new.names[i]), i, True)
+                edit(new._name_deletes, name_variants(new.names[i]), i, True)
+            else:
+                edit(new._route_ids, set(route_tokens(new.texts[i])), i, False)
+                new.texts[i] = text
+            edit(new._route_ids, set(route_tokens(text)), i, True)
+        new.order = sorted(new.ids.values(), key=lambda i: new.names[i])
+        new.rank = name_ranks(new.order, len(new.names))
+        return new
+
+    def name_substring(self, q):
+        if len(q) < 3:
+            return [i for i in self.order if q in self.names[i]]
+        # Every trigram inside the query must appear in a matching name
+        name_grams = self.name_grams
+        grams = sorted((name_grams.get(q[i:i+3], ()) for i in range(len(q) - 2)), key=len)
+        if not grams[0]:
+            return []
+        candidates = set(grams[0]).intersection(*grams[1:])
+        return [i for i in candidates if q in self.names[i]]
+
+    def route_match(self, q):
+        tokens = route_tokens(q)
+        if not tokens:
+            return []
+        route_ids = self.route_ids
+        postings = sorted((route_ids.get(t, set()) for t in tokens), key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def fuzzy(self, q):
+        # Symmetric single-deletion lookup: finds names one insertion, deletion,
+        # substitution or transposition away from the query without scanning
+        name_deletes = self.name_deletes
+        candidates = set()
+        for variant in name_variants(q):
+            candidates.update(name_deletes.get(variant, ()))
+        results = []
+        for i in candidates:
+            name = self.names[i]
+            results.append((i, 1.0 - edit_distance(q, name) / max(len(q), len(name))))
+        return results
+
+    def for_pair(self, departure, arrival):
+        # Route aliases are named <dep><variant><arr>, e.g. .SFO1LAX or .0Q3SFO19
+        dep = faa_identifier(departure)
+        arr = faa_identifier(arrival)
+        return [(self.commands[i], self.texts[i]) for i in sorted(self.name_substring(dep))
+                if self.names[i].startswith(dep) and arr in self.names[i][len(dep):]]
+
+    def search(self, query, limit=None, fuzzy=True):
+        # Returns [(command, text)] best match first; an empty query lists everything
+        return [(self.commands[i], self.texts[i]) for i in self.ranked(query, limit, fuzzy)]
+
+    def iter_search(self, query, fuzzy=True):
+        # search() as a generator for paged output: an empty query walks the
+        # aliases in order without building a list of all of them
+        commands, texts = self.commands, self.texts
+        return ((commands[i], texts[i]) for i in self.ranked(query, fuzzy=fuzzy))
+
+    def ranked(self, query, limit=None, fuzzy=True):
+        # Alias ids, best match first. Name hits (exact, prefix, substring)
+        # and route hits have one score per kind, so each kind is a group sorted
+        # by name rank alone; only fuzzy hits have scores of their own, and
+        # they are looked for only when there are few other hits. Fuzzy
+        # lookups of one or two character queries would match any short name,
+        # so they are skipped.
+        q = normalize_command(query)
+        if not q:
+            return self.order if limit is None else self.order[:limit]
+
+        names, rank = self.names, self.rank
+        results = []
+        def add(ids):
+            # ids of one score, in name order, up to the limit
+            if limit is None or limit - len(results) >= len(ids):
+                results.extend(sorted(ids, key=rank.__getitem__))
+            elif len(results) < limit:
+                results.extend(heapq.nsmallest(limit - len(results), ids, key=rank.__getitem__))
+
+        exact, prefix, substring = [], [], []
+        for i in self.name_substring(q):
+            name = names[i]
+            (exact if name == q else prefix if name.startswith(q) else substring).append(i)
+        for ids in (exact, prefix, substring):
+            add(ids)
+        if limit is not None and len(results) >= limit:
+            return results
+        found = set(exact).union(prefix, substring)
+        route = [i for i in self.route_match(query) if i not in found]
+        add(route)
+        found.update(route)
+        if fuzzy and len(q) >= 3 and len(found) < (limit or 10):
+            # Fuzzy scores are below every other kind of hit
+            similar = [(-SCORE_FUZZY * similarity, rank[i], i) for i, similarity in self.fuzzy(q) if i not in found]
+            results.extend(i for score, position, i in sorted(similar))
+        return results if limit is None else results[:limit]
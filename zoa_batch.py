@@ -0,0 +1,261 @@
+import io
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from zoa_data import DataRegistry
+from zoa_prefroutes import faa_identifier
+from zoa_route import route_tokens, alias_alternatives, loa_alternatives, matches_in_order, FAA, LOA
+from zoa_compliance import ComplianceChecker
+
+# Accepted column/key names in traffic files -> field used by the validator
+FLIGHT_FIELDS = {
+    'callsign'  : ['callsign', 'call sign', 'acid', 'flight'],
+    'aircraft'  : ['aircraft', 'type', 'ac_type', 'aircraft type', 'equipment'],
+    'departure' : ['departure', 'dep', 'origin', 'orig'],
+    'arrival'   : ['arrival', 'arr', 'destination', 'dest'],
+    'route'     : ['route', 'filed route', 'flightplan', 'flight plan']
+}
+REPORT_FIELDS = ['callsign', 'aircraft', 'departure', 'arrival', 'status',
+                 'faa_status', 'faa_route', 'loa_status', 'loa_route', 'loa_rnav', 'loa_notes',
+                 'alias_status', 'alias', 'closest_route', 'amendment', 'suggested_alias', 'route']
+
+# Files with more flights than this are split across a process pool
+PARALLEL_THRESHOLD = 5000
+CHUNK_SIZE = 2000
+
+# Chunks queued or being checked per worker; later chunks are only read from
+# the traffic file as earlier ones finish
+CHUNKS_PER_WORKER = 2
+
+# Whitespace and commas between the records of a JSON array
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+class FlightValidator:
+    # Checks filed flights against FAA preferred routes, LOA rules and ZOA
+    # route aliases. Everything derived from a city pair is cached, so the cost
+    # per flight is a few dict lookups plus the comparison with the filed route.
+    def __init__(self, data):
+        self.data = data
+        self.pair_cache = {}
+        self.compliance = ComplianceChecker(data)
+
+    def pair_info(self, departure, arrival):
+        key = (departure, arrival)
+        info = self.pair_cache.get(key)
+        if info is None:
+            faa = [(route_tokens(r['Route String'], departure, arrival), r['Route String'])
+                   for r in self.data.faa_routes.lookup(faa_identifier(departure), faa_identifier(arrival))]
+            # LOA routes and aliases as alternatives of elements (tuples of
+            # options) for matches_in_order, built like ComplianceChecker's
+            # candidates: each '+...+' segment of an alias is one alternative
+            loa = [([[tuple(g) for g in groups] for groups in loa_alternatives(r['Route'])], r)
+                   for r in self.data.loa_engine.match(departure, arrival)]
+            aliases = [([[(t,) for t in route_tokens(segment, departure, arrival)] for segment in alias_alternatives(text)], cmd)
+                       for cmd, text in self.data.alias_index.for_pair(departure, arrival)]
+            info = self.pair_cache[key] = (faa, loa, aliases)
+        return info
+
+    def check(self, flight):
+        departure = flight['departure'].strip().upper()
+        arrival = flight['arrival'].strip().upper()
+        filed = route_tokens(flight['route'], departure, arrival)
+        faa, loa, aliases = self.pair_info(departure, arrival)
+        report = dict(flight, departure=departure, arrival=arrival)
+
+        report['faa_status'] = 'NONE'
+        report['faa_route'] = ''
+        if faa:
+            match = next((text for tokens, text in faa if tokens == filed), None)
+            report['faa_status'] = 'MATCH' if match else 'DEVIATION'
+            report['faa_route'] = match or faa[0][1]
+
+        report['loa_status'] = 'N/A'
+        report['loa_route'] = report['loa_rnav'] = report['loa_notes'] = ''
+        if loa:
+            match = next((rule for alternatives, rule in loa
+                          if any(matches_in_order(groups, filed) for groups in alternatives)), None)
+            rule = match or loa[0][1]
+            report['loa_status'] = 'COMPLIANT' if match else 'NON-COMPLIANT'
+            report['loa_route'] = rule['Route']
+            report['loa_rnav'] = rule['RNAV Required']
+            report['loa_notes'] = rule['Notes']
+
+        report['alias_status'] = 'NONE'
+        report['alias'] = ''
+        if aliases:
+            match = next((cmd for alternatives, cmd in aliases
+                          if any(elements and matches_in_order(elements, filed) for elements in alternatives)), None)
+            report['alias_status'] = 'MATCH' if match else 'AVAILABLE'
+            report['alias'] = match or ' '.join(cmd for alternatives, cmd in aliases)
+
+        failed = report['faa_status'] == 'DEVIATION' or report['loa_status'] == 'NON-COMPLIANT'
+        report['status'] = 'CHECK' if failed else 'OK'
+        report['closest_route'] = report['amendment'] = report['suggested_alias'] = ''
+        if failed:
+            # Closest route and amendment of the source that failed (FAA first)
+            compliance = self.compliance.check(departure, arrival, flight['route'])
+            compliance = compliance['sources'].get(FAA if report['faa_status'] == 'DEVIATION' else LOA, compliance)
+            report['closest_route'] = compliance['closest_route']
+            report['amendment'] = compliance['amendment']
+            report['suggested_alias'] = compliance['alias']
+        return report
+
+def normalize_flight(record):
+    lowered = {k.strip().lower(): v for k, v in record.items() if k}
+    flight = {}
+    for field, names in FLIGHT_FIELDS.items():
+        flight[field] = next((str(lowered[n]) for n in names if lowered.get(n) is not None), '')
+    return flight
+
+def iter_flights(filename):
+    # Streams flights from a CSV, JSON array or JSON-lines traffic file
+    with io.open(filename, 'r', encoding='utf-8-sig') as file:
+        if filename.lower().endswith('.csv'):
+            for row in csv.DictReader(file):
+                yield normalize_flight(row)
+            return
+        first = file.read(1)
+        while first.isspace():
+            first = file.read(1)
+        if first == '[':
+            file.seek(0)
+            for record in iter_json_array(file):
+                yield normalize_flight(record)
+            return
+        file.seek(0)
+        for line in file:
+            if line.strip():
+                yield normalize_flight(json.loads(line))
+
+def iter_json_array(file, block_size=1 << 16):
+    # Records of a top level JSON array, decoded one at a time while the file
+    # is read in blocks, so a large array is never held in memory at once
+    decoder = json.JSONDecoder()
+    buffer = file.read(block_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('expected a JSON array')
+    position = 1
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # A record cut off at the end of the block (or a broken file)
+            more = file.read(block_size)
+            if not more:
+                raise
+            buffer = buffer[position:] + more
+            position = 0
+            continue
+        yield record
+        position = end
+
+def iter_chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Per-process validator for the process pool, created once by the initializer
+_worker_validator = None
+
+def init_worker(data_dir):
+    global _worker_validator
+    _worker_validator = FlightValidator(DataRegistry(data_dir))
+
+def check_chunk(flights):
+    return [_worker_validator.check(f) for f in flights]
+
+def validate_flights(flights, data_dir='data', workers=None, chunk_size=CHUNK_SIZE):
+    # Yields one report per flight, in input order. With workers > 1 chunks of
+    # flights are checked in a process pool, each worker loading the snapshot
+    # once; at most CHUNKS_PER_WORKER chunks per worker are in flight, so
+    # memory stays bounded however many flights there are.
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data_dir,)) as pool:
+            pending = deque()
+            for chunk in iter_chunks(flights, chunk_size):
+                pending.append(pool.submit(check_chunk, chunk))
+                if len(pending) >= CHUNKS_PER_WORKER * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+    else:
+        validator = FlightValidator(DataRegistry(data_dir))
+        for flight in flights:
+            yield validator.check(flight)
+
+class ReportWriter:
+    def __init__(self, file, fmt='csv'):
+        self.file = file
+        self.fmt = fmt
+        self.count = 0
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(file, fieldnames=REPORT_FIELDS, extrasaction='ignore', lineterminator='\n')
+            self.writer.writeheader()
+        else:
+            file.write('[')
+
+    def write(self, report):
+        if self.fmt == 'csv':
+            self.writer.writerow(report)
+        else:
+            self.file.write('%s\n%s' % (',' if self.count else '', json.dumps({k: report.get(k, '') for k in REPORT_FIELDS})))
+        self.count += 1
+
+    def close(self):
+        if self.fmt != 'csv':
+            self.file.write('\n]\n')
+
+def count_lines(filename):
+    with io.open(filename, 'rb') as file:
+        return sum(chunk.count(b'\n') for chunk in iter(lambda: file.read(1 << 20), b''))
+
+def validate_file(filename, output=None, fmt=None, data_dir='data', workers=None):
+    if workers is None:
+        workers = os.cpu_count() if count_lines(filename) > PARALLEL_THRESHOLD else 1
+    if fmt is None:
+        fmt = 'json' if output and output.lower().endswith('.json') else 'csv'
+    out = io.open(output, 'w', encoding='utf8', newline='') if output else sys.stdout
+    summary = {}
+    try:
+        writer = ReportWriter(out, fmt)
+        for report in validate_flights(iter_flights(filename), data_dir, workers):
+            writer.write(report)
+            summary[report['status']] = summary.get(report['status'], 0) + 1
+        writer.close()
+    finally:
+        if output:
+            out.close()
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check a traffic file against FAA preferred routes, LOAs and ZOA aliases')
+    parser.add_argument('traffic', help='CSV, JSON or JSON-lines file with callsign, aircraft, departure, arrival, route')
+    parser.add_argument('-o', '--output', help='report file (default: stdout)')
+    parser.add_argument('-f', '--format', choices=['csv', 'json'])
+    parser.add_argument('-w', '--workers', type=int, help='worker processes (default: all cores for large files)')
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    summary = validate_file(args.traffic, args.output, args.format, args.data_dir, args.workers)
+    elapsed = time.perf_counter() - start
+    total = sum(summary.values())
+    print('Checked %d flights in %.2fs (%s)' % (total, elapsed, ', '.join('%s: %d' % i for i in sorted(summary.items()))),
+          file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
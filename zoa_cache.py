@@ -0,0 +1,161 @@
+import os
+import time
+import pickle
+import sqlite3
+import datetime
+import threading
+from collections import OrderedDict
+import zoa_perf
+
+DISK_CACHE_PATH = os.path.join('data', 'zoa_cache.db')
+MAX_ENTRIES = 2000
+
+# AIRAC cycles are 28 days long, cycle 2001 became effective on 2020-01-02
+AIRAC_EPOCH = datetime.datetime(2020, 1, 2, 9, tzinfo=datetime.timezone.utc)
+AIRAC_PERIOD = datetime.timedelta(days=28)
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def airac_cycle(now=None):
+    # Returns (cycle id like '2211', effective datetime, next effective datetime)
+    now = now or utcnow()
+    n = (now - AIRAC_EPOCH) // AIRAC_PERIOD
+    effective = AIRAC_EPOCH + n * AIRAC_PERIOD
+    jan1 = datetime.datetime(effective.year, 1, 1, tzinfo=datetime.timezone.utc)
+    first_of_year = AIRAC_EPOCH - ((AIRAC_EPOCH - jan1) // AIRAC_PERIOD) * AIRAC_PERIOD
+    number = (effective - first_of_year) // AIRAC_PERIOD + 1
+    return ('%02d%02d' % (effective.year % 100, number), effective, effective + AIRAC_PERIOD)
+
+def seconds_to_next_atis(now=None, minute=55, max_seconds=15 * 60):
+    # D-ATIS letters change with the hourly METAR (issued around :51-:56), so
+    # an ATIS is kept until just after the next one, but never longer than
+    # max_seconds so specials are picked up reasonably quickly
+    now = now or utcnow()
+    update = now.replace(minute=minute, second=0, microsecond=0)
+    if update <= now:
+        update += datetime.timedelta(hours=1)
+    return min((update - now).total_seconds(), max_seconds)
+
+# Time-to-live per source in seconds (or a function returning seconds).
+# Charts aren't kept here: zoa_charts indexes them per AIRAC cycle in its
+# own sqlite file and only reports its reads in the 'charts' counters.
+TTLS = {
+    'metar'       : 5 * 60,
+    'atis'        : seconds_to_next_atis,
+    'flightaware' : 6 * 60 * 60
+}
+
+class TTLCache:
+    # Bounded in-memory LRU with a per-entry expiry, optionally backed by an
+    # sqlite file so entries survive restarts. Hits, misses and the time spent
+    # fetching on misses are tracked per namespace.
+    def __init__(self, max_entries=MAX_ENTRIES, disk_path=None, ttls=TTLS):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self.entries = OrderedDict()
+        self.counters = {}
+        self.lock = threading.RLock()
+        self.db = None
+        if disk_path:
+            self.db = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self.db.execute('CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, expires REAL, value BLOB, PRIMARY KEY (namespace, key))')
+            self.db.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+
+    def ttl(self, namespace):
+        ttl = self.ttls.get(namespace, 60)
+        return ttl() if callable(ttl) else ttl
+
+    def count(self, namespace, counter, amount=1):
+        c = self.counters.setdefault(namespace, {'hits': 0, 'disk_hits': 0, 'misses': 0, 'fetch_seconds': 0.0})
+        c[counter] += amount
+        zoa_perf.count('cache.%s.%s' % (namespace, counter), amount)
+
+    def get(self, namespace, key):
+        # Returns (found, value)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get((namespace, key))
+            if entry:
+                if entry[0] > now:
+                    self.entries.move_to_end((namespace, key))
+                    self.count(namespace, 'hits')
+                    return True, entry[1]
+                del self.entries[(namespace, key)]
+            if self.db:
+                row = self.db.execute('SELECT expires, value FROM cache WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+                if row and row[0] > now:
+                    value = pickle.loads(row[1])
+                    self._remember(namespace, key, row[0], value)
+                    self.count(namespace, 'disk_hits')
+                    return True, value
+        return False, None
+
+    def _remember(self, namespace, key, expires, value):
+        self.entries[(namespace, key)] = (expires, value)
+        self.entries.move_to_end((namespace, key))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def set(self, namespace, key, value, ttl=None):
+        expires = time.time() + (self.ttl(namespace) if ttl is None else ttl)
+        with self.lock:
+            self._remember(namespace, key, expires, value)
+            if self.db:
+                self.db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                                (namespace, key, expires, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+    def invalidate(self, namespace, key=None):
+        with self.lock:
+            for k in [k for k in self.entries if k[0] == namespace and (key is None or k[1] == key)]:
+                del self.entries[k]
+            if self.db:
+                if key is None:
+                    self.db.execute('DELETE FROM cache WHERE namespace = ?', (namespace,))
+                else:
+                    self.db.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+
+    def get_or_fetch(self, namespace, key, fetch, ttl=None, cacheable=lambda v: v is not None):
+        # Failed fetches (per cacheable) are returned but not stored
+        found, value = self.get(namespace, key)
+        if found:
+            return value
+        start = time.perf_counter()
+        value = fetch()
+        with self.lock:
+            self.count(namespace, 'misses')
+            self.count(namespace, 'fetch_seconds', time.perf_counter() - start)
+        if cacheable(value):
+            self.set(namespace, key, value, ttl)
+        return value
+
+    def stats(self):
+        # Per namespace counters plus an estimate of the network time saved
+        # (hits times the average fetch time of the misses)
+        results = {}
+        with self.lock:
+            for namespace, c in self.counters.items():
+                avg = c['fetch_seconds'] / c['misses'] if c['misses'] else 0.0
+                results[namespace] = dict(c, saved_seconds=(c['hits'] + c['disk_hits']) * avg)
+        return results
+
+    def close(self):
+        if self.db:
+            self.db.close()
+            self.db = None
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def default_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = TTLCache(disk_path=DISK_CACHE_PATH)
+            except sqlite3.Error:
+                _cache = TTLCache()
+    return _cache
+
+def not_error(value):
+    return value is not None and not (isinstance(value, str) and value.startswith('ERROR'))
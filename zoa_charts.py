@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from zoa_cache import airac_cycle, default_cache
+from zoa_flightaware import RateLimiter, make_session
+from zoa_perf import timer, count
+
+CHART_INDEX_PATH = os.path.join('data', 'faa_charts.db')
+NFDC_URL = 'https://nfdc.faa.gov/nfdcApps/services/ajv5/airportDisplay.jsp?airportId=%s'
+TIMEOUT = (3.05, 15)
+RATE = 2.0
+MAX_WORKERS = 4
+
+CHART_CATEGORIES = {
+    'SIDS'  : 'Departure Procedure (DP) Charts',
+    'STARS' : 'Standard Terminal Arrival (STAR) Charts',
+    'IAPS'  : 'Instrument Approach Procedure (IAP) Charts'
+}
+
+# Rough ZOA boundary (northern California and western Nevada) as a
+# (min lat, max lat, min lon, max lon) box; airports.csv has no ARTCC column
+ZOA_BOUNDS = (35.5, 42.0, -126.0, -116.5)
+ZOA_REGIONS = {'US-CA', 'US-NV'}
+ZOA_AIRPORT_TYPES = ['large_airport', 'medium_airport']
+
+def parse_chart_page(html):
+    # {category heading: {chart name: pdf url}} for every chart category of an
+    # NFDC airport page. Each heading owns the link spans up to the next heading.
+    import lxml.html
+    if isinstance(html, bytes):
+        html = html.decode('utf8', 'replace')
+    categories = {}
+    for h3 in lxml.html.fromstring(html).iter('h3'):
+        charts = {}
+        for sibling in h3.itersiblings():
+            if sibling.tag == 'h3':
+                break
+            if sibling.tag == 'span':
+                for link in sibling.iter('a'):
+                    if link.get('href'):
+                        charts[link.text_content()] = link.get('href')
+        if charts:
+            categories[h3.text_content().strip()] = charts
+    return categories
+
+def fetch_chart_page(airport, session=None):
+    if session is None:
+        import requests as session
+    with timer('fetch.charts'):
+        r = session.get(NFDC_URL % airport.upper(), timeout=TIMEOUT)
+    r.raise_for_status()
+    count('bytes.charts', len(r.content))
+    with timer('parse.charts'):
+        return parse_chart_page(r.text)
+
+class ChartIndex:
+    # Chart categories per airport and AIRAC cycle in an sqlite file. Entries
+    # of past cycles are dropped when the index is opened.
+    def __init__(self, path=CHART_INDEX_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('CREATE TABLE IF NOT EXISTS charts (airport TEXT, cycle TEXT, fetched REAL, categories TEXT, '
+                        'PRIMARY KEY (airport, cycle))')
+        self.db.execute('DELETE FROM charts WHERE cycle < ?', (airac_cycle()[0],))
+
+    def get(self, airport, cycle=None):
+        # {category: {chart: url}}, or None if the airport isn't indexed for the cycle
+        with self.lock:
+            row = self.db.execute('SELECT categories FROM charts WHERE airport = ? AND cycle = ?',
+                                  (airport.upper(), cycle or airac_cycle()[0])).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, airport, categories, cycle=None):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO charts VALUES (?, ?, ?, ?)',
+                            (airport.upper(), cycle or airac_cycle()[0], time.time(), json.dumps(categories)))
+
+    def airports(self, cycle=None):
+        with self.lock:
+            rows = self.db.execute('SELECT airport FROM charts WHERE cycle = ?', (cycle or airac_cycle()[0],))
+            return {r[0] for r in rows}
+
+    def close(self):
+        self.db.close()
+
+_index = None
+_index_lock = threading.Lock()
+
+def default_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = ChartIndex()
+            except sqlite3.Error:
+                pass
+    return _index
+
+def get_charts(airport, chart_type='SIDS', index=None):
+    # {chart name: url} of one category ('SIDS', 'STARS', 'IAPS'); None if the
+    # airport has none or the page can't be fetched. The first lookup of an
+    # airport in a cycle fetches and stores all of its categories at once.
+    # Index reads are counted in the 'charts' cache stats (as disk hits).
+    if chart_type not in CHART_CATEGORIES:
+        return None
+    index = default_index() if index is None else index
+    categories = index.get(airport) if index is not None else None
+    count('store.charts.%s' % ('misses' if categories is None else 'hits'))
+    cache = default_cache()
+    if categories is not None:
+        with cache.lock:
+            cache.count('charts', 'disk_hits')
+    else:
+        start = time.perf_counter()
+        try:
+            categories = fetch_chart_page(airport)
+        except:
+            categories = None
+        with cache.lock:
+            cache.count('charts', 'misses')
+            cache.count('charts', 'fetch_seconds', time.perf_counter() - start)
+        if categories is None:
+            return None
+        if index is not None:
+            index.put(airport, categories)
+    return categories.get(CHART_CATEGORIES[chart_type])
+
+def zoa_airports(airports, types=ZOA_AIRPORT_TYPES, bounds=ZOA_BOUNDS):
+    # ICAO codes of airports.csv rows inside the ZOA box
+    min_lat, max_lat, min_lon, max_lon = bounds
+    results = []
+    for ident, row in airports.items():
+        try:
+            lat, lon = float(row['latitude_deg']), float(row['longitude_deg'])
+        except (KeyError, ValueError):
+            continue
+        if (row.get('iso_region') in ZOA_REGIONS and row.get('type') in types and len(ident) == 4
+                and min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            results.append(ident)
+    return sorted(results)
+
+def build_index(airports, index, rate=RATE, max_workers=MAX_WORKERS, progress=None):
+    # Indexes every airport not yet in the index for the current cycle,
+    # concurrently but at most rate requests per second.
+    # Returns {'fetched': n, 'skipped': n, 'failed': n}.
+    cycle = airac_cycle()[0]
+    done = index.airports(cycle)
+    missing = [a for a in dict.fromkeys(a.upper() for a in airports) if a not in done]
+    summary = {'fetched': 0, 'skipped': len(set(a.upper() for a in airports)) - len(missing), 'failed': 0}
+    limiter = RateLimiter(rate)
+    session = make_session(max_workers)
+
+    def fetch(airport):
+        limiter.wait()
+        return fetch_chart_page(airport, session)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, a): a for a in missing}
+        for future in as_completed(futures):
+            airport = futures[future]
+            try:
+                categories = future.result()
+            except:
+                categories = None
+            if categories is None:
+                summary['failed'] += 1
+            else:
+                index.put(airport, categories, cycle)
+                summary['fetched'] += 1
+            if progress:
+                progress(airport, categories)
+    session.close()
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the FAA chart index for the current AIRAC cycle')
+    parser.add_argument('airports', nargs='*', help='ICAO codes (default: every ZOA airport in airports.csv)')
+    parser.add_argument('--all-types', action='store_true', help='include small airports')
+    parser.add_argument('--rate', type=float, default=RATE, help='requests per second (default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--index', default=CHART_INDEX_PATH)
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+
+    airports = [a.upper() for a in args.airports]
+    if not airports:
+        from zoa_data import DataRegistry
+        types = ZOA_AIRPORT_TYPES + ['small_airport'] if args.all_types else ZOA_AIRPORT_TYPES
+        airports = zoa_airports(DataRegistry(args.data_dir).airports, types)
+
+    def progress(airport, categories):
+        print('%s: %s' % (airport, 'failed' if categories is None else
+                          ', '.join('%d %s' % (len(categories.get(v, {})), k) for k, v in CHART_CATEGORIES.items())),
+              file=sys.stderr)
+
+    index = ChartIndex(args.index)
+    start = time.perf_counter()
+    summary = build_index(airports, index, args.rate, args.workers, progress)
+    print('AIRAC %s: ' % airac_cycle()[0] + '%(fetched)d fetched, %(skipped)d already indexed, %(failed)d failed' % summary +
+          ' in %.1fs' % (time.perf_counter() - start), file=sys.stderr)
+    index.close()
+
+if __name__ == '__main__':
+    main()
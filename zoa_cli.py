@@ -0,0 +1,208 @@
+import os
+import sys
+import csv
+import json
+import argparse
+from zoa_perf import timer, set_action
+from zoa_codes import sanitize_airport
+
+# Non-interactive commands for shell scripts and other tools, e.g.
+#
+#   python zoa_helper.py routes KSFO KLAX --json
+#   python zoa_helper.py alias SNS --csv
+#   python zoa_helper.py metar KSFO KOAK
+#   python zoa_helper.py find airline skywest
+#   python zoa_helper.py digest KSFO KLAX
+#
+# Every command imports only the modules it needs (no InquirerPy, and no
+# requests/lxml unless something actually has to be fetched). Results are
+# written to stdout as a table, JSON or CSV; the exit status is 1 when
+# nothing was found and 2 when a data file the command needs is missing.
+# --profile (handled by zoa_helper) reports where the time went on stderr.
+#
+# metar --runway-config is the one command that imports NumPy (zoa_runways
+# evaluates the configurations vectorized), which alone adds ~120 ms of
+# startup; it is left out of the tens-of-milliseconds startup target.
+
+# Columns shown in table output (JSON and CSV always have every field)
+METAR_COLUMNS = ['station_id', 'observation_time', 'flight_category', 'runway_config', 'raw_text']
+LOA_COLUMNS = ['Route', 'RNAV Required', 'Notes']
+CHECK_COLUMNS = ['check', 'status', 'distance', 'source', 'amendment', 'alias']
+
+def not_found(what):
+    print('%s not found' % what, file=sys.stderr)
+
+def open_data(args):
+    from zoa_data import DataRegistry
+    return DataRegistry(args.data_dir)
+
+def lookup_codes(args, name, normalize):
+    table = open_data(args).get(name)
+    rows = []
+    for code in args.codes:
+        row = table.get(normalize(code))
+        if row is None:
+            not_found(code)
+        else:
+            rows.append(dict(row))
+    return rows
+
+def airport_command(args):
+    return lookup_codes(args, 'airports', sanitize_airport)
+
+def airline_command(args):
+    return lookup_codes(args, 'airlines', str.upper)
+
+def aircraft_command(args):
+    return lookup_codes(args, 'aircraft', str.upper)
+
+def find_command(args):
+    # Reverse lookup: names, callsigns and models -> codes
+    index = open_data(args).get('%s_search' % args.table)
+    return [{'code': code, 'name': label} for code, label in index.search(' '.join(args.query), args.limit)]
+
+def routes_command(args):
+    from zoa_prefroutes import faa_identifier
+    return open_data(args).faa_routes.lookup(faa_identifier(args.departure), faa_identifier(args.arrival))
+
+def loa_command(args):
+    return open_data(args).loa_engine.match(sanitize_airport(args.departure), sanitize_airport(args.arrival))
+
+def digest_command(args):
+    # Everything known about a pair from the precomputed digest (python zoa_digest.py)
+    from zoa_digest import lookup_digest, digest_rows
+    return digest_rows(lookup_digest(open_data(args), sanitize_airport(args.departure), sanitize_airport(args.arrival)))
+
+def alias_command(args):
+    results = open_data(args).alias_index.search(' '.join(args.query), args.offset + args.limit)
+    return [{'command': command, 'text': text} for command, text in results[args.offset:]]
+
+def check_command(args):
+    from zoa_compliance import ComplianceChecker
+    checker = ComplianceChecker(open_data(args))
+    result = dict(checker.check(sanitize_airport(args.departure), sanitize_airport(args.arrival), ' '.join(args.route)))
+    # The overall result, then the FAA and LOA results it was made from
+    sources = result.pop('sources')
+    return [dict(result, check='overall')] + [dict(r, check=source) for source, r in sources.items()]
+
+def flightaware_command(args):
+    from zoa_flightaware import get_routes
+    return get_routes(sanitize_airport(args.departure), sanitize_airport(args.arrival)) or []
+
+def charts_command(args):
+    from zoa_charts import get_charts
+    charts = get_charts(sanitize_airport(args.airport), args.type.upper()) or {}
+    return [{'chart': name, 'url': charts[name]} for name in sorted(charts)]
+
+def metar_command(args):
+    # One bulk request for every station that isn't cached
+    from zoa_wx import default_client
+    airports = [sanitize_airport(a) for a in args.airports]
+    metars = default_client().fetch_metars(airports)
+    configs = {}
+    if args.runway_config:
+        from zoa_runways import load_runway_engine
+        configs = load_runway_engine(args.data_dir).recommend_all({a: m for a, m in metars.items() if a in airports})
+    rows = []
+    for airport in airports:
+        if airport not in metars:
+            not_found('METAR for %s' % airport)
+            continue
+        row = dict(metars[airport])
+        if args.runway_config:
+            row['runway_config'] = configs.get(airport, '')
+        rows.append(row)
+    return rows
+
+def atis_command(args):
+    from zoa_wx import default_client, ATIS_ERROR
+    client = default_client()
+    futures = [(a, client.atis_async(a)) for a in (sanitize_airport(a) for a in args.airports)]
+    rows = []
+    for airport, future in futures:
+        atis = future.result()
+        if atis == ATIS_ERROR:
+            not_found('D-ATIS for %s' % airport)
+        else:
+            rows.append({'airport': airport, 'atis': atis})
+    return rows
+
+def write_rows(rows, fmt, columns=None, file=sys.stdout):
+    if fmt == 'json':
+        json.dump(rows, file)
+        file.write('\n')
+        return
+    fields = []
+    for row in rows:
+        fields.extend(k for k in row if k not in fields)
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, fieldnames=fields, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+    elif rows:
+        from tabulate import tabulate
+        fields = [f for f in columns if f in fields] if columns else fields
+        print(tabulate([[row.get(f, '') for f in fields] for row in rows], headers=fields), file=file)
+
+def make_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    output = common.add_mutually_exclusive_group()
+    output.add_argument('-f', '--format', choices=['table', 'json', 'csv'], default='table')
+    output.add_argument('--json', dest='format', action='store_const', const='json')
+    output.add_argument('--csv', dest='format', action='store_const', const='csv')
+    common.add_argument('--data-dir', default='data')
+
+    parser = argparse.ArgumentParser(prog='zoa_helper.py', description='ZOA lookups for scripts (run without arguments for the interactive menu)')
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+
+    def add(name, func, help, columns=None):
+        p = commands.add_parser(name, parents=[common], help=help, description=help)
+        p.set_defaults(func=func, columns=columns)
+        return p
+
+    add('airport', airport_command, 'airport records by ICAO (or 3-letter) code').add_argument('codes', nargs='+')
+    add('airline', airline_command, 'airline records by ICAO prefix').add_argument('codes', nargs='+')
+    add('aircraft', aircraft_command, 'aircraft records by ICAO type code').add_argument('codes', nargs='+')
+    p = add('find', find_command, 'codes by name, callsign or model prefix (e.g. find airline skywest)')
+    p.add_argument('table', choices=['airport', 'airline', 'aircraft'])
+    p.add_argument('query', nargs='+')
+    p.add_argument('-n', '--limit', type=int, default=20)
+    for name, func, help, columns in [('routes', routes_command, 'FAA preferred routes of a city pair', None),
+                                      ('loa', loa_command, 'LOA routes of a city pair', LOA_COLUMNS),
+                                      ('flightaware', flightaware_command, 'FlightAware IFR routes of a city pair (local store first)', None),
+                                      ('digest', digest_command, 'preferred, LOA, alias and FlightAware routes of a city pair at once', None)]:
+        p = add(name, func, help, columns)
+        p.add_argument('departure')
+        p.add_argument('arrival')
+    p = add('alias', alias_command, 'search ZOA aliases by command, fix or airway')
+    p.add_argument('query', nargs='*')
+    p.add_argument('-n', '--limit', type=int, default=50)
+    p.add_argument('--offset', type=int, default=0, help='skip this many results (next page: --offset 50)')
+    p = add('check', check_command, 'compare a filed route with the preferred, LOA and alias routes', CHECK_COLUMNS)
+    p.add_argument('departure')
+    p.add_argument('arrival')
+    p.add_argument('route', nargs='+')
+    p = add('charts', charts_command, 'SID/STAR/approach charts of an airport for the current AIRAC cycle')
+    p.add_argument('airport')
+    p.add_argument('-t', '--type', default='SIDS', choices=['SIDS', 'STARS', 'IAPS', 'sids', 'stars', 'iaps'])
+    p = add('metar', metar_command, 'latest METARs', METAR_COLUMNS)
+    p.add_argument('airports', nargs='+')
+    p.add_argument('-r', '--runway-config', action='store_true', help='add the recommended runway configuration')
+    add('atis', atis_command, 'current D-ATIS').add_argument('airports', nargs='+')
+    return parser
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    set_action(args.command)
+    try:
+        rows = args.func(args)
+    except FileNotFoundError as e:
+        # A data file that isn't installed (e.g. airports.csv)
+        print('%s is not available' % (os.path.basename(e.filename) if e.filename else e), file=sys.stderr)
+        return 2
+    with timer('render.%s' % args.format):
+        write_rows(rows, args.format, args.columns)
+    return 0 if rows else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
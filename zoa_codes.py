@@ -0,0 +1,127 @@
+import re
+import heapq
+from bisect import bisect_left
+
+WORD_EXP = re.compile(r'[^\W_]+')
+
+# Ranking weights for the different kinds of hit
+SCORE_CODE = 100
+SCORE_CODE_PREFIX = 80
+SCORE_NAME_PREFIX = 60
+SCORE_WORD_PREFIX = 40
+
+def normalize(text):
+    # 'SkyWest Airlines, Inc.' -> 'SKYWEST AIRLINES INC'
+    if text.isalnum():
+        return text.upper()
+    if text.replace(' ', '').isalnum():
+        return ' '.join(text.upper().split())
+    return ' '.join(WORD_EXP.findall(text.upper()))
+
+def sanitize_airport(airport):
+    # Airport code as typed -> ICAO: 'sfo' -> 'KSFO' (3-letter codes are US airports)
+    if len(airport) == 3:
+        return 'K' + airport.upper()
+    return airport.upper()
+
+def field_items(records, field):
+    # (code, value) of one field of every record; mapped tables (zoa_mmap)
+    # decode just that column
+    if hasattr(records, 'column'):
+        return zip(records, records.column(field))
+    return ((code, row.get(field)) for code, row in records.items())
+
+class PrefixIndex:
+    # One sorted list of 'key\0code' strings (plain strings sort and bisect much
+    # faster than tuples); every key starting with a prefix is one contiguous
+    # slice found with two bisections
+    def __init__(self, entries):
+        self.entries = sorted(set(entries))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def codes(self, start, stop):
+        return [e[e.index('\0') + 1:] for e in self.entries[start:stop]]
+
+    def exact(self, key):
+        return self.codes(bisect_left(self.entries, key + '\0'), bisect_left(self.entries, key + '\1'))
+
+    def prefix(self, prefix):
+        return self.codes(bisect_left(self.entries, prefix), bisect_left(self.entries, prefix + '\U0010ffff'))
+
+class CodeIndex:
+    # Reverse and as-you-type lookup over one code table (airports, airlines
+    # or aircraft): prefix indexes over the codes, over whole names (name,
+    # callsign, model) and over every word of those names
+    def __init__(self, records, code_fields, name_fields, label):
+        self.records = records
+        self.label = label
+        codes = []
+        names = []
+        words = []
+        normalized = {}
+        for field in code_fields:
+            codes.extend(normalize(value) + '\0' + code for code, value in field_items(records, field) if value)
+        for field in name_fields:
+            for code, value in field_items(records, field):
+                if not value:
+                    continue
+                key = normalized.get(value)
+                if key is None:
+                    key = normalized[value] = normalize(value)
+                if key:
+                    code = '\0' + code
+                    names.append(key + code)
+                    words.extend([w + code for w in key.split()])
+        self.codes = PrefixIndex(codes)
+        self.names = PrefixIndex(names)
+        self.words = PrefixIndex(words)
+
+    def __len__(self):
+        return len(self.records)
+
+    def search(self, query, limit=20):
+        # [(code, label)] best match first: the code itself, codes starting
+        # with the query, names starting with it, then records where every
+        # query word starts a word of the name ('united par' -> United Parcel Service)
+        q = normalize(query)
+        if not q:
+            return []
+        scores = {}
+        def hit(codes, score):
+            for code in codes:
+                if scores.get(code, 0) < score:
+                    scores[code] = score
+
+        words = q.split()
+        if len(words) == 1:
+            hit(self.codes.exact(q), SCORE_CODE)
+            hit(self.codes.prefix(q), SCORE_CODE_PREFIX)
+        hit(self.names.prefix(q), SCORE_NAME_PREFIX)
+        postings = sorted((self.words.prefix(w) for w in words), key=len)
+        if postings[0]:
+            hit(set(postings[0]).intersection(*postings[1:]), SCORE_WORD_PREFIX)
+
+        ranked = heapq.nsmallest(limit, scores, key=lambda code: (-scores[code], code))
+        return [(code, self.label(self.records[code])) for code in ranked]
+
+def airport_label(row):
+    municipality = row.get('municipality')
+    return '%s, %s' % (row['name'], municipality) if municipality else row['name']
+
+def airline_label(row):
+    callsign = row.get('Call sign')
+    return '%s (%s)' % (row['Airline'], callsign) if callsign else row['Airline']
+
+def aircraft_label(row):
+    return '%s (%s)' % (row['Manufacturer and Aircraft Type / Model'], row['WTC'])
+
+def build_airport_index(airports):
+    return CodeIndex(airports, ['ident', 'iata_code', 'local_code'], ['name', 'municipality'], airport_label)
+
+def build_airline_index(airlines):
+    return CodeIndex(airlines, ['ICAO'], ['Airline', 'Call sign'], airline_label)
+
+def build_aircraft_index(aircraft):
+    return CodeIndex(aircraft, ['ICAO Code'], ['Manufacturer and Aircraft Type / Model'], aircraft_label)
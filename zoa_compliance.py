@@ -0,0 +1,273 @@
+import sys
+import time
+import argparse
+from zoa_prefroutes import faa_identifier
+from zoa_route import route_tokens, loa_alternatives, alias_alternatives, matches_in_order, FAA, LOA, ALIAS
+
+# Alignment operations
+KEEP = 'keep'
+INSERT = 'insert'
+DELETE = 'delete'
+REPLACE = 'replace'
+SKIP = 'skip'
+
+COMPLIANT = 'COMPLIANT'
+ALIAS_MATCH = 'ALIAS'
+AMEND = 'AMEND'
+NO_ROUTES = 'NONE'
+
+# Results are memoized per (departure, arrival, filed tokens) up to this many
+MAX_CACHED = 100000
+
+class Candidate:
+    # One route a filed route can be compared with. elements is a tuple of
+    # option tuples (LOA groups like 'RBG/ OED/' have several options, every
+    # other element has one). Partial routes (LOA routes, aliases) only have
+    # to appear somewhere in the filed route; full routes (FAA preferred
+    # routes) have to match it end to end.
+    __slots__ = ('source', 'label', 'text', 'elements', 'partial', 'tokens')
+
+    def __init__(self, source, label, text, elements, partial):
+        self.source = source
+        self.label = label
+        self.text = text
+        self.elements = elements
+        self.partial = partial
+        self.tokens = frozenset(t for options in elements for t in options)
+
+    def route(self):
+        return ' '.join(options[0] for options in self.elements)
+
+def lower_bound(filed, filed_set, candidate):
+    # Cheap lower bound of the alignment cost: every candidate element with
+    # no option in the filed route costs at least one edit, and so (for full
+    # routes) does every filed token not in the candidate and the length difference
+    missing = sum(1 for options in candidate.elements if not filed_set.intersection(options))
+    if candidate.partial:
+        return missing
+    extra = sum(1 for t in filed if t not in candidate.tokens)
+    return max(missing, extra, abs(len(filed) - len(candidate.elements)))
+
+def align(filed, candidate, limit=None):
+    # Token-level edit distance between the filed route and a candidate with
+    # a backtrace. Returns (distance, [(op, filed token, candidate token)]) or
+    # (None, None) once the distance exceeds limit. Every edit of a full
+    # candidate costs one. Partial candidates only have to appear in order
+    # somewhere in the filed route, so filed tokens before, between and after
+    # their elements are skipped (SKIP) and the distance is the number of
+    # elements missing or out of order; a skipped token that belongs to the
+    # candidate is out of place and shown as a DELETE, but only breaks ties.
+    elements = candidate.elements
+    n, m = len(filed), len(elements)
+    if candidate.partial:
+        edit = n + 1
+        drop = [1 if f in candidate.tokens else 0 for f in filed]
+    else:
+        edit = 1
+        drop = [1] * n
+    rows = [[0] * (m + 1) for i in range(n + 1)]
+    rows[0] = [j * edit for j in range(m + 1)]
+    for i in range(1, n + 1):
+        previous, current = rows[i - 1], rows[i]
+        f, d = filed[i - 1], drop[i - 1]
+        current[0] = previous[0] + d
+        for j in range(1, m + 1):
+            current[j] = min(previous[j] + d, current[j - 1] + edit,
+                             previous[j - 1] + (0 if f in elements[j - 1] else edit))
+        if limit is not None and min(current) // edit > limit:
+            return None, None
+    distance = rows[n][m] // edit
+    if limit is not None and distance > limit:
+        return None, None
+
+    # Ties prefer keeping or replacing the latest filed token, so a wrong
+    # last fix is replaced rather than the candidate inserted at the start
+    ops = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        here = rows[i][j]
+        if i > 0 and j > 0 and here == rows[i - 1][j - 1] + (0 if filed[i - 1] in elements[j - 1] else edit):
+            f, options = filed[i - 1], elements[j - 1]
+            ops.append((KEEP, f, f) if f in options else (REPLACE, f, options[0]))
+            i, j = i - 1, j - 1
+        elif i > 0 and here == rows[i - 1][j] + drop[i - 1]:
+            ops.append((DELETE if drop[i - 1] else SKIP, filed[i - 1], None))
+            i -= 1
+        else:
+            ops.append((INSERT, None, elements[j - 1][0]))
+            j -= 1
+    ops.reverse()
+    return distance, ops
+
+def describe(ops):
+    # Amendment text for an alignment, e.g.
+    # 'after SNS: replace MOD LIN with PXN; delete KARNN'
+    edits = []
+    anchor = None
+    run = []
+
+    def flush():
+        if not run:
+            return
+        removed = [f for op, f, c in run if f]
+        added = [c for op, f, c in run if c]
+        where = 'after %s: ' % anchor if anchor else 'at start: '
+        if removed and added:
+            edits.append('%sreplace %s with %s' % (where, ' '.join(removed), ' '.join(added)))
+        elif removed:
+            edits.append('delete %s' % ' '.join(removed))
+        else:
+            edits.append('%sinsert %s' % (where, ' '.join(added)))
+        del run[:]
+
+    for op in ops:
+        if op[0] in (KEEP, SKIP):
+            flush()
+            anchor = op[1]
+        else:
+            run.append(op)
+    flush()
+    return '; '.join(edits)
+
+class ComplianceChecker:
+    # Compares filed routes with the FAA preferred routes, LOA routes and ZOA
+    # route aliases of their city pair. Candidates are built once per pair and
+    # compared in order of a cheap lower bound, so most alignments are skipped.
+    def __init__(self, data):
+        self.data = data
+        self.pair_cache = {}
+        self.results = {}
+
+    def clear(self):
+        # After the route data changed
+        self.pair_cache = {}
+        self.results = {}
+
+    def candidates(self, departure, arrival):
+        key = (departure, arrival)
+        candidates = self.pair_cache.get(key)
+        if candidates is None:
+            candidates = []
+            for r in self.data.faa_routes.lookup(faa_identifier(departure), faa_identifier(arrival)):
+                tokens = route_tokens(r['Route String'], departure, arrival)
+                candidates.append(Candidate(FAA, 'FAA %s' % r['Type'], r['Route String'], tuple((t,) for t in tokens), False))
+            for r in self.data.loa_engine.match(departure, arrival):
+                for groups in loa_alternatives(r['Route']):
+                    if groups:
+                        candidates.append(Candidate(LOA, 'LOA', r['Route'], tuple(tuple(sorted(g)) for g in groups), True))
+            for command, text in self.data.alias_index.for_pair(departure, arrival):
+                for segment in alias_alternatives(text):
+                    tokens = route_tokens(segment, departure, arrival)
+                    if tokens:
+                        candidates.append(Candidate(ALIAS, command, text, tuple((t,) for t in tokens), True))
+            self.pair_cache[key] = candidates
+        return candidates
+
+    def closest(self, filed, candidates):
+        # (distance, candidate, ops) of the best candidate, None if there are none
+        for c in candidates:
+            if c.partial and matches_in_order(c.elements, filed):
+                return 0, c, align(filed, c)[1]
+        filed_set = set(filed)
+        best = None
+        for bound, k, c in sorted((lower_bound(filed, filed_set, c), k, c) for k, c in enumerate(candidates)):
+            if best is not None and bound >= best[0]:
+                break
+            distance, ops = align(filed, c, None if best is None else best[0] - 1)
+            if distance is not None and (best is None or distance < best[0]):
+                best = (distance, c, ops)
+                if distance == 0:
+                    break
+        return best
+
+    def suggest_alias(self, filed, target, aliases):
+        # Of the aliases consistent with the target route (an alias segment
+        # lying on a full route, or a partial route contained in the alias),
+        # the one closest to the filed route
+        best = None
+        target_tokens = [options[0] for options in target.elements]
+        for c in aliases:
+            if target.partial:
+                consistent = align([options[0] for options in c.elements], target, 0)[0] == 0
+            else:
+                consistent = align(target_tokens, c, 0)[0] == 0
+            if consistent:
+                distance = align(filed, c)[0]
+                if best is None or distance < best[0]:
+                    best = (distance, c)
+        return best[1].label if best else ''
+
+    def score(self, filed, candidates, aliases):
+        # {'status', 'distance', 'source', 'closest_route', 'amendment', 'alias'}
+        # of the closest of candidates
+        result = {'status': NO_ROUTES, 'distance': '', 'source': '', 'closest_route': '', 'amendment': '', 'alias': ''}
+        best = self.closest(filed, candidates)
+        if best is not None:
+            distance, c, ops = best
+            result['distance'] = distance
+            result['source'] = c.label
+            result['closest_route'] = c.text
+            if distance == 0:
+                result['status'] = COMPLIANT if c.source != ALIAS else ALIAS_MATCH
+            else:
+                result['status'] = AMEND
+                result['amendment'] = describe(ops)
+            if c.source == ALIAS:
+                result['alias'] = c.label
+            elif distance and aliases:
+                result['alias'] = self.suggest_alias(filed, c, aliases)
+        return result
+
+    def check(self, departure, arrival, route):
+        # {'status', 'distance', 'source', 'closest_route', 'amendment', 'alias',
+        # 'sources'}. FAA preferred routes and LOA routes are separate
+        # requirements, each scored on its own ('sources': {'faa': result,
+        # 'loa': result} for the sources the pair has): the route is compliant
+        # when it matches a route of every one of them, otherwise the top level
+        # fields are those of the closest source that failed. Pairs with
+        # neither are compared with the aliases.
+        departure = departure.strip().upper()
+        arrival = arrival.strip().upper()
+        filed = tuple(route_tokens(route, departure, arrival))
+        key = (departure, arrival, filed)
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        candidates = self.candidates(departure, arrival)
+        by_source = {s: [c for c in candidates if c.source == s] for s in (FAA, LOA, ALIAS)}
+        aliases = by_source[ALIAS]
+        sources = {s: self.score(filed, by_source[s], aliases) for s in (FAA, LOA) if by_source[s]}
+        if sources:
+            failed = [r for r in sources.values() if r['distance']]
+            result = dict(min(failed, key=lambda r: r['distance']) if failed else sources[next(iter(sources))])
+        else:
+            result = self.score(filed, aliases, aliases)
+        result['sources'] = sources
+
+        if len(self.results) >= MAX_CACHED:
+            self.results.clear()
+        self.results[key] = result
+        return result
+
+def main(argv=None):
+    from zoa_data import DataRegistry
+
+    parser = argparse.ArgumentParser(description='Compare a filed route with the preferred, LOA and alias routes of its city pair')
+    parser.add_argument('departure')
+    parser.add_argument('arrival')
+    parser.add_argument('route', nargs='+')
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+
+    checker = ComplianceChecker(DataRegistry(args.data_dir))
+    start = time.perf_counter()
+    result = checker.check(args.departure, args.arrival, ' '.join(args.route))
+    for k in ['status', 'distance', 'source', 'closest_route', 'amendment', 'alias']:
+        print('%-14s %s' % (k + ':', result[k]))
+    for source, r in result['sources'].items():
+        print('%-14s %s %s' % (source + ':', r['status'], r['amendment'] or r['closest_route']))
+    print('%.1f ms' % (1000 * (time.perf_counter() - start)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
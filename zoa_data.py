@@ -0,0 +1,452 @@
+import io
+import os
+import errno
+import csv
+import re
+import sys
+import mmap
+import pickle
+import struct
+import hashlib
+import threading
+from zoa_prefroutes import load_FAA_route_table
+from zoa_alias import AliasIndex
+from zoa_loa import LOARuleEngine
+from zoa_route import build_route_index
+from zoa_codes import build_airport_index, build_airline_index, build_aircraft_index
+from zoa_perf import timer
+import zoa_mmap
+
+SNAPSHOT_VERSION = 4
+SNAPSHOT_MAGIC = b'ZOAS'
+SNAPSHOT_FILENAME = 'zoa_helper.snapshot'
+
+# The snapshot file is memory mapped so processes share one copy of its mapped
+# sections (see zoa_mmap). Windows can't replace a file that is mapped, which
+# a rebuild does, so there the sections are read into memory instead.
+MAP_SNAPSHOT = os.name != 'nt'
+
+# Seconds between checks of the data files when watching them for changes
+WATCH_INTERVAL = 2.0
+
+def load_airport_data(csv_filename):
+    airport_data = {}
+    with io.open(csv_filename,'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for row in reader:
+            id = row['ident']
+            airport_data[id] = row
+    return airport_data
+
+def load_airline_data(csv_filename):
+    airline_data = {}
+    with io.open(csv_filename,'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for row in reader:
+            if row['ICAO'] != 'n\a':
+                id = row['ICAO']
+                airline_data[id] = row
+    return airline_data
+
+def load_route_data(csv_filename):
+    route_data = []
+    with io.open(csv_filename,'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for row in reader:
+            route_data.append(row)
+    return route_data
+
+def load_aircraft_data(csv_filename):
+    ac_data = {}
+    with io.open(csv_filename,'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for row in reader:
+            id = row['ICAO Code']
+            if id != '' or id != 'n/a':
+                ac_data[id] = row
+    return ac_data
+
+def load_FAA_route_data(csv_filename):
+    route_data = {}
+    with io.open(csv_filename,'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for row in reader:
+            id = row['Orig']
+            if id in route_data:
+                route_data[id].append(row)
+            else:
+                route_data[id] = [row]
+    return route_data
+
+def load_alias_data(txt_filename):
+    cmds = {}
+    exp = re.compile(r'(?P<cmd>\.[a-zA-Z0-9]*) \.am rte (?P<txt>.+)')
+    with io.open(txt_filename, 'r') as file:
+        for line in file:
+            m = exp.match(line)
+            if m:
+                cmds[m.group('cmd')] = m.group('txt').strip()
+    return cmds
+
+# Dataset name -> (source file in the data directory, loader)
+DATASETS = {
+    'airports'   : ('airports.csv', load_airport_data),
+    'airlines'   : ('airlines.csv', load_airline_data),
+    'aircraft'   : ('aircraft.csv', load_aircraft_data),
+    'faa_routes' : ('prefroutes_db.csv', load_FAA_route_table),
+    'loa_routes' : ('routes.csv', load_route_data),
+    'aliases'    : ('ZOA_Alias.txt', load_alias_data)
+}
+
+# Indexes built in memory from loaded datasets: name -> (source dataset(s), builder)
+DERIVED = {
+    'alias_index'     : ('aliases', AliasIndex),
+    'loa_engine'      : ('loa_routes', LOARuleEngine),
+    'route_index'     : (('faa_routes', 'loa_routes', 'aliases'), build_route_index),
+    'airport_search'  : ('airports', build_airport_index),
+    'airline_search'  : ('airlines', build_airline_index),
+    'aircraft_search' : ('aircraft', build_aircraft_index)
+}
+
+def derived_sources(name):
+    sources = DERIVED[name][0]
+    return (sources,) if isinstance(sources, str) else sources
+
+def snapshot_path(data_dir='data'):
+    return os.path.join(data_dir, SNAPSHOT_FILENAME)
+
+def file_sha1(filename):
+    h = hashlib.sha1()
+    with io.open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def source_signature(filename, with_hash=True):
+    st = os.stat(filename)
+    return (st.st_size, st.st_mtime_ns, file_sha1(filename) if with_hash else None)
+
+def source_is_current(filename, signature):
+    # Cheap size/mtime check first, only hash the file if the mtime moved
+    # (e.g. after a git checkout) to see if the content actually changed. A
+    # source that was missing (signature None) is current while still missing.
+    if signature is None:
+        return not os.path.exists(filename)
+    size, mtime_ns, sha1 = signature
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return False
+    if st.st_size != size:
+        return False
+    if st.st_mtime_ns == mtime_ns:
+        return True
+    return file_sha1(filename) == sha1
+
+def read_snapshot_header(file):
+    prefix = file.read(12)
+    if len(prefix) != 12 or prefix[:4] != SNAPSHOT_MAGIC:
+        return None
+    version, header_len = struct.unpack('<II', prefix[4:])
+    if version != SNAPSHOT_VERSION:
+        return None
+    header = pickle.loads(file.read(header_len))
+    header['base'] = 12 + header_len
+    return header
+
+def build_snapshot(data_dir='data', path=None, reuse=None):
+    # Sections of a previous snapshot whose sources are unchanged are copied
+    # over as raw bytes instead of being re-parsed. Datasets zoa_mmap can lay
+    # out are stored mapped, the rest (LOA routes) pickled. A missing source
+    # file leaves its dataset out (signature None) and only fails loading it.
+    path = path or snapshot_path(data_dir)
+    sources = {}
+    blobs = {}
+    mapped = []
+    for name, (filename, loader) in DATASETS.items():
+        full_filename = os.path.join(data_dir, filename)
+        if reuse and name in reuse:
+            sources[name], blobs[name], is_mapped = reuse[name]
+            if is_mapped:
+                mapped.append(name)
+            continue
+        if not os.path.exists(full_filename):
+            sources[name] = None
+            continue
+        signature = source_signature(full_filename)
+        with timer('load.csv.%s' % name):
+            value = loader(full_filename)
+        blobs[name] = zoa_mmap.encode(value)
+        if blobs[name] is None:
+            blobs[name] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        else:
+            mapped.append(name)
+        sources[name] = signature
+
+    sections = {}
+    offset = 0
+    for name, blob in blobs.items():
+        sections[name] = (offset, len(blob))
+        offset += len(blob)
+    header = pickle.dumps({'sources': sources, 'sections': sections, 'mapped': mapped}, pickle.HIGHEST_PROTOCOL)
+
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with io.open(tmp_path, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC + struct.pack('<II', SNAPSHOT_VERSION, len(header)))
+        file.write(header)
+        for blob in blobs.values():
+            file.write(blob)
+    os.replace(tmp_path, path)
+    return path
+
+class Snapshot:
+    # buffer is the mapped file (None where it isn't mapped); a rebuild
+    # replaces the file rather than writing into it, so datasets attached to
+    # it stay valid after one
+    def __init__(self, path, header, buffer=None):
+        self.path = path
+        self.header = header
+        self.buffer = buffer
+
+    def __contains__(self, name):
+        return name in self.header['sections']
+
+    def read_section(self, name):
+        offset, length = self.header['sections'][name]
+        start = self.header['base'] + offset
+        if self.buffer is not None:
+            return self.buffer[start:start + length]
+        with io.open(self.path, 'rb') as file:
+            file.seek(start)
+            return file.read(length)
+
+    def is_mapped(self, name):
+        return name in self.header['mapped']
+
+    def load(self, name):
+        if name not in self:
+            filename = os.path.join(os.path.dirname(self.path), DATASETS[name][0])
+            raise FileNotFoundError(errno.ENOENT, 'No such file or directory', filename)
+        with timer('load.snapshot.%s' % name):
+            if not self.is_mapped(name):
+                return pickle.loads(self.read_section(name))
+            if self.buffer is not None:
+                return zoa_mmap.attach(self.buffer, self.header['base'] + self.header['sections'][name][0])
+            return zoa_mmap.attach(self.read_section(name), 0)
+
+def read_snapshot(path):
+    # The snapshot at path, None if it isn't one of this version; the file the
+    # header was read from is the one mapped
+    with io.open(path, 'rb') as file:
+        header = read_snapshot_header(file)
+        if header is None:
+            return None
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if MAP_SNAPSHOT else None
+    return Snapshot(path, header, buffer)
+
+def open_snapshot(data_dir='data', path=None):
+    # Returns a Snapshot that is guaranteed to match the current source files,
+    # rebuilding only the datasets whose source changed since the last build
+    path = path or snapshot_path(data_dir)
+    try:
+        old = read_snapshot(path)
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError, struct.error):
+        old = None
+
+    if old and set(old.header['sources']) == set(DATASETS):
+        sources = old.header['sources']
+        stale = [name for name, (filename, loader) in DATASETS.items()
+                 if not source_is_current(os.path.join(data_dir, filename), sources[name])]
+        if not stale:
+            return old
+        reuse = {name: (sources[name], old.read_section(name), old.is_mapped(name))
+                 for name in DATASETS if name not in stale and name in old}
+        build_snapshot(data_dir, path, reuse=reuse)
+    else:
+        build_snapshot(data_dir, path)
+    return read_snapshot(path)
+
+class DataRegistry:
+    # Datasets are only unpickled from the snapshot the first time they are
+    # accessed; prefetch() can warm them on a background thread and watch()
+    # reloads the ones whose source file changes while running
+    def __init__(self, data_dir='data'):
+        self.data_dir = data_dir
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in list(DATASETS) + list(DERIVED)}
+        self._data = {}
+        self._prefetch_thread = None
+        self._reload_lock = threading.Lock()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            with self._snapshot_lock:
+                if self._snapshot is None:
+                    self._snapshot = open_snapshot(self.data_dir)
+        return self._snapshot
+
+    def get(self, name):
+        # self._data is read once per step, reload() may replace it at any time
+        value = self._data.get(name)
+        if value is not None:
+            return value
+        with self._locks[name]:
+            value = self._data.get(name)
+            if value is None:
+                if name in DERIVED:
+                    sources = [self.get(s) for s in derived_sources(name)]
+                    with timer('load.index.%s' % name):
+                        value = DERIVED[name][1](*sources)
+                else:
+                    value = self.snapshot.load(name)
+                self._data[name] = value
+        return value
+
+    def available(self, name):
+        # False when the source file of the dataset (or of one an index is
+        # built from) is missing
+        if name in DERIVED:
+            return all(self.available(s) for s in derived_sources(name))
+        return name in self.snapshot
+
+    def is_loaded(self, name):
+        return name in self._data
+
+    def unload(self, name):
+        self._data.pop(name, None)
+
+    def prefetch(self, names=None, background=True):
+        # Datasets without a source file are skipped, not an error until used
+        names = list(names) if names is not None else list(DATASETS)
+        def run():
+            for name in names:
+                if self.available(name):
+                    self.get(name)
+        if not background:
+            run()
+            return None
+        self._prefetch_thread = threading.Thread(target=run, name='zoa-prefetch', daemon=True)
+        self._prefetch_thread.start()
+        return self._prefetch_thread
+
+    def wait(self, timeout=None):
+        if self._prefetch_thread:
+            self._prefetch_thread.join(timeout)
+
+    def reload(self):
+        # Picks up changed source files: the snapshot is rebuilt for just those
+        # datasets, new versions of the loaded ones and of the indexes built
+        # from them are made next to the old ones, then all are swapped in with
+        # one assignment. Readers never wait and see either the old or the new
+        # data. Indexes with an updated() method (AliasIndex) are patched
+        # instead of rebuilt. Returns the names of the datasets that changed.
+        with self._reload_lock:
+            old = self.snapshot
+            new = open_snapshot(self.data_dir)
+            changed = [name for name in DATASETS if new.header['sources'][name] != old.header['sources'][name]]
+            if not changed:
+                return []
+            affected = [name for name in DERIVED if set(derived_sources(name)) & set(changed)]
+            current = self._data
+            values = {name: new.load(name) for name in changed if name in current}
+            for name in affected:
+                previous = current.get(name)
+                if previous is None:
+                    continue
+                sources = [values[s] if s in values else new.load(s) if s in changed else self.get(s)
+                           for s in derived_sources(name)]
+                with timer('load.index.%s' % name):
+                    if hasattr(previous, 'updated') and len(sources) == 1:
+                        values[name] = previous.updated(*sources)
+                    else:
+                        values[name] = DERIVED[name][1](*sources)
+
+            # Anything loaded from the old snapshot meanwhile is dropped and
+            # loaded again from the new one on its next use
+            locks = [self._locks[name] for name in sorted(affected) + sorted(changed)]
+            for lock in locks:
+                lock.acquire()
+            try:
+                data = dict(self._data)
+                for name in affected + changed:
+                    data.pop(name, None)
+                data.update(values)
+                self._snapshot = new
+                self._data = data
+            finally:
+                for lock in locks:
+                    lock.release()
+            return changed
+
+    def source_stats(self):
+        stats = {}
+        for name, (filename, loader) in DATASETS.items():
+            try:
+                st = os.stat(os.path.join(self.data_dir, filename))
+                stats[name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                stats[name] = None
+        return stats
+
+    def watch(self, interval=WATCH_INTERVAL, callback=None):
+        # Checks the source files every interval seconds on a daemon thread and
+        # reloads when one changed and then stayed the same for one interval
+        # (so half-written files are skipped). callback(names) runs on the
+        # watcher thread after each reload. A failed reload is reported on
+        # stderr and tried again once the files change again; the data loaded
+        # before stays in use.
+        if self._watch_thread:
+            return self._watch_thread
+        self._watch_stop.clear()
+
+        def run():
+            seen = last = self.source_stats()
+            failed = None
+            while not self._watch_stop.wait(interval):
+                stats = self.source_stats()
+                # Sources that exist are all present (not mid-replace) and
+                # unchanged for one interval
+                present = all(stats[name] is not None for name in stats if seen[name] is not None)
+                if stats != seen and stats == last and stats != failed and present:
+                    try:
+                        changed = self.reload()
+                    except Exception as e:
+                        failed = stats
+                        print('Reloading %s failed: %s: %s' % (self.data_dir, type(e).__name__, e), file=sys.stderr)
+                    else:
+                        seen = stats
+                        if changed and callback:
+                            callback(changed)
+                last = stats
+
+        self._watch_thread = threading.Thread(target=run, name='zoa-watch', daemon=True)
+        self._watch_thread.start()
+        return self._watch_thread
+
+    def stop_watching(self):
+        self._watch_stop.set()
+        if self._watch_thread:
+            self._watch_thread.join()
+            self._watch_thread = None
+
+    airports = property(lambda self: self.get('airports'))
+    airlines = property(lambda self: self.get('airlines'))
+    aircraft = property(lambda self: self.get('aircraft'))
+    faa_routes = property(lambda self: self.get('faa_routes'))
+    loa_routes = property(lambda self: self.get('loa_routes'))
+    aliases = property(lambda self: self.get('aliases'))
+    alias_index = property(lambda self: self.get('alias_index'))
+    loa_engine = property(lambda self: self.get('loa_engine'))
+    route_index = property(lambda self: self.get('route_index'))
+    airport_search = property(lambda self: self.get('airport_search'))
+    airline_search = property(lambda self: self.get('airline_search'))
+    aircraft_search = property(lambda self: self.get('aircraft_search'))
+
+if __name__ == '__main__':
+    # Build step: python zoa_data.py [data_dir]
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    print('Wrote %s' % build_snapshot(data_dir))
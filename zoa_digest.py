@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from zoa_data import DataRegistry
+from zoa_metar import ZOA_TOWERED
+from zoa_prefroutes import faa_identifier
+from zoa_flightaware import RouteStore, ROUTE_STORE_PATH, icao_identifier
+
+DIGEST_PATH = os.path.join('data', 'route_digest.db')
+
+# Digest section -> dataset it is built from; flightaware comes from the local
+# FlightAware route store (python zoa_flightaware.py --preferred)
+SECTIONS = {
+    'faa'         : 'faa_routes',
+    'loa'         : 'loa_routes',
+    'aliases'     : 'aliases',
+    'flightaware' : None
+}
+
+# FlightAware routes kept per pair, most often filed first
+FLIGHTAWARE_TOP = 10
+
+# Section -> (source shown, route field, detail fields) in digest tables
+DISPLAY_FIELDS = {
+    'faa'         : ('FAA', 'Route String', ['Type', 'Altitude', 'Aircraft']),
+    'loa'         : ('LOA', 'Route', ['Notes']),
+    'aliases'     : ('Alias', 'text', ['command']),
+    'flightaware' : ('FlightAware', 'Full Route', ['Frequency', 'Altitude'])
+}
+
+# With more pairs than this to build, they are split across a process pool
+PARALLEL_THRESHOLD = 2000
+CHUNK_SIZE = 250
+
+def digest_pairs(data, airports=ZOA_TOWERED):
+    # (departure, arrival) ICAO pairs: FAA preferred route pairs leaving one of
+    # the airports, plus the pairs of those airports and the arrivals named in
+    # routes.csv that an LOA rule applies to
+    ids = {faa_identifier(a) for a in airports}
+    pairs = {(icao_identifier(o), icao_identifier(d)) for o, d in data.faa_routes.pairs() if o in ids}
+    arrivals = {a for row in data.loa_routes for a in row['Arrival_Regex'].split('|') if a.isalnum()}
+    engine = data.loa_engine
+    pairs.update((d, a) for d in airports for a in arrivals if d != a and engine.match_ids(d, a))
+    return sorted(pairs)
+
+def frequency(route):
+    digits = ''.join(c for c in route.get('Frequency') or '' if c.isdigit())
+    return int(digits) if digits else 0
+
+def build_section(data, section, departure, arrival):
+    if section == 'faa':
+        return data.faa_routes.lookup(faa_identifier(departure), faa_identifier(arrival))
+    if section == 'loa':
+        return data.loa_engine.match(departure, arrival)
+    if section == 'aliases':
+        return [{'command': command, 'text': text} for command, text in data.alias_index.for_pair(departure, arrival)]
+    raise KeyError(section)
+
+def flightaware_section(store, departure, arrival):
+    routes = store.get(departure, arrival)[0] if store is not None else None
+    return sorted(routes or [], key=frequency, reverse=True)[:FLIGHTAWARE_TOP]
+
+def source_signatures(data, store=None):
+    # {section: signature of its source}, as stored with the digest: the
+    # content hash the snapshot keeps of each dataset file (null while the
+    # file is missing) and the signature of the FlightAware route store
+    sources = data.snapshot.header['sources']
+    signatures = {}
+    for section, name in SECTIONS.items():
+        if name:
+            signature = sources[name][2] if sources.get(name) else None
+        else:
+            signature = store.signature() if store is not None else None
+        signatures[section] = json.dumps(signature)
+    return signatures
+
+def build_rows(data, sections, pairs):
+    # [(departure, arrival, [section json, ...])] for the dataset sections
+    return [(d, a, [json.dumps(build_section(data, s, d, a)) for s in sections]) for d, a in pairs]
+
+# Per-process registry for the process pool, opened once by the initializer
+_worker_data = None
+
+def init_worker(data_dir):
+    global _worker_data
+    _worker_data = DataRegistry(data_dir)
+
+def build_chunk(job):
+    sections, pairs = job
+    return build_rows(_worker_data, sections, pairs)
+
+class RouteDigest:
+    # One merged record per city pair in an sqlite file, keyed (and indexed) by
+    # (departure, arrival): a single lookup returns the preferred routes, LOA
+    # rules, route aliases and top FlightAware routes of a pair. The signature
+    # of each section's source is stored too, so a rebuild only redoes the
+    # sections whose source changed.
+    def __init__(self, path=DIGEST_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('CREATE TABLE IF NOT EXISTS digest (departure TEXT, arrival TEXT, %s, '
+                        'PRIMARY KEY (departure, arrival))' % ', '.join('%s TEXT' % s for s in SECTIONS))
+        self.db.execute('CREATE TABLE IF NOT EXISTS sources (section TEXT PRIMARY KEY, signature TEXT)')
+
+    def get(self, departure, arrival):
+        # {'departure', 'arrival', 'faa', 'loa', 'aliases', 'flightaware'} or None
+        with self.lock:
+            row = self.db.execute('SELECT %s FROM digest WHERE departure = ? AND arrival = ?' % ', '.join(SECTIONS),
+                                  (departure.upper(), arrival.upper())).fetchone()
+        if row is None:
+            return None
+        digest = {'departure': departure.upper(), 'arrival': arrival.upper()}
+        digest.update((s, json.loads(value) if value else []) for s, value in zip(SECTIONS, row))
+        return digest
+
+    def pairs(self):
+        with self.lock:
+            return set(self.db.execute('SELECT departure, arrival FROM digest').fetchall())
+
+    def signatures(self):
+        with self.lock:
+            return dict(self.db.execute('SELECT section, signature FROM sources').fetchall())
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM digest').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+_digest = None
+_digest_lock = threading.Lock()
+
+def default_digest():
+    # The digest in data/, None until it has been built
+    global _digest
+    with _digest_lock:
+        if _digest is None and os.path.exists(DIGEST_PATH):
+            try:
+                _digest = RouteDigest(DIGEST_PATH)
+            except sqlite3.Error:
+                pass
+    return _digest
+
+def digest_rows(digest):
+    # [{'Source', 'Route', 'Detail'}] of every section, for one table
+    rows = []
+    for section, (source, route_field, detail_fields) in DISPLAY_FIELDS.items():
+        for entry in digest.get(section) or []:
+            rows.append({'Source': source, 'Route': entry.get(route_field, ''),
+                         'Detail': ' '.join(str(entry[f]) for f in detail_fields if entry.get(f))})
+    return rows
+
+def lookup_digest(data, departure, arrival, digest=None):
+    # The digest of a pair: one keyed read when it has been built. Sections
+    # whose source changed since the digest was built are built live from
+    # the current data, and so is the whole record of a pair the digest
+    # doesn't cover (or when there is no digest yet).
+    from zoa_flightaware import default_store
+    if digest is None:
+        digest = default_digest()
+    departure, arrival = departure.upper(), arrival.upper()
+    store = default_store()
+    result = digest.get(departure, arrival) if digest is not None else None
+    if result is None:
+        result = {'departure': departure, 'arrival': arrival}
+        stale = list(SECTIONS)
+    else:
+        stored = digest.signatures()
+        stale = [s for s, signature in source_signatures(data, store).items() if stored.get(s) != signature]
+    result.update((s, build_section(data, s, departure, arrival) if SECTIONS[s] else
+                      flightaware_section(store, departure, arrival)) for s in stale)
+    return result
+
+def build_digest(digest, data_dir='data', airports=ZOA_TOWERED, store_path=ROUTE_STORE_PATH, workers=None, full=False):
+    # Brings the digest up to date: pairs that are new get every section,
+    # pairs that are gone are removed, and the other pairs get only the
+    # sections whose source changed since the last build. Returns a summary.
+    data = DataRegistry(data_dir)
+    store = RouteStore(store_path) if os.path.exists(store_path) else None
+    signatures = source_signatures(data, store)
+    stored = {} if full else digest.signatures()
+    changed = [s for s in SECTIONS if stored.get(s) != signatures[s]]
+
+    pairs = digest_pairs(data, airports)
+    existing = digest.pairs()
+    added = [p for p in pairs if p not in existing]
+    kept = [p for p in pairs if p in existing] if changed else []
+    removed = existing - set(pairs)
+
+    # (insert or update, sections, pairs) in chunks for the workers
+    work = [('insert', [s for s in SECTIONS if SECTIONS[s]], added), ('update', [s for s in changed if SECTIONS[s]], kept)]
+    jobs = [(mode, sections, todo[i:i + CHUNK_SIZE]) for mode, sections, todo in work if sections
+            for i in range(0, len(todo), CHUNK_SIZE)]
+    chunks = [(sections, chunk) for mode, sections, chunk in jobs]
+    if workers is None:
+        workers = os.cpu_count() if sum(len(chunk) for sections, chunk in chunks) >= PARALLEL_THRESHOLD else 1
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data_dir,)) as pool:
+            results = list(pool.map(build_chunk, chunks))
+    else:
+        results = [build_rows(data, *chunk) for chunk in chunks]
+
+    with digest.lock:
+        db = digest.db
+        db.execute('BEGIN')
+        try:
+            db.executemany('DELETE FROM digest WHERE departure = ? AND arrival = ?', sorted(removed))
+            for (mode, sections, chunk), rows in zip(jobs, results):
+                if mode == 'insert':
+                    db.executemany('INSERT OR REPLACE INTO digest (departure, arrival, %s) VALUES (?, ?, %s)'
+                                   % (', '.join(sections), ', '.join('?' * len(sections))),
+                                   [(d, a) + tuple(values) for d, a, values in rows])
+                else:
+                    db.executemany('UPDATE digest SET %s WHERE departure = ? AND arrival = ?'
+                                   % ', '.join('%s = ?' % s for s in sections),
+                                   [tuple(values) + (d, a) for d, a, values in rows])
+            # FlightAware routes are read from the route store here, not in the workers
+            fa_pairs = added + kept if 'flightaware' in changed else added
+            db.executemany('UPDATE digest SET flightaware = ? WHERE departure = ? AND arrival = ?',
+                           [(json.dumps(flightaware_section(store, d, a)), d, a) for d, a in fa_pairs])
+            db.executemany('INSERT OR REPLACE INTO sources VALUES (?, ?)', sorted(signatures.items()))
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+    if store is not None:
+        store.close()
+    return {'pairs': len(pairs), 'added': len(added), 'removed': len(removed),
+            'updated': len(kept), 'sections': changed, 'workers': workers}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the city pair route digest, or show the digest of pairs')
+    parser.add_argument('pair', nargs='*', help='DEP ARR [DEP ARR ...] to show instead of building')
+    parser.add_argument('--airports', nargs='+', default=ZOA_TOWERED, help='departures to build the digest for (default: ZOA towered airports)')
+    parser.add_argument('-w', '--workers', type=int, help='processes (default: every core for large builds)')
+    parser.add_argument('--full', action='store_true', help='rebuild every section of every pair')
+    parser.add_argument('--digest', default=DIGEST_PATH)
+    parser.add_argument('--store', default=ROUTE_STORE_PATH, help='FlightAware route store')
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+
+    digest = RouteDigest(args.digest)
+    if args.pair:
+        if len(args.pair) % 2:
+            parser.error('pairs are given as DEP ARR')
+        for departure, arrival in zip(args.pair[::2], args.pair[1::2]):
+            json.dump(digest.get(departure, arrival), sys.stdout, indent=1)
+            print()
+        return
+    start = time.perf_counter()
+    summary = build_digest(digest, args.data_dir, [a.upper() for a in args.airports], args.store, args.workers, args.full)
+    print('%(pairs)d pairs: %(added)d added, %(removed)d removed, %(updated)d updated' % summary +
+          ' (%s) in %.2fs with %d process(es)' % (', '.join(summary['sections']) or 'no sources changed',
+                                                time.perf_counter() - start, summary['workers']), file=sys.stderr)
+    digest.close()
+
+if __name__ == '__main__':
+    main()
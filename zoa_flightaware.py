@@ -0,0 +1,267 @@
+import io
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import urllib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from zoa_metar import ZOA_TOWERED
+from zoa_prefroutes import faa_identifier
+from zoa_perf import timer, count
+from zoa_cache import TTLS
+
+FLIGHTAWARE_URL = 'https://flightaware.com/analysis/route.rvt?'
+ROUTE_STORE_PATH = os.path.join('data', 'flightaware_routes.db')
+ROUTE_COLUMNS = ['Frequency', 'Altitude', 'Full Route']
+
+# Routes older than this are refetched by prefetch. Interactive lookups
+# (get_routes) refetch after the 'flightaware' cache TTL instead, and only
+# fall back to older routes when a live fetch fails.
+MAX_AGE = 7 * 24 * 60 * 60
+
+# FlightAware throttles aggressive clients; requests per second across all workers
+RATE = 1.0
+MAX_WORKERS = 4
+TIMEOUT = (3.05, 15)
+
+def flightaware_url(departure, arrival):
+    params = {'origin': departure, 'destination': arrival}
+    params_url = urllib.parse.urlencode(params)
+    return FLIGHTAWARE_URL + params_url
+
+def route_table_html(html):
+    # The route table is a small part of a large page; cutting it out before
+    # parsing avoids building a tree for the rest of the page
+    start = html.find('prettyTable fullWidth')
+    if start < 0:
+        return html
+    start = html.rfind('<table', 0, start)
+    stop = html.find('</table>', start)
+    return html[start:stop + len('</table>')] if start >= 0 and stop >= 0 else html
+
+def parse_flightaware_routes(html):
+    # [{'Frequency', 'Altitude', 'Full Route'}] from an IFR Route Analyzer page,
+    # same result as the former BeautifulSoup parse; None if there is no table
+    import lxml.html
+    if isinstance(html, bytes):
+        html = html.decode('utf8', 'replace')
+    root = lxml.html.fromstring(route_table_html(html))
+    tables = root.xpath('descendant-or-self::table[contains(concat(" ", normalize-space(@class), " "), " prettyTable ")'
+                        ' and contains(concat(" ", normalize-space(@class), " "), " fullWidth ")]')
+    if not tables:
+        return None
+    table = tables[0]
+    headers = [th.text_content() for th in table.xpath('.//th[contains(concat(" ", normalize-space(@class), " "), " secondaryHeader ")]')]
+    results = [{headers[i]: cell.text_content() for i, cell in enumerate(row.iter('td')) if i < len(headers)}
+               for row in table.iter('tr')]
+    return [{k: v for k, v in r.items() if k in ROUTE_COLUMNS} for r in results if r]
+
+class RouteStore:
+    # FlightAware routes per city pair in an sqlite file, keyed (and indexed)
+    # by (origin, destination), so lookups don't need the network
+    def __init__(self, path=ROUTE_STORE_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('CREATE TABLE IF NOT EXISTS routes (origin TEXT, destination TEXT, fetched REAL, routes TEXT, '
+                        'PRIMARY KEY (origin, destination))')
+
+    def get(self, departure, arrival, max_age=None):
+        # Returns (routes, fetched time) or (None, None)
+        with self.lock:
+            row = self.db.execute('SELECT routes, fetched FROM routes WHERE origin = ? AND destination = ?',
+                                  (departure.upper(), arrival.upper())).fetchone()
+        if row is None or (max_age is not None and row[1] < time.time() - max_age):
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def put(self, departure, arrival, routes):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO routes VALUES (?, ?, ?, ?)',
+                            (departure.upper(), arrival.upper(), time.time(), json.dumps(routes)))
+
+    def fresh_pairs(self, max_age=MAX_AGE):
+        with self.lock:
+            rows = self.db.execute('SELECT origin, destination FROM routes WHERE fetched >= ?', (time.time() - max_age,))
+            return set(rows.fetchall())
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM routes').fetchone()[0]
+
+    def signature(self):
+        # [pairs stored, last fetch time]; changes whenever a pair is stored
+        with self.lock:
+            return list(self.db.execute('SELECT COUNT(*), MAX(fetched) FROM routes').fetchone())
+
+    def close(self):
+        self.db.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def default_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = RouteStore()
+            except sqlite3.Error:
+                pass
+    return _store
+
+class RateLimiter:
+    # Spaces calls at least 1/rate seconds apart across threads
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next)
+            self.next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def make_session(max_workers=MAX_WORKERS):
+    # requests (and lxml) are only imported once something has to be fetched,
+    # lookups served from the route store don't pay for them
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_flightaware_routes(departure, arrival, session=None, save_html=None):
+    if session is None:
+        import requests as session
+    with timer('fetch.flightaware'):
+        r = session.get(flightaware_url(departure, arrival), timeout=TIMEOUT)
+    r.raise_for_status()
+    count('bytes.flightaware', len(r.content))
+    if save_html:
+        with io.open(os.path.join(save_html, '%s-%s.html' % (departure.upper(), arrival.upper())), 'wb') as file:
+            file.write(r.content)
+    with timer('parse.flightaware'):
+        return parse_flightaware_routes(r.text)
+
+def get_routes(departure, arrival, store=None, max_age=None):
+    # Interactive lookup: a stored result younger than max_age (default: the
+    # 'flightaware' cache TTL) is returned without any request; otherwise the
+    # page is fetched and stored. When the fetch fails an older stored result
+    # is still better than nothing.
+    store = default_store() if store is None else store
+    if max_age is None:
+        max_age = TTLS['flightaware']
+    if store is not None:
+        routes, fetched = store.get(departure, arrival, max_age)
+        if routes is not None:
+            count('store.flightaware.hits')
+            return routes
+        count('store.flightaware.misses')
+    try:
+        routes = fetch_flightaware_routes(departure, arrival)
+    except:
+        routes = None
+    if store is not None:
+        if routes is not None:
+            store.put(departure, arrival, routes)
+        else:
+            routes = store.get(departure, arrival)[0]
+    return routes
+
+def prefetch(pairs, store, rate=RATE, max_workers=MAX_WORKERS, max_age=MAX_AGE, save_html=None, progress=None):
+    # Fetches every (departure, arrival) pair not already fresh in the store,
+    # concurrently but never faster than rate requests per second.
+    # Returns {'fetched': n, 'skipped': n, 'failed': n}.
+    fresh = store.fresh_pairs(max_age)
+    todo = list(dict.fromkeys((d.upper(), a.upper()) for d, a in pairs))
+    missing = [p for p in todo if p not in fresh]
+    summary = {'fetched': 0, 'skipped': len(todo) - len(missing), 'failed': 0}
+    limiter = RateLimiter(rate)
+    session = make_session(max_workers)
+
+    def fetch(pair):
+        limiter.wait()
+        return fetch_flightaware_routes(pair[0], pair[1], session, save_html)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, p): p for p in missing}
+        for future in as_completed(futures):
+            pair = futures[future]
+            try:
+                routes = future.result()
+            except:
+                routes = None
+            if routes is None:
+                summary['failed'] += 1
+            else:
+                store.put(pair[0], pair[1], routes)
+                summary['fetched'] += 1
+            if progress:
+                progress(pair, routes)
+    session.close()
+    return summary
+
+def icao_identifier(airport):
+    return 'K' + airport if len(airport) == 3 else airport
+
+def preferred_route_pairs(faa_routes, airports=ZOA_TOWERED, limit=None):
+    # City pairs of the FAA preferred routes touching the given airports,
+    # the pairs with the most preferred routes first
+    ids = {faa_identifier(a) for a in airports}
+    pairs = [(stop - start, orig, dest) for (orig, dest), (start, stop) in faa_routes.index.items()
+             if orig in ids or dest in ids]
+    pairs.sort(key=lambda p: (-p[0], p[1], p[2]))
+    return [(icao_identifier(o), icao_identifier(d)) for n, o, d in pairs[:limit]]
+
+def traffic_pairs(flights, limit=None):
+    # Most frequent city pairs of a traffic file
+    counts = Counter((f['departure'].upper(), f['arrival'].upper()) for f in flights if f['departure'] and f['arrival'])
+    return [p for p, n in counts.most_common(limit)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prefetch FlightAware IFR routes into the local route store')
+    parser.add_argument('--pair', nargs=2, action='append', metavar=('DEP', 'ARR'), help='city pair to fetch')
+    parser.add_argument('--traffic', help='fetch the most frequent pairs of a CSV/JSON traffic file')
+    parser.add_argument('--preferred', action='store_true', help='fetch the FAA preferred route pairs of ZOA airports')
+    parser.add_argument('--top', type=int, help='only the first N pairs of --traffic/--preferred')
+    parser.add_argument('--rate', type=float, default=RATE, help='requests per second (default: %(default)s)')
+    parser.add_argument('-w', '--workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--max-age', type=float, default=MAX_AGE / 3600.0, help='refetch pairs older than this many hours')
+    parser.add_argument('--save-html', help='also save the raw pages here, e.g. as benchmark fixtures')
+    parser.add_argument('--store', default=ROUTE_STORE_PATH)
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+
+    pairs = [tuple(p) for p in args.pair or []]
+    if args.traffic:
+        from zoa_batch import iter_flights
+        pairs += traffic_pairs(iter_flights(args.traffic), args.top)
+    if args.preferred:
+        from zoa_data import DataRegistry
+        pairs += preferred_route_pairs(DataRegistry(args.data_dir).faa_routes, limit=args.top)
+    if not pairs:
+        parser.error('nothing to fetch: give --pair, --traffic or --preferred')
+    if args.save_html:
+        os.makedirs(args.save_html, exist_ok=True)
+
+    def progress(pair, routes):
+        print('%s-%s: %s' % (pair[0], pair[1], 'failed' if routes is None else '%d routes' % len(routes)), file=sys.stderr)
+
+    store = RouteStore(args.store)
+    start = time.perf_counter()
+    summary = prefetch(pairs, store, args.rate, args.workers, args.max_age * 3600, args.save_html, progress)
+    print('%(fetched)d fetched, %(skipped)d already stored, %(failed)d failed' % summary +
+          ' in %.1fs (%d pairs in %s)' % (time.perf_counter() - start, len(store), args.store), file=sys.stderr)
+    store.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,99 +1,66 @@
+import sys
+if __name__ == '__main__':
+    # --profile[=trace.prof|trace.folded] prints where the time went at exit (see zoa_perf)
+    import zoa_perf
+    zoa_perf.configure(sys.argv)
+    if len(sys.argv) > 1:
+        # Scriptable commands (python zoa_helper.py routes KSFO KLAX --json) skip
+        # the interactive imports below
+        from zoa_cli import main as cli_main
+        sys.exit(cli_main())
+
 from InquirerPy import inquirer
 from InquirerPy.base.control import Choice
 from InquirerPy.utils import color_print
+from prompt_toolkit.completion import Completer, Completion
 from tabulate import tabulate
-import io
-import csv
 import os
-import requests
-from bs4 import BeautifulSoup
 import webbrowser
-import re
-import json
-import xmltodict
-import math
-import urllib
+from zoa_data import DataRegistry, DATASETS
+from zoa_wx import default_client, ZOA_MAJORS
+from zoa_runways import default_runway_engine
+from zoa_cache import default_cache
+from zoa_flightaware import flightaware_url, get_routes
+from zoa_charts import get_charts
+from zoa_compliance import ComplianceChecker
+from zoa_digest import lookup_digest, digest_rows
+from zoa_perf import timer, set_action
+from zoa_pager import page_table
+from zoa_prefroutes import FAA_ROUTE_DISPLAY_COLUMNS
+from zoa_codes import sanitize_airport
+
+# Datasets warmed in the background while the default departure/arrival prompts are open.
+# The FAA preferred routes and alias tables are only loaded if those actions are used.
+PREFETCH_DATASETS = ['airports', 'loa_engine', 'airlines', 'aircraft', 'airline_search', 'aircraft_search', 'airport_search']
+
+# Suggestions shown while typing a code, and matches listed by Reverse Code Lookup
+COMPLETION_LIMIT = 12
+REVERSE_LOOKUP_LIMIT = 10
+
+# Airports always included in the startup weather briefing
+BRIEFING_AIRPORTS = ZOA_MAJORS
+
+class CodeCompleter(Completer):
+    # As-you-type suggestions from one of the registry's code indexes: codes,
+    # names, callsigns and model words all match ('skywest' -> SKW)
+    def __init__(self, data, index, limit=COMPLETION_LIMIT):
+        self.data = data
+        self.index = index
+        self.limit = limit
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
+        # Looked up on every keystroke so a reloaded data file is picked up
+        for code, label in self.data.get(self.index).search(text, self.limit):
+            yield Completion(code, start_position=-len(text), display_meta=label)
 
 def simplify_dict(original_dict, new_dict_keys):
     return {k: v for k, v in original_dict.items() if k in new_dict_keys}
 
-def load_airport_data(csv_filename):
-    airport_data = {}
-    with io.open(csv_filename,'r', encoding='utf8') as file:
-        reader = csv.DictReader(file, delimiter=',')
-        for row in reader:
-            id = row['ident']
-            airport_data[id] = row
-    return airport_data
-
-def load_airline_data(csv_filename):
-    airline_data = {}
-    with io.open(csv_filename,'r', encoding='utf8') as file:
-        reader = csv.DictReader(file, delimiter=',')
-        for row in reader:
-            if row['ICAO'] != 'n\a':
-                id = row['ICAO']
-                airline_data[id] = row
-    return airline_data
-
-def load_route_data(csv_filename):
-    route_data = []
-    with io.open(csv_filename,'r', encoding='utf8') as file:
-        reader = csv.DictReader(file, delimiter=',')
-        for row in reader:
-            route_data.append(row)
-    return route_data
-
-def load_aircraft_data(csv_filename):
-    ac_data = {}
-    with io.open(csv_filename,'r', encoding='utf8') as file:
-        reader = csv.DictReader(file, delimiter=',')
-        for row in reader:
-            id = row['ICAO Code']
-            if id != '' or id != 'n/a':
-                ac_data[id] = row
-    return ac_data
-
-def load_FAA_route_data(csv_filename):
-    route_data = {}
-    with io.open(csv_filename,'r', encoding='utf8') as file:
-        reader = csv.DictReader(file, delimiter=',')
-        for row in reader:
-            id = row['Orig']
-            if id in route_data:
-                route_data[id].append(row)
-            else:
-                route_data[id] = [row]
-    return route_data
-
-def load_alias_data(txt_filename):
-    cmds = {}
-    exp = re.compile(r'(?P<cmd>\.[a-zA-Z0-9]*) \.am rte (?P<txt>.+)')
-    with io.open(txt_filename, 'r') as file:
-        for line in file:
-            m = exp.match(line)
-            if m:
-                cmds[m.group('cmd')] = m.group('txt').strip()
-    return cmds
-
-def sanitize_airport(airport):
-    if len(airport) == 3:
-        return 'K' + airport.upper()
-    return airport.upper()
-
-def flightaware_url(departure, arrival):
-    base_url = 'https://flightaware.com/analysis/route.rvt?'
-    params = {'origin': departure, 'destination': arrival}
-    params_url = urllib.parse.urlencode(params)
-    return base_url + params_url
-
 def get_flightaware_routes(departure, arrival):
-    r = requests.get(flightaware_url(departure,arrival))
-    soup = BeautifulSoup(r.text, 'html.parser')
-    table_raw = soup.find('table', class_ = 'prettyTable fullWidth')
-    headers = [header.text for header in table_raw.find_all('th', class_ = 'secondaryHeader')]
-    results = [{headers[i]: cell.text for i, cell in enumerate(row.find_all('td'))} for row in table_raw.find_all('tr')]
-    return [simplify_dict(i, ['Frequency', 'Altitude', 'Full Route']) for i in results if i]
+    # Served from the local route store when prefetched (python zoa_flightaware.py)
+    return default_cache().get_or_fetch('flightaware', '%s-%s' % (departure.upper(), arrival.upper()),
+                                        lambda: get_routes(departure, arrival))
 
 def open_flightaware(departure, arrival):
     webbrowser.open_new(flightaware_url(departure, arrival))
@@ -103,147 +70,64 @@ def open_skyvector(flightplan):
     webbrowser.open_new(url)
 
 def get_faa_charts(airport, chart_type='SIDS'):
-    chart_str_dict = {
-        'SIDS'  : 'Departure Procedure (DP) Charts',
-        'STARS' : 'Standard Terminal Arrival (STAR) Charts'
-    }
-    if chart_type not in chart_str_dict:
-        return None
-    chart_str = chart_str_dict[chart_type]
-    
-    url = 'https://nfdc.faa.gov/nfdcApps/services/ajv5/airportDisplay.jsp?airportId=%s' % airport
-    r = requests.get(url)
-    soup = BeautifulSoup(r.text, 'html.parser')
-    h3 = soup.find('h3', string=chart_str)
-    if h3:
-        spans = h3.find_next_siblings('span')
-        results = {}
-        for s in spans:
-            links = s.find_all('a')
-            for l in links:
-                results[l.text] = l['href']
-        return(results)
-    else:
-        return None
-
-def get_atis(airport):
-    h = {
-        'Cache-Control': 'no-cache',
-        'Pragma': 'no-cache'
-    }
-    try:
-        base_url = 'http://datis.clowd.io/api/'
-        full_url = base_url + airport
-        r = requests.get(full_url, headers=h)
-        return json.loads(r.text)[0]['datis']
-    except:
-        return 'ERROR: NO D-ATIS FOUND'
-
-def get_latest_metar(airport, last_hours=2):
-    h = {
-        'Cache-Control': 'no-cache',
-        'Pragma': 'no-cache'
-    }
-    try:
-        base_url = 'https://www.aviationweather.gov/adds/dataserver_current/httpparam?'
-        params = {
-            'dataSource' : 'metars',
-            'requestType' : 'retrieve',
-            'format' : 'xml',
-            'mostRecent' : 'true',
-            'stationString' : airport,
-            'hoursBeforeNow' : last_hours
-        }
-        params_url = urllib.parse.urlencode(params)
-        full_url = base_url + params_url
-        r = requests.get(full_url, headers=h)
-        x = xmltodict.parse(r.text)
-        metar_dict = x['response']['data']['METAR']
-        return metar_dict
-    except:
-        return 'ERROR: METAR NOT FOUND OR UNAVAILABLE'
-
-def calc_wind_components(headwind_deg, wind_deg, wind_kts):
-    alpha = wind_deg - headwind_deg 
-    return (wind_kts * math.cos(math.radians(alpha)), wind_kts * math.sin(math.radians(alpha)))
-
-def max_headwind(runway_components):
-    max = -999
-    max_rw = None
-    for rw, (headwind, crosswind) in runway_components.items():
-        if headwind > max:
-            max = headwind
-            max_rw = rw
-    return rw
-
-def sfo_runway_config(metar=None, print_table=True):
-    wind_deg = 0
-    wind_speed = 0
-    runways = {
-        '28' : 284.5,
-        '10' : 104.5,
-        '01' : 14.5,
-        '19' : 194.5
-
-    }
-    wind_components = {}
-    if metar:
-        exp = re.compile(r'(?P<wind_deg>[0-9]{3})(?P<wind_spd>[0-9]{2})KT')
-        m = exp.match(metar)
-        wind_deg = int(m.group('wind_deg'))
-        wind_speed = int(m.group('wind_spd'))
-    else:
-        metar = get_latest_metar('KSFO')
-        wind_deg = int(metar['wind_dir_degrees'])
-        wind_speed = int(metar['wind_speed_kt'])
-    
-    for rw, rw_deg in runways.items():
-        wind_components[rw] = calc_wind_components(rw_deg, wind_deg, wind_speed)
-    
-    if print_table:
-        table = []
-        for k, v in wind_components.items():
-            table.append([k, v[0], v[1]])
-        print(tabulate(table, headers=['Runway', 'Headwind', 'Crosswind'], floatfmt='.0f'))
-
-    if wind_speed < 10:
-        return 'Norm Ops'
-    else:
-        if wind_components['01'][0] > -10 and abs(wind_components['01'][1]) < 20: 
-            if wind_components['28'][0] > -10 and abs(wind_components['28'][1]) < 20:
-                return 'Norm Ops'
-            else:
-                if wind_components['19'][0] > -10 and abs(wind_components['19'][1]) < 20 and wind_components['10'][0] > -10 and abs(wind_components['10'][1]):
-                    return 'East Ops'
-                else:
-                    max_hw_rw = max_headwind(wind_components)
-                    return 'Use Runway %s with headwind %d kts' % (max_hw_rw, wind_components[max_hw_rw][0])
+    # From the chart index of the current AIRAC cycle (python zoa_charts.py builds it ahead of time)
+    return get_charts(airport, chart_type)
+
+def print_compliance(result):
+    if result['status'] == 'NONE':
+        color_print([('yellow', 'No preferred, LOA or alias routes for this city pair')])
+        return
+    # FAA and LOA routes are checked separately; pairs with neither only have aliases
+    for r in (list(result['sources'].values()) or [result]):
+        if r['status'] in ('COMPLIANT', 'ALIAS'):
+            color_print([('green', 'Route matches %s: %s' % (r['source'], r['closest_route']))])
         else:
-            if wind_components['28'][0] > -10 and abs(wind_components['28'][1]) < 20:
-                return 'West Ops'
-            else:
-                if wind_components['19'][0] > -10 and abs(wind_components['19'][1]) < 20 and wind_components['10'][0] > -10 and abs(wind_components['10'][1]):
-                    return 'East Ops'
-                else:
-                    max_hw_rw = max_headwind(wind_components)
-                    return 'Use Runway %s with headwind %d kts' % (max_hw_rw, wind_components[max_hw_rw][0])
-
-def main():
-    # Load all necessary data
-    airport_data = load_airport_data('data/airports.csv')
-    airline_data = load_airline_data('data/airlines.csv')
-    loa_route_data = load_route_data('data/routes.csv')
-    aircraft_data = load_aircraft_data('data/aircraft.csv')
-    faa_route_data = load_FAA_route_data('data/prefroutes_db.csv')
-    alias_route_data = load_alias_data('data/ZOA_Alias.txt')
+            color_print([('red', 'Closest %s: %s' % (r['source'], r['closest_route']))])
+            color_print([('red', 'Amend: %s' % r['amendment'])])
+            if r['alias']:
+                color_print([('green', 'Alias: %s' % r['alias'])])
+
+def print_table(rows, **kwargs):
+    with timer('render.table'):
+        print(tabulate(rows, **kwargs))
+
+def more_rows(shown):
+    # Between pages of a long result table
+    return inquirer.confirm(message='%d rows shown. Next page?' % shown, default=True).execute()
+
+def print_cache_stats():
+    stats = default_cache().stats()
+    if stats:
+        table = [[k, v['hits'], v['disk_hits'], v['misses'], v['saved_seconds']] for k, v in sorted(stats.items())]
+        print_table(table, headers=['Cache', 'Hits', 'Disk Hits', 'Misses', 'Saved (s)'], floatfmt='.1f')
+
+def main(prefetch=True):
+    # Data is loaded lazily from the precompiled snapshot (rebuilt if any source file changed)
+    data = DataRegistry('data')
+    if prefetch:
+        data.prefetch(PREFETCH_DATASETS)
+    compliance = ComplianceChecker(data)
+
+    # Edited data files are reloaded in the background; the prompt isn't
+    # interrupted, the reload is reported before the next action menu
+    reloaded = []
+    def on_reload(names):
+        compliance.clear()
+        reloaded.extend(DATASETS[name][0] for name in names)
+    data.watch(callback=on_reload)
+
+    # Weather for the briefing airports is fetched in parallel while the default
+    # departure/arrival prompts are open
+    weather = default_client()
+    majors_briefing = weather.briefing_async(BRIEFING_AIRPORTS)
     
     # Create validator functions for InquirerPy
     def airport_validator(icao_code):
-        return icao_code.upper() in airport_data
+        return icao_code.upper() in data.airports
     def airline_validator(icao_code):
-        return icao_code.upper() in airline_data
+        return icao_code.upper() in data.airlines
     def aircraft_validator(icao_code):
-        return icao_code.upper() in aircraft_data
+        return icao_code.upper() in data.aircraft
 
     # Prompt user to set default departure and arrival airports when the program starts.
     # Note that we don't call the validator functions here since we aren't actually performing
@@ -260,24 +144,37 @@ def main():
         default = default_arr
     ).execute()
     default_arr = sanitize_airport(arrival)
+
+    briefing = {}
     if default_dep:
+        briefing[default_dep] = majors_briefing.get(default_dep) or weather.briefing_async([default_dep])[default_dep]
+    briefing.update((a, f) for a, f in majors_briefing.items() if a not in briefing)
+    for airport, (atis, metar) in briefing.items():
+        color_print([('green', '\n%s D-ATIS' % airport)])
         try:
-            color_print([('green', '\nD-ATIS')])
-            print(get_atis(default_dep))
+            print(atis.result())
         except:
             print('ERROR: COULD NOT RETRIEVE D-ATIS')
+        color_print([('green', '%s METAR' % airport)])
         try:
-            color_print([('green', '\nMETAR')])
-            print(get_latest_metar(default_dep)['raw_text'])
+            print(metar.result()['raw_text'])
         except:
             print('ERROR: COULD NOT RETRIEVE METAR')
     
-    if default_dep == 'KSFO':
-        color_print([('green', '\nRunway Winds and Config')])
-        print(sfo_runway_config(print_table=True))
+    # Recommended runway configuration for every briefing airport with runway data,
+    # evaluated in one pass over all METARs
+    metars = {a: metar.result() for a, (atis, metar) in briefing.items() if isinstance(metar.result(), dict)}
+    configs = default_runway_engine().recommend_all(metars)
+    if configs:
+        color_print([('green', '\nRunway Configs')])
+        table = [[a, metars[a].get('wind_dir_degrees', ''), metars[a].get('wind_speed_kt', ''), metars[a].get('wind_gust_kt', ''), c] for a, c in configs.items()]
+        print_table(table, headers=['Airport', 'Wind', 'Speed', 'Gust', 'Config'])
 
     while(True):
         print()
+        if reloaded:
+            color_print([('yellow', 'Reloaded %s' % ', '.join(sorted(set(reloaded))))])
+            del reloaded[:]
         action = inquirer.rawlist(
             message = 'Select an action:',
             choices = [
@@ -286,6 +183,7 @@ def main():
                 'ZOA Alias Routes',
                 'FAA Preferred Routes',
                 'LOA Route Check',
+                'City Pair Digest',
                 'Chart Reference',
                 'Code Lookup',
                 'Clear Screen',
@@ -295,6 +193,7 @@ def main():
             multiselect = False,
             show_cursor = False
         ).execute()
+        set_action(action)
 
         if action == 'FlightAware IFR Analyzer':
             departure = inquirer.text(
@@ -310,7 +209,7 @@ def main():
                 default = default_arr
             ).execute()
             routes = get_flightaware_routes(departure, arrival)
-            print(tabulate(routes, headers='keys'))
+            print_table(routes or [], headers='keys')
             open_browser = inquirer.confirm(
                 message = 'Open in Browser?', 
                 default = False
@@ -334,18 +233,19 @@ def main():
             flightplan = inquirer.text(
                 message = 'Flight Plan:',
             ).execute()
+            print_compliance(compliance.check(departure, arrival, flightplan))
             full_plan = '%s %s %s' % (departure, flightplan, arrival)
             open_skyvector(full_plan)
 
         if action == 'ZOA Alias Routes':
             search_string = inquirer.text(
-                message = 'Search String:',
+                message = 'Search String (alias, fix or airway):',
                 default = ''
             ).execute()
-            results = [[k,v] for k, v in alias_route_data.items() if search_string.upper() in k.upper()]
-            if results:
-                print(tabulate(results, headers=['Command', 'Text']))
-            else:
+            # Matches command names, fixes/airways in the route text and close
+            # misspellings; an empty search lists every alias a page at a time
+            results = data.alias_index.iter_search(search_string)
+            if not page_table(results, ['Command', 'Text'], more=more_rows):
                 color_print([('red', 'No results found')])
 
         if action == 'FAA Preferred Routes':
@@ -356,18 +256,18 @@ def main():
                 default = default_dep
             ).execute()
             arrival = inquirer.text(
-                message = 'Arrival:',
-                validate = airport_validator,
+                message = 'Arrival (blank for every route from the departure):',
+                validate = lambda code: not code or airport_validator(code),
                 invalid_message = 'Airport not found',
                 default = default_arr
             ).execute()
             departure = departure.upper()[1:]
             arrival = arrival.upper()[1:]
-            results = [i for i in faa_route_data[departure] if i['Dest'] == arrival]
-            headers = ['Route String', 'Type', 'Altitude', 'Aircraft']
-            if results:
-                print(tabulate([simplify_dict(i, headers) for i in results], headers='keys'))
+            if arrival:
+                results = data.faa_routes.iter_lookup(departure, arrival)
             else:
+                results = data.faa_routes.iter_lookup(departure, names=['Dest'] + FAA_ROUTE_DISPLAY_COLUMNS)
+            if not page_table(results, 'keys', more=more_rows):
                 color_print([('red', 'No results found')])
 
         if action == 'LOA Route Check':
@@ -383,13 +283,32 @@ def main():
                 invalid_message = 'Airport not found',
                 default = default_arr
             ).execute()
-            results = [i for i in loa_route_data if re.match(i['Departure_Regex'], departure.upper()) and re.match(i['Arrival_Regex'], arrival.upper())]
+            results = data.loa_engine.match(departure, arrival)
             headers = ['Route', 'RNAV Required', 'Notes']
             if results:
-                print(tabulate([simplify_dict(i, headers) for i in results], headers='keys'))
+                print_table([simplify_dict(i, headers) for i in results], headers='keys')
             else:
                 color_print([('red', 'No results found')])
 
+        if action == 'City Pair Digest':
+            departure = inquirer.text(
+                message = 'Departure:',
+                validate = airport_validator,
+                invalid_message = 'Airport not found',
+                default = default_dep
+            ).execute()
+            arrival = inquirer.text(
+                message = 'Arrival:',
+                validate = airport_validator,
+                invalid_message = 'Airport not found',
+                default = default_arr
+            ).execute()
+            # Preferred, LOA, alias and stored FlightAware routes in one keyed
+            # read of the digest (python zoa_digest.py), built live if missing
+            results = digest_rows(lookup_digest(data, sanitize_airport(departure), sanitize_airport(arrival)))
+            if not page_table(results, 'keys', more=more_rows):
+                color_print([('red', 'No results found')])
+
         if action == 'Chart Reference':
             action2 = inquirer.rawlist(
                 message = 'Select AirNav action:',
@@ -407,6 +326,7 @@ def main():
             if action2 == 'Open AirNav Airport Page':
                 airport = inquirer.text(
                     message = '4-Letter ICAO:',
+                    completer = CodeCompleter(data, 'airport_search'),
                     validate = airport_validator,
                     invalid_message = 'Airport not found'
                 ).execute()
@@ -463,6 +383,7 @@ def main():
                 'Airport Name Lookup',
                 'Airline Callsign Lookup',
                 'Aircraft Code Lookup',
+                'Reverse Code Lookup',
                 'Skip'
             ],
             default = 'Airport Name Lookup',
@@ -473,27 +394,44 @@ def main():
             if action2 == 'Airport Name Lookup':
                 airport = inquirer.text(
                     message = '4-Letter ICAO:',
+                    completer = CodeCompleter(data, 'airport_search'),
                     validate = airport_validator,
                     invalid_message = 'Airport not found'
                 ).execute()
-                color_print([('green', airport_data[airport.upper()]['name'])])
+                color_print([('green', data.airports[airport.upper()]['name'])])
 
             if action2 == 'Airline Callsign Lookup':
                 airline = inquirer.text(
                     message = '3-Letter ICAO Prefix:',
+                    completer = CodeCompleter(data, 'airline_search'),
                     validate = airline_validator,
                     invalid_message = 'Airline not found'
                 ).execute()
-                color_print([('green', airline_data[airline.upper()]['Call sign'])])
+                color_print([('green', data.airlines[airline.upper()]['Call sign'])])
             
             if action2 == 'Aircraft Code Lookup':
                 aircraft = inquirer.text(
                     message = '4-Letter ICAO Code:',
+                    completer = CodeCompleter(data, 'aircraft_search'),
                     validate = aircraft_validator,
                     invalid_message = 'Aircraft not found'
                 ).execute()
-                color_print([('green', aircraft_data[aircraft.upper()]['Manufacturer and Aircraft Type / Model'])])
-                color_print([('green', aircraft_data[aircraft.upper()]['WTC'])])
+                color_print([('green', data.aircraft[aircraft.upper()]['Manufacturer and Aircraft Type / Model'])])
+                color_print([('green', data.aircraft[aircraft.upper()]['WTC'])])
+
+            if action2 == 'Reverse Code Lookup':
+                # Name, callsign telephony or aircraft model -> codes
+                search_string = inquirer.text(
+                    message = 'Name, Callsign or Model:'
+                ).execute()
+                table = [[kind, code, label] for kind, index in [('Airline', data.airline_search),
+                                                                 ('Aircraft', data.aircraft_search),
+                                                                 ('Airport', data.airport_search)]
+                         for code, label in index.search(search_string, REVERSE_LOOKUP_LIMIT)]
+                if table:
+                    print_table(table, headers=['Type', 'Code', 'Name'])
+                else:
+                    color_print([('yellow', 'No codes found')])
             
             if action2 == 'Skip':
                 pass
@@ -502,6 +440,7 @@ def main():
             os.system('cls' if os.name == 'nt' else 'clear')
         
         if action == 'Exit':
+            print_cache_stats()
             exit()
 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+import re
+
+LITERAL_EXP = re.compile(r'^\^?[A-Z0-9]+(\.\*)?(\|[A-Z0-9]+(\.\*)?)*$')
+NOT_LITERAL_EXP = re.compile(r'^\^?\(\?!([A-Z0-9]+(\|[A-Z0-9]+)*)\)\.\*$')
+ANY_PATTERNS = {'', '.*', '^.*'}
+
+# Matcher kinds
+MATCH_ANY = 0
+MATCH_PREFIX = 1
+MATCH_NOT_PREFIX = 2
+MATCH_REGEX = 3
+
+def compile_pattern(pattern):
+    # routes.csv patterns are applied with re.match, i.e. anchored at the start
+    # only, so plain codes like KOAK|KSFO and wildcards like MM.* are both just
+    # sets of prefixes and never need the regex engine. The negative lookahead
+    # form ^(?!KSFO|KOAK).* is the complement of such a set.
+    pattern = pattern.strip()
+    if pattern in ANY_PATTERNS:
+        return (MATCH_ANY, None)
+    if LITERAL_EXP.match(pattern):
+        prefixes = [p[:-2] if p.endswith('.*') else p for p in pattern.lstrip('^').split('|')]
+        return (MATCH_PREFIX, tuple(prefixes))
+    m = NOT_LITERAL_EXP.match(pattern)
+    if m:
+        return (MATCH_NOT_PREFIX, tuple(m.group(1).split('|')))
+    return (MATCH_REGEX, re.compile(pattern))
+
+def matches(matcher, value):
+    kind, data = matcher
+    if kind == MATCH_ANY:
+        return True
+    if kind == MATCH_PREFIX:
+        return value.startswith(data)
+    if kind == MATCH_NOT_PREFIX:
+        return not value.startswith(data)
+    return data.match(value) is not None
+
+class LOARuleEngine:
+    # LOA routing rules from routes.csv, compiled once. Rules with literal
+    # arrival codes are found through a prefix hash index; only the few rules
+    # with a wildcard arrival are evaluated for every query.
+    def __init__(self, route_data):
+        self.rules = list(route_data)
+        self.dep_matchers = []
+        self.arr_matchers = []
+        self.arr_index = {}
+        self.arr_fallback = []
+        for i, rule in enumerate(self.rules):
+            dep = compile_pattern(rule['Departure_Regex'])
+            arr = compile_pattern(rule['Arrival_Regex'])
+            self.dep_matchers.append(dep)
+            self.arr_matchers.append(arr)
+            if arr[0] == MATCH_PREFIX:
+                for prefix in arr[1]:
+                    self.arr_index.setdefault(prefix, []).append(i)
+            else:
+                self.arr_fallback.append(i)
+        self.arr_prefix_lengths = sorted({len(p) for p in self.arr_index}, reverse=True)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def candidates(self, arrival):
+        ids = set()
+        for length in self.arr_prefix_lengths:
+            ids.update(self.arr_index.get(arrival[:length], ()))
+        return ids
+
+    def match_ids(self, departure, arrival):
+        departure = departure.upper()
+        arrival = arrival.upper()
+        ids = [i for i in self.candidates(arrival) if matches(self.dep_matchers[i], departure)]
+        ids.extend(i for i in self.arr_fallback
+                   if matches(self.arr_matchers[i], arrival) and matches(self.dep_matchers[i], departure))
+        ids.sort()
+        return ids
+
+    def match(self, departure, arrival):
+        # Same rows, in the same order, as filtering routes.csv with re.match
+        return [self.rules[i] for i in self.match_ids(departure, arrival)]
+
+    def match_batch(self, pairs):
+        # Traffic files repeat city pairs heavily, so each distinct pair is
+        # only evaluated once per batch
+        seen = {}
+        results = []
+        for departure, arrival in pairs:
+            key = (departure.upper(), arrival.upper())
+            if key not in seen:
+                seen[key] = self.match(*key)
+            results.append(seen[key])
+        return results
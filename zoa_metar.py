@@ -0,0 +1,102 @@
+import io
+import re
+import xml.etree.ElementTree as ET
+
+# Towered fields in ZOA's airspace, fetched together for briefings and monitoring
+ZOA_TOWERED = ['KSFO', 'KOAK', 'KSJC', 'KSMF', 'KRNO', 'KFAT', 'KMRY', 'KSCK', 'KMOD', 'KSTS',
+               'KAPC', 'KCCR', 'KHWD', 'KLVK', 'KPAO', 'KRHV', 'KSQL', 'KNUQ', 'KSNS', 'KSAC',
+               'KMHR', 'KMCC', 'KRDD', 'KTRK', 'KBAB', 'KSUU', 'KNLC']
+
+# Scalar METAR fields kept from the data server XML; anything else is skipped
+METAR_FIELDS = {'raw_text', 'station_id', 'observation_time', 'temp_c', 'dewpoint_c',
+                'wind_dir_degrees', 'wind_speed_kt', 'wind_gust_kt', 'visibility_statute_mi',
+                'altim_in_hg', 'flight_category', 'metar_type', 'wx_string'}
+
+# Raw METAR text, optionally prefixed by 'station,valid,' as in IEM/ASOS archive
+# exports. Groups: valid timestamp, station, ddhhmm and the whole wind group,
+# decoded separately by parse_wind since an archive only has a few thousand
+# distinct ones. The trailing .* consumes the rest of the line, which keeps
+# findall from retrying the pattern at every character.
+RAW_METAR_EXP = re.compile(r'^(?:[A-Z0-9]{3,4},(\d{4}-\d\d-\d\d[ T]\d\d:\d\d)(?::\d\d)?,)?(?:METAR |SPECI )?'
+                           r'([A-Z][A-Z0-9]{3}) (\d{6})Z (?:AUTO |COR )?((?:\d{3}|VRB)\d{2,3}(?:G\d{2,3})?(?:KT|MPS))?.*', re.M)
+WIND_GROUP_EXP = re.compile(r'(\d{3}|VRB)(\d{2,3})(?:G(\d{2,3}))?(KT|MPS)')
+MPS_TO_KT = 1.943844
+
+def tokenize_metars(text):
+    # All METARs in a block of text, one per line, as (valid, station, ddhhmm,
+    # wind group) tuples with empty strings for missing groups. Lines that are
+    # not METARs are skipped.
+    return RAW_METAR_EXP.findall(text)
+
+def iter_metar_blocks(file, block_size=1 << 22):
+    # Tokenizes a large archive block by block, never splitting a line
+    rest = ''
+    while True:
+        chunk = file.read(block_size)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        cut = chunk.rfind('\n') + 1
+        rest = chunk[cut:]
+        if cut:
+            yield tokenize_metars(chunk[:cut])
+    if rest:
+        yield tokenize_metars(rest)
+
+def parse_wind(group):
+    # (direction, speed kt, gust kt) floats from a wind group like
+    # '28015G25KT'; VRB directions and missing gusts are NaN
+    wind_dir, speed, gust, unit = WIND_GROUP_EXP.match(group).groups()
+    factor = MPS_TO_KT if unit == 'MPS' else 1.0
+    return (float('nan') if wind_dir == 'VRB' else float(wind_dir), int(speed) * factor,
+            int(gust) * factor if gust else float('nan'))
+
+def parse_raw_metar(text):
+    # Record in the same shape as the data server records (wind fields only)
+    tokens = tokenize_metars(text.strip())
+    if not tokens:
+        return None
+    valid, station, time, wind = tokens[0]
+    record = {'raw_text': text.strip(), 'station_id': station, 'observation_time': valid or time}
+    if wind:
+        wind_dir, speed, gust = parse_wind(wind)
+        record['wind_dir_degrees'] = 'VRB' if wind_dir != wind_dir else '%d' % wind_dir
+        record['wind_speed_kt'] = '%d' % round(speed)
+        if gust == gust:
+            record['wind_gust_kt'] = '%d' % round(gust)
+    return record
+
+def iter_metar_records(source):
+    # Streams METAR records out of a data server XML response. source can be a
+    # file name, bytes or a binary file object (e.g. a streamed HTTP body).
+    # Each record is a flat dict of the METAR_FIELDS present plus sky_condition
+    # as a list of (sky_cover, cloud_base_ft_agl) tuples.
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    record = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'METAR':
+                record = {'sky_condition': []}
+            continue
+        if record is None:
+            continue
+        if tag == 'METAR':
+            yield record
+            record = None
+            elem.clear()
+        elif tag == 'sky_condition':
+            record['sky_condition'].append((elem.get('sky_cover'), elem.get('cloud_base_ft_agl')))
+        elif tag in METAR_FIELDS:
+            record[tag] = elem.text
+
+def parse_metars(source):
+    # {station: latest METAR record}; the first record per station wins since
+    # the data server lists the most recent observation first
+    metars = {}
+    for record in iter_metar_records(source):
+        station = record.get('station_id')
+        if station and station not in metars:
+            metars[station] = record
+    return metars
@@ -0,0 +1,246 @@
+import json
+import zlib
+import struct
+from collections.abc import Mapping, Sequence, ItemsView, ValuesView
+from zoa_prefroutes import FAARouteTable
+
+# Read-only tables laid out for memory mapping. The snapshot stores the
+# airports, airlines, aircraft, alias and FAA preferred route datasets in this
+# format instead of as pickles; zoa_data maps the snapshot file, so processes
+# on the same machine share one copy of it in the page cache and attach
+# without building any dicts. Nothing is decoded until it is read: a key
+# lookup probes a mapped hash table and a record only decodes the fields that
+# are asked for.
+#
+# A section is MAPPED_MAGIC, the length of a JSON header and the header, then
+# the columns. A string column is count + 1 little-endian u32 offsets followed
+# by the UTF-8 strings back to back. Keys are found through slots, an open
+# addressing hash table (CRC-32 of the key, linear probing, at most half full)
+# of u32 row numbers + 1, 0 for an empty slot. The header gives the
+# [offset, length] of every column, counted from the end of the header.
+#
+#   records   {key: {field: str}} -> MappedTable of MappedRecords (keys, slots, a column per field)
+#   text      {key: str}          -> MappedTable of str (keys, slots, values)
+#   routes    FAARouteTable       -> FAARouteTable over MappedColumns (a column per field)
+
+MAPPED_MAGIC = b'ZOAM'
+
+_OFFSET = struct.Struct('<I')
+_SPAN = struct.Struct('<II')
+
+def encode_column(strings):
+    data = [s.encode('utf8') for s in strings]
+    offsets = [0]
+    for d in data:
+        offsets.append(offsets[-1] + len(d))
+    return struct.pack('<%dI' % len(offsets), *offsets) + b''.join(data)
+
+def encode_slots(keys):
+    size = 1
+    while size < 2 * len(keys):
+        size *= 2
+    slots = [0] * size
+    for row, key in enumerate(keys):
+        slot = zlib.crc32(key.encode('utf8')) & (size - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = row + 1
+    return struct.pack('<%dI' % size, *slots)
+
+def mapped_kind(value):
+    # The kind a loaded dataset is stored as, None if it has to stay a pickle
+    # (rows with missing or extra fields, anything that isn't a string)
+    if isinstance(value, FAARouteTable):
+        return 'routes' if all(isinstance(s, str) for c in value.columns.values() for s in c) else None
+    if not isinstance(value, dict) or not value or not all(isinstance(k, str) for k in value):
+        return None
+    if all(isinstance(v, str) for v in value.values()):
+        return 'text'
+    rows = list(value.values())
+    if not isinstance(rows[0], dict):
+        return None
+    fields = list(rows[0])
+    if all(isinstance(r, dict) and list(r) == fields and all(isinstance(s, str) for s in r.values()) for r in rows) \
+            and all(isinstance(f, str) for f in fields):
+        return 'records'
+    return None
+
+def encode(value):
+    # The mapped section of a dataset, None if it can't be mapped
+    kind = mapped_kind(value)
+    if kind is None:
+        return None
+    blobs = []
+    def add(strings):
+        offset = sum(len(b) for b in blobs)
+        blobs.append(encode_column(strings))
+        return [offset, len(blobs[-1])]
+
+    header = {'kind': kind, 'count': len(value)}
+    if kind == 'routes':
+        header['fields'] = value.names
+        header['columns'] = {f: add(value.columns[f]) for f in value.names}
+    else:
+        keys = list(value)
+        header['keys'] = add(keys)
+        blobs.append(encode_slots(keys))
+        header['slots'] = [sum(len(b) for b in blobs[:-1]), len(blobs[-1])]
+        if kind == 'text':
+            header['fields'] = []
+            header['values'] = add(value.values())
+        else:
+            header['fields'] = list(value[keys[0]])
+            header['columns'] = {f: add([value[k][f] for k in keys]) for f in header['fields']}
+    header = json.dumps(header).encode('utf8')
+    return MAPPED_MAGIC + _OFFSET.pack(len(header)) + header + b''.join(blobs)
+
+def attach(buffer, start):
+    # The dataset whose mapped section starts at buffer[start]
+    if buffer[start:start + 4] != MAPPED_MAGIC:
+        raise ValueError('not a mapped section')
+    header_len, = _OFFSET.unpack_from(buffer, start + 4)
+    header = json.loads(bytes(buffer[start + 8:start + 8 + header_len]))
+    base = start + 8 + header_len
+    count = header['count']
+    def column(position):
+        return MappedColumn(buffer, base + position[0], count)
+    columns = {f: column(position) for f, position in header.get('columns', {}).items()}
+    if header['kind'] == 'routes':
+        return FAARouteTable({f: columns[f] for f in header['fields']})
+    values = column(header['values']) if header['kind'] == 'text' else None
+    slots, length = header['slots']
+    return MappedTable(buffer, count, column(header['keys']), base + slots, length // 4, columns, header['fields'], values)
+
+class MappedColumn(Sequence):
+    # count strings in a mapped buffer; [i] decodes one, slicing and
+    # iteration decode only the strings in range
+    __slots__ = ('buffer', 'start', 'count', 'blob')
+
+    def __init__(self, buffer, start, count):
+        self.buffer = buffer
+        self.start = start
+        self.count = count
+        self.blob = start + 4 * (count + 1)
+
+    def __len__(self):
+        return self.count
+
+    def raw(self, i):
+        a, b = _SPAN.unpack_from(self.buffer, self.start + 4 * i)
+        return self.buffer[self.blob + a:self.blob + b]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.count)
+            return list(self.iter_range(start, stop)) if step == 1 else [self[j] for j in range(start, stop, step)]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError('column index out of range')
+        return str(self.raw(i), 'utf8')
+
+    def __iter__(self):
+        return self.iter_range(0, self.count)
+
+    def iter_range(self, start, stop):
+        if stop <= start:
+            return iter(())
+        # One read of the offsets and of the bytes in range; ASCII text (byte
+        # offsets are character offsets) is decoded once and sliced
+        offsets = struct.unpack_from('<%dI' % (stop - start + 1), self.buffer, self.start + 4 * start)
+        base = offsets[0]
+        data = self.buffer[self.blob + base:self.blob + offsets[-1]]
+        if base:
+            offsets = [a - base for a in offsets]
+        spans = map(slice, offsets, offsets[1:])
+        text = str(data, 'utf8')
+        if len(text) == len(data):
+            return map(text.__getitem__, spans)
+        return (str(b, 'utf8') for b in map(data.__getitem__, spans))
+
+class MappedRecord(Mapping):
+    # One row of a MappedTable; each field is decoded when it is read
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, field):
+        return self.table.columns[field][self.row]
+
+    def __iter__(self):
+        return iter(self.table.fields)
+
+    def __len__(self):
+        return len(self.table.fields)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class MappedItems(ItemsView):
+    def __iter__(self):
+        table = self._mapping
+        return zip(table.keys_column, map(table.value, range(len(table))))
+
+class MappedValues(ValuesView):
+    def __iter__(self):
+        return map(self._mapping.value, range(len(self._mapping)))
+
+class MappedTable(Mapping):
+    # Read-only dict over a mapped section, in the original key order. Values
+    # are MappedRecords (dict(record) for a plain dict, e.g. to serialize it),
+    # or str for text tables.
+    def __init__(self, buffer, count, keys, slots, size, columns, fields, values=None):
+        self.buffer = buffer
+        self.count = count
+        self.keys_column = keys
+        self.slots = slots
+        self.mask = size - 1
+        self.columns = columns
+        self.fields = fields
+        self.values_column = values
+
+    def find(self, key):
+        # Row number of key, -1 if it isn't in the table
+        if not isinstance(key, str):
+            return -1
+        target = key.encode('utf8')
+        raw = self.keys_column.raw
+        buffer, slots, mask = self.buffer, self.slots, self.mask
+        slot = zlib.crc32(target) & mask
+        while True:
+            row = _OFFSET.unpack_from(buffer, slots + 4 * slot)[0]
+            if not row:
+                return -1
+            if raw(row - 1) == target:
+                return row - 1
+            slot = (slot + 1) & mask
+
+    def value(self, row):
+        return self.values_column[row] if self.values_column is not None else MappedRecord(self, row)
+
+    def column(self, field):
+        # Every value of one field in key order, decoding nothing else
+        return self.columns[field]
+
+    def __getitem__(self, key):
+        row = self.find(key)
+        if row < 0:
+            raise KeyError(key)
+        return self.value(row)
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def __iter__(self):
+        return iter(self.keys_column)
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        return MappedItems(self)
+
+    def values(self):
+        return MappedValues(self)
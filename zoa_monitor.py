@@ -0,0 +1,143 @@
+import io
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from zoa_wx import default_client, bulk_metar_url, DATIS_URL, ZOA_MAJORS
+from zoa_metar import parse_metars, ZOA_TOWERED
+from zoa_runways import default_runway_engine
+
+ATIS_CODE_EXP = re.compile(r'\bINFO(?:RMATION)? ([A-Z])\b')
+
+METAR_INTERVAL = 120
+ATIS_INTERVAL = 60
+JITTER = 0.2
+MAX_BACKOFF = 15 * 60
+
+def atis_code(atis):
+    m = ATIS_CODE_EXP.search(atis)
+    return m.group(1) if m else '?'
+
+def make_event(station, kind, old, new):
+    # kind is 'atis', 'metar' or 'config'; old is None for the first value seen
+    return {'time': time.strftime('%H:%M:%S'), 'station': station, 'kind': kind, 'old': old, 'new': new}
+
+def print_event(event):
+    if event['kind'] == 'atis':
+        code = atis_code(event['new'])
+        if event['old'] is None:
+            print('%(time)s %(station)s ATIS %(code)s' % dict(event, code=code))
+        else:
+            print('%(time)s %(station)s ATIS %(old)s -> %(code)s' % dict(event, old=atis_code(event['old']), code=code))
+        print('    ' + event['new'])
+    elif event['kind'] == 'metar':
+        print('%(time)s %(new)s' % event)
+    elif event['old'] is None:
+        print('%(time)s %(station)s runway config: %(new)s' % event)
+    else:
+        print('%(time)s %(station)s runway config: %(old)s -> %(new)s' % event)
+    sys.stdout.flush()
+
+class WeatherMonitor:
+    # Polls METARs (one bulk request for every station) and D-ATIS (one
+    # request per ATIS station) on an asyncio scheduler and calls on_event
+    # only for what changed: a new ATIS, a new METAR observation or a new
+    # runway configuration. Requests are conditional, so an unchanged
+    # response is neither parsed nor diffed. Intervals are jittered so the
+    # stations spread out, and back off on errors.
+    def __init__(self, stations=ZOA_TOWERED, atis_stations=ZOA_MAJORS, metar_interval=METAR_INTERVAL,
+                 atis_interval=ATIS_INTERVAL, jitter=JITTER, client=None, engine=None, on_event=print_event):
+        self.stations = list(stations)
+        self.atis_stations = list(atis_stations)
+        self.metar_interval = metar_interval
+        self.atis_interval = atis_interval
+        self.jitter = jitter
+        self.client = client or default_client()
+        self.engine = engine or default_runway_engine()
+        self.on_event = on_event
+        self.atis = {}
+        self.metars = {}
+        self.configs = {}
+        self.polls = 0
+        self.unchanged = 0
+
+    def poll_metars(self):
+        # Runs on the client's thread pool; returns the events of this poll
+        r = self.client.get_if_changed(bulk_metar_url(self.stations))
+        self.polls += 1
+        if r is None:
+            self.unchanged += 1
+            return []
+        events = []
+        changed = {}
+        for station, metar in parse_metars(io.BytesIO(r.content)).items():
+            previous = self.metars.get(station)
+            if previous and previous.get('raw_text') == metar.get('raw_text'):
+                continue
+            self.metars[station] = changed[station] = metar
+            if self.client.cache:
+                self.client.cache.set('metar', station, metar)
+            events.append(make_event(station, 'metar', previous and previous.get('raw_text'), metar.get('raw_text')))
+        # Only stations with a new observation are re-evaluated
+        for station, config in self.engine.recommend_all(changed).items():
+            if config != self.configs.get(station):
+                events.append(make_event(station, 'config', self.configs.get(station), config))
+                self.configs[station] = config
+        return events
+
+    def poll_atis(self, station):
+        r = self.client.get_if_changed(DATIS_URL + station)
+        self.polls += 1
+        if r is None:
+            self.unchanged += 1
+            return []
+        events = []
+        for entry in json.loads(r.text):
+            key = station if entry.get('type', 'combined') == 'combined' else '%s %s' % (station, entry['type'].upper())
+            atis = entry['datis']
+            if atis != self.atis.get(key):
+                events.append(make_event(key, 'atis', self.atis.get(key), atis))
+                self.atis[key] = atis
+                if self.client.cache and key == station:
+                    self.client.cache.set('atis', station, atis)
+        return events
+
+    async def poll_loop(self, interval, poll, *args):
+        loop = asyncio.get_running_loop()
+        # Random initial offset so the requests don't all go out together
+        await asyncio.sleep(random.uniform(0, interval * self.jitter))
+        delay = interval
+        while True:
+            try:
+                for event in await loop.run_in_executor(self.client.executor, poll, *args):
+                    self.on_event(event)
+                delay = interval
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                delay = min(delay * 2, MAX_BACKOFF)
+            await asyncio.sleep(delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def run(self):
+        tasks = [self.poll_loop(self.metar_interval, self.poll_metars)]
+        tasks += [self.poll_loop(self.atis_interval, self.poll_atis, s) for s in self.atis_stations]
+        await asyncio.gather(*tasks)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print ATIS, METAR and runway configuration changes as they happen')
+    parser.add_argument('stations', nargs='*', default=ZOA_TOWERED, help='METAR stations (default: ZOA towered fields)')
+    parser.add_argument('--atis', nargs='*', default=ZOA_MAJORS, help='D-ATIS stations (default: %s)' % ' '.join(ZOA_MAJORS))
+    parser.add_argument('--metar-interval', type=float, default=METAR_INTERVAL)
+    parser.add_argument('--atis-interval', type=float, default=ATIS_INTERVAL)
+    args = parser.parse_args()
+
+    stations = [s.upper() if len(s) == 4 else 'K' + s.upper() for s in args.stations]
+    atis_stations = [s.upper() if len(s) == 4 else 'K' + s.upper() for s in args.atis]
+    monitor = WeatherMonitor(stations, atis_stations, args.metar_interval, args.atis_interval)
+    try:
+        asyncio.run(monitor.run())
+    except KeyboardInterrupt:
+        print('%d polls, %d unchanged' % (monitor.polls, monitor.unchanged))
@@ -0,0 +1,83 @@
+import sys
+from itertools import islice
+from zoa_perf import timer
+
+# Rows printed per page, and rows read ahead to size the columns
+PAGE_SIZE = 25
+SAMPLE_ROWS = 100
+
+def is_number(value):
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+class TablePager:
+    # Renders rows pulled lazily from any iterable (lists of cells, or dicts
+    # with headers='keys') one page at a time, in the same layout as tabulate's
+    # default format. Column widths and alignment come from the first
+    # SAMPLE_ROWS rows, so nothing past the sample is read before its page is
+    # shown; a later cell wider than its column pushes the rest of its row over.
+    def __init__(self, rows, headers, page_size=PAGE_SIZE, sample=SAMPLE_ROWS, offset=0):
+        self.rows = iter(rows)
+        if offset:
+            next(islice(self.rows, offset, offset), None)
+        self.page_size = page_size
+        self.shown = offset
+        self.buffer = list(islice(self.rows, max(sample, page_size)))
+        if headers == 'keys':
+            headers = list(self.buffer[0]) if self.buffer else []
+        self.headers = list(headers)
+        self.dicts = bool(self.buffer) and isinstance(self.buffer[0], dict)
+        sample_cells = [self.cells(row) for row in self.buffer]
+        self.widths = [max([len(h) + 2] + [len(c[i]) for c in sample_cells]) for i, h in enumerate(self.headers)]
+        values = [[c[i] for c in sample_cells if c[i]] for i in range(len(self.headers))]
+        self.numeric = [bool(v) and all(map(is_number, v)) for v in values]
+
+    def __bool__(self):
+        return bool(self.buffer)
+
+    @property
+    def exhausted(self):
+        # Reads at most one row ahead to find out
+        if not self.buffer:
+            self.buffer = list(islice(self.rows, 1))
+        return not self.buffer
+
+    def cells(self, row):
+        if self.dicts:
+            row = [row.get(h) for h in self.headers]
+        return ['' if c is None else str(c) for c in row]
+
+    def format(self, cells):
+        last = len(cells) - 1
+        return '  '.join(c.rjust(w) if numeric else c if i == last else c.ljust(w)
+                         for i, (c, w, numeric) in enumerate(zip(cells, self.widths, self.numeric)))
+
+    def header_lines(self):
+        return [self.format(self.headers).rstrip(), '  '.join('-' * w for w in self.widths)]
+
+    def next_page(self):
+        # Lines of the next page_size rows ([] at the end)
+        rows = self.buffer[:self.page_size]
+        del self.buffer[:self.page_size]
+        rows.extend(islice(self.rows, self.page_size - len(rows)))
+        self.shown += len(rows)
+        return [self.format(self.cells(row)).rstrip() for row in rows]
+
+def page_table(rows, headers, more=None, file=None, **kwargs):
+    # Prints the header and the first page right away, then one more page each
+    # time more(shown) returns true (no more() prints everything). Returns the
+    # number of rows shown, 0 when there were none.
+    file = file or sys.stdout
+    pager = TablePager(rows, headers, **kwargs)
+    if not pager:
+        return 0
+    print('\n'.join(pager.header_lines()), file=file)
+    while True:
+        with timer('render.page'):
+            print('\n'.join(pager.next_page()), file=file)
+        if pager.exhausted or (more is not None and not more(pager.shown)):
+            break
+    return pager.shown
@@ -0,0 +1,178 @@
+import os
+import sys
+import time
+import atexit
+import threading
+
+# Opt-in instrumentation: timers around data loads, network fetches, HTML/XML
+# parsing and table rendering, and counters for bytes fetched and cache hits,
+# broken down by the action (menu entry, command or endpoint) they ran under.
+# Enabled with --profile (zoa_helper, zoa_server) or ZOA_PROFILE=1; the
+# breakdown is printed to stderr at exit.
+#
+#   --profile               timers and counters only
+#   --profile=trace.prof    also a cProfile trace of the main thread (snakeviz, flameprof, gprof2dot)
+#   --profile=trace.folded  also the timed spans as collapsed stacks in microseconds (flamegraph.pl, speedscope)
+#
+# While disabled timer() hands out one shared no-op object, so the hot paths
+# pay for a global lookup and a function call.
+
+PROFILE_FLAG = '--profile'
+PROFILE_ENV = 'ZOA_PROFILE'
+
+enabled = False
+
+_lock = threading.Lock()
+_local = threading.local()
+_action = 'startup'
+_timers = {}    # (action, name) -> [calls, seconds, max seconds]
+_counters = {}  # (action, name) -> amount
+_folded = {}    # 'action;outer;inner' -> self seconds
+_trace_path = None
+_profiler = None
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    __slots__ = ('name', 'start', 'children')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        _stack().append(self)
+        self.children = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = _stack()
+        path = ';'.join([current_action()] + [t.name for t in stack])
+        stack.pop()
+        if stack:
+            stack[-1].children += elapsed
+        key = (current_action(), self.name)
+        with _lock:
+            timer = _timers.get(key)
+            if timer is None:
+                timer = _timers[key] = [0, 0.0, 0.0]
+            timer[0] += 1
+            timer[1] += elapsed
+            timer[2] = max(timer[2], elapsed)
+            _folded[path] = _folded.get(path, 0.0) + elapsed - self.children
+        return False
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def timer(name):
+    # with timer('fetch.metar'): ...
+    return _Timer(name) if enabled else _NULL_TIMER
+
+def count(name, amount=1):
+    if enabled:
+        key = (current_action(), name)
+        with _lock:
+            _counters[key] = _counters.get(key, 0) + amount
+
+def current_action():
+    return getattr(_local, 'action', None) or _action
+
+def set_action(name):
+    # The action later timings are attributed to, including those of
+    # background threads (weather and prefetch) started during it
+    global _action
+    _action = name
+
+def bind(func):
+    # func, made to run under the calling thread's current action wherever it
+    # is called (for work handed to a thread pool)
+    if not enabled:
+        return func
+    name = current_action()
+    def run(*args, **kwargs):
+        with action(name):
+            return func(*args, **kwargs)
+    return run
+
+class action:
+    # Attributes the timings of this thread only, e.g. one server request
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'action', None)
+        _local.action = self.name
+        return self
+
+    def __exit__(self, *exc):
+        _local.action = self.previous
+        return False
+
+def enable(trace=None):
+    global enabled, _trace_path, _profiler
+    if enabled:
+        return
+    enabled = True
+    _trace_path = trace
+    if trace and not trace.endswith('.folded'):
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(finish)
+
+def configure(argv):
+    # Removes --profile[=TRACE] from argv (in place) and enables profiling if
+    # it or ZOA_PROFILE was given
+    setting = os.environ.get(PROFILE_ENV)
+    for arg in list(argv[1:]):
+        if arg == PROFILE_FLAG or arg.startswith(PROFILE_FLAG + '='):
+            argv.remove(arg)
+            setting = arg[len(PROFILE_FLAG) + 1:] or '1'
+    if setting and setting != '0':
+        enable(None if setting == '1' else setting)
+
+def report(file=None):
+    from tabulate import tabulate
+    file = file or sys.stderr
+    with _lock:
+        timers = sorted(_timers.items(), key=lambda item: (item[0][0], -item[1][1]))
+        counters = sorted(_counters.items())
+    if timers:
+        table = [[a, name, calls, total * 1000, total * 1000 / calls, longest * 1000]
+                 for (a, name), (calls, total, longest) in timers]
+        print(tabulate(table, headers=['Action', 'Timer', 'Calls', 'Total ms', 'Mean ms', 'Max ms'], floatfmt='.1f'), file=file)
+    if counters:
+        print(file=file)
+        print(tabulate([[a, name, amount if isinstance(amount, int) else '%.3f' % amount] for (a, name), amount in counters],
+                       headers=['Action', 'Counter', 'Amount'], colalign=('left', 'left', 'right'), disable_numparse=True), file=file)
+
+def write_folded(path):
+    with _lock:
+        folded = sorted(_folded.items())
+    with open(path, 'w') as file:
+        for stack, seconds in folded:
+            file.write('%s %d\n' % (stack.replace(' ', '_'), round(seconds * 1e6)))
+
+def finish():
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_trace_path)
+        _profiler = None
+    elif _trace_path:
+        write_folded(_trace_path)
+    report()
+    if _trace_path:
+        print('Trace written to %s' % _trace_path, file=sys.stderr)
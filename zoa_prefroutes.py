@@ -0,0 +1,88 @@
+import io
+import csv
+import sys
+
+# Columns kept from prefroutes_db.csv, everything else is dropped at load time
+FAA_ROUTE_COLUMNS = ['Orig', 'Dest', 'Route String', 'Type', 'Altitude', 'Aircraft']
+FAA_ROUTE_DISPLAY_COLUMNS = ['Route String', 'Type', 'Altitude', 'Aircraft']
+
+def faa_identifier(airport):
+    # prefroutes_db.csv and the alias file use FAA ids (SFO), not ICAO (KSFO)
+    airport = airport.strip().upper()
+    if len(airport) == 4 and airport[0] in 'KP':
+        return airport[1:]
+    return airport
+
+class FAARouteTable:
+    # Column-oriented FAA preferred routes. Rows are sorted by (Orig, Dest) so
+    # both indexes map to a contiguous (start, stop) range of row numbers.
+    def __init__(self, columns):
+        self.columns = columns
+        self.names = list(columns)
+        self.index = {}
+        self.orig_index = {}
+        # Columns may be lists or mapped columns (zoa_mmap), read in one pass;
+        # interned ids make the repeated keys one object each
+        intern = sys.intern
+        for i, key in enumerate(zip(map(intern, columns['Orig']), map(intern, columns['Dest']))):
+            orig = key[0]
+            if key in self.index:
+                self.index[key] = (self.index[key][0], i + 1)
+            else:
+                self.index[key] = (i, i + 1)
+            if orig in self.orig_index:
+                self.orig_index[orig] = (self.orig_index[orig][0], i + 1)
+            else:
+                self.orig_index[orig] = (i, i + 1)
+
+    def __reduce__(self):
+        # Only the columns are stored, the indexes are rebuilt in one pass on load
+        return (FAARouteTable, (self.columns,))
+
+    def __len__(self):
+        return len(self.columns['Orig'])
+
+    def __contains__(self, orig):
+        return orig in self.orig_index
+
+    def row(self, i, names=None):
+        return {k: self.columns[k][i] for k in (names or self.names)}
+
+    def rows(self, start, stop, names=None):
+        return [self.row(i, names) for i in range(start, stop)]
+
+    def lookup(self, orig, dest, names=FAA_ROUTE_DISPLAY_COLUMNS):
+        start, stop = self.index.get((orig, dest), (0, 0))
+        return self.rows(start, stop, names)
+
+    def from_origin(self, orig, names=None):
+        start, stop = self.orig_index.get(orig, (0, 0))
+        return self.rows(start, stop, names)
+
+    def iter_lookup(self, orig, dest=None, names=FAA_ROUTE_DISPLAY_COLUMNS):
+        # Rows of one city pair, or of every route from orig when dest is None,
+        # made one at a time as they are consumed (for paged output)
+        if dest is None:
+            start, stop = self.orig_index.get(orig, (0, 0))
+        else:
+            start, stop = self.index.get((orig, dest), (0, 0))
+        return (self.row(i, names) for i in range(start, stop))
+
+    def destinations(self, orig):
+        start, stop = self.orig_index.get(orig, (0, 0))
+        return sorted(set(self.columns['Dest'][start:stop]))
+
+    def pairs(self):
+        return self.index.keys()
+
+def load_FAA_route_table(csv_filename):
+    intern = sys.intern
+    records = []
+    with io.open(csv_filename, 'r', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for row in reader:
+            records.append(tuple(intern(row[k]) for k in FAA_ROUTE_COLUMNS))
+    # Stable sort keeps the file's sequence order within each city pair
+    records.sort(key=lambda r: (r[0], r[1]))
+    columns = {k: [r[i] for r in records] for i, k in enumerate(FAA_ROUTE_COLUMNS)}
+    return FAARouteTable(columns)
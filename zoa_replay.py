@@ -0,0 +1,112 @@
+import io
+import sys
+import csv
+import time
+import argparse
+import numpy as np
+from zoa_metar import iter_metar_blocks, parse_wind
+from zoa_runways import load_runway_engine, FALLBACK
+
+class StationReplay:
+    # Running state for one station: configuration counts, the previous
+    # configuration code and the list of transitions. Codes index labels:
+    # configurations first, then 'Runway X' for the best headwind fallback.
+    def __init__(self, runways):
+        self.runways = runways
+        self.labels = runways.configs + ['Runway %s' % rw for rw in runways.runways]
+        self.counts = np.zeros(len(self.labels), dtype=np.int64)
+        self.codes = {}
+        self.last = None
+        self.transitions = []
+        self.metars = 0
+
+    def lookup(self, winds):
+        # Winds repeat heavily, so only wind groups not seen before are
+        # decoded and evaluated, in one batch
+        new = list(set(winds).difference(self.codes))
+        if new:
+            values = np.array([parse_wind(w) for w in new], dtype=float).reshape(-1, 3)
+            headwind, crosswind, config, best = self.runways.evaluate(values[:, 0], values[:, 1], values[:, 2])
+            code = np.where(config == FALLBACK, len(self.runways.configs) + best, config)
+            self.codes.update(zip(new, code.tolist()))
+        return np.fromiter(map(self.codes.__getitem__, winds), np.int64, len(winds))
+
+    def add(self, times, winds):
+        codes = self.lookup(winds)
+        self.counts += np.bincount(codes, minlength=len(self.labels))
+        previous = np.concatenate([[codes[0] if self.last is None else self.last], codes[:-1]])
+        for i in np.nonzero(codes != previous)[0].tolist():
+            self.transitions.append((times[i], self.labels[previous[i]], self.labels[codes[i]], winds[i]))
+        self.last = codes[-1]
+        self.metars += len(codes)
+
+def replay(file, engine, stations=None):
+    # Streams a raw METAR archive through the runway configuration engine.
+    # Returns {station: StationReplay}; stations without runway data and
+    # METARs without a wind group are skipped.
+    results = {}
+    for tokens in iter_metar_blocks(file):
+        valid, station_ids, ddhhmm, winds = zip(*tokens) if tokens else ([],) * 4
+        # Archives are usually one station per file; only mixed blocks are split
+        for station in set(station_ids):
+            if station not in engine or (stations is not None and station not in stations):
+                continue
+            if station not in results:
+                results[station] = StationReplay(engine.airports[station])
+            idx = [i for i, s in enumerate(station_ids) if s == station and winds[i]]
+            if len(idx) < len(winds):
+                times, station_winds = [valid[i] or ddhhmm[i] for i in idx], [winds[i] for i in idx]
+            else:
+                times, station_winds = valid if valid[0] else ddhhmm, winds
+            if station_winds:
+                results[station].add(times, station_winds)
+    return results
+
+def apply_limits(engine, max_tailwind=None, max_crosswind=None, calm_wind=None):
+    # Overrides the configured thresholds for every airport, for tuning runs
+    for a in engine.airports.values():
+        if max_tailwind is not None:
+            a.max_tailwind[:] = max_tailwind
+        if max_crosswind is not None:
+            a.max_crosswind[:] = max_crosswind
+        if calm_wind is not None:
+            a.calm_wind = calm_wind
+
+def write_transitions(results, output):
+    with io.open(output, 'w', encoding='utf8', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(['Station', 'Time', 'From', 'To', 'Wind'])
+        for station, r in results.items():
+            for when, before, after, wind in r.transitions:
+                writer.writerow([station, when, before, after, wind])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay archived METARs through the runway configuration logic')
+    parser.add_argument('archive', help='raw METAR lines, or IEM-style station,valid,metar CSV')
+    parser.add_argument('-s', '--station', action='append', help='only replay these stations')
+    parser.add_argument('-o', '--output', help='write every configuration change to this CSV')
+    parser.add_argument('--max-tailwind', type=float)
+    parser.add_argument('--max-crosswind', type=float)
+    parser.add_argument('--calm-wind', type=float)
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+
+    engine = load_runway_engine(args.data_dir)
+    apply_limits(engine, args.max_tailwind, args.max_crosswind, args.calm_wind)
+    start = time.perf_counter()
+    with io.open(args.archive, 'r', encoding='utf8', errors='replace') as file:
+        results = replay(file, engine, set(args.station) if args.station else None)
+    elapsed = time.perf_counter() - start
+
+    total = sum(r.metars for r in results.values())
+    for station, r in sorted(results.items()):
+        print('%s: %d METARs, %d configuration changes' % (station, r.metars, len(r.transitions)))
+        for label, count in zip(r.labels, r.counts):
+            if count:
+                print('  %-20s %8d  %5.1f%%' % (label, count, 100.0 * count / r.metars))
+    print('Replayed %d METARs in %.2fs (%.0f METARs/s)' % (total, elapsed, total / elapsed if elapsed else 0), file=sys.stderr)
+    if args.output:
+        write_transitions(results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+import re
+import sys
+from zoa_prefroutes import faa_identifier
+
+TOKEN_EXP = re.compile(r'[A-Z0-9#]+')
+SPEED_ALT_EXP = re.compile(r'^[NKM]\d{3,4}([FASM]\d{3,4})?$')
+PROCEDURE_EXP = re.compile(r'^([A-Z]{3,})\d$|^([A-Z]{3,})#$')
+AIRWAY_EXP = re.compile(r'^[JVQTABGRLMNW]\d{1,4}$')
+VARIABLE_EXP = re.compile(r'\$\w+')
+ROUTE_NOISE = {'DCT', 'STAR', 'SID', 'VIA', 'FILED', 'ROUTE', 'OR', 'AND'}
+
+# Token kinds
+FIX = 'fix'
+NAVAID = 'navaid'
+AIRWAY = 'airway'
+PROCEDURE = 'procedure'
+
+# Route sources in a RouteIndex
+FAA = 'faa'
+LOA = 'loa'
+ALIAS = 'alias'
+FLIGHTAWARE = 'flightaware'
+
+# The token memos below are cleared when they reach this size, so filed
+# routes full of one-off tokens (lat/lon fixes, typos) can't grow them forever
+MAX_MEMO = 50000
+
+_normalized = {}
+
+def normalize_token(token):
+    # Procedures are compared without their revision number (SADDE6 == SADDE8 == SADDE#).
+    # Results are interned and memoized, routes share a few thousand distinct tokens.
+    result = _normalized.get(token)
+    if result is None:
+        if len(_normalized) >= MAX_MEMO:
+            _normalized.clear()
+        m = PROCEDURE_EXP.match(token)
+        result = _normalized[token] = sys.intern(m.group(1) or m.group(2) if m else token)
+    return result
+
+_route_tokens = {}
+
+def route_token(token):
+    # Normalized route token, or '' for tokens that aren't part of the route
+    # (speed/altitude groups, bare numbers, filler words); memoized
+    result = _route_tokens.get(token)
+    if result is None:
+        if token in ROUTE_NOISE or token.isdigit() or SPEED_ALT_EXP.match(token):
+            result = ''
+        else:
+            result = normalize_token(token)
+        if len(_route_tokens) >= MAX_MEMO:
+            _route_tokens.clear()
+        _route_tokens[token] = result
+    return result
+
+_kinds = {}
+
+def token_kind(token):
+    # Kind of a route token: PROCEDURE only for raw (not normalized) tokens
+    kind = _kinds.get(token)
+    if kind is None:
+        if PROCEDURE_EXP.match(token):
+            kind = PROCEDURE
+        elif AIRWAY_EXP.match(token):
+            kind = AIRWAY
+        elif len(token) <= 3:
+            kind = NAVAID
+        else:
+            kind = FIX
+        if len(_kinds) >= MAX_MEMO:
+            _kinds.clear()
+        _kinds[token] = kind
+    return kind
+
+def route_tokens(route, departure='', arrival=''):
+    # Fixes, airways and procedures of a route string, without speed/altitude
+    # groups, bare numbers (alias altitudes, radial distances), filler words or
+    # the departure/arrival airports at either end
+    ends = {departure, faa_identifier(departure), arrival, faa_identifier(arrival)} - {''}
+    tokens = [t for t in map(route_token, TOKEN_EXP.findall(route.upper())) if t]
+    while tokens and tokens[0] in ends:
+        tokens.pop(0)
+    while tokens and tokens[-1] in ends:
+        tokens.pop()
+    return tokens
+
+def alias_route_tokens(text):
+    # Route tokens of '.am rte' alias text, without $variables
+    return route_tokens(VARIABLE_EXP.sub(' ', text))
+
+def alias_alternatives(text):
+    # Each '+...+' route segment of alias text is one alternative:
+    # '+..OSI..EUGEN.V27.GVO..+ [+..OSI.V25.SANTY..BSR..+] $route' -> two
+    segments = re.findall(r'\+([^+]*)\+', text)
+    return segments or [VARIABLE_EXP.sub(' ', text)]
+
+def matches_in_order(elements, tokens):
+    # Every element (a tuple of options, like an LOA group 'RBG/ OED/') has an
+    # option among tokens, in order; other tokens may come before, between and
+    # after them. This is what a partial route (LOA route, alias) matching a
+    # filed route means, for the batch validator and compliance checks alike.
+    it = iter(tokens)
+    return all(any(t in options for t in it) for options in elements)
+
+def loa_alternatives(route):
+    # 'OFFSH# SXC or COAST# SXC' -> two alternatives; 'RBG/ OED/ BTG.OLM#' -> one
+    # alternative whose first element may be any of RBG, OED or BTG
+    alternatives = []
+    for text in re.split(r'\s+or\s+', route.upper()):
+        if 'FILED ROUTE' in text:
+            return [[]]
+        groups = []
+        for part in re.split(r'(?<!/)[\s.]+', text):
+            options = {normalize_token(t) for t in TOKEN_EXP.findall(part) if t not in ROUTE_NOISE}
+            if options:
+                groups.append(options)
+        alternatives.append(groups)
+    return alternatives
+
+class RouteIndex:
+    # Every route string of the data files tokenized once, with inverted
+    # indexes token -> route ids (overall and per source) and a graph of
+    # consecutive tokens. Routes are
+    # numbered in the order they are added; source, key (city pair or alias
+    # command), text and tokens of route i are in the parallel lists.
+    def __init__(self):
+        self.sources = []
+        self.keys = []
+        self.texts = []
+        self.tokens = []
+        self.alternatives = {}
+        self.postings = {}
+        self.source_postings = {}
+        self.successors = {}
+        self.airways = {}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, source, key, text, tokens, alternatives=None):
+        i = len(self.texts)
+        self.sources.append(source)
+        self.keys.append(key)
+        self.texts.append(text)
+        self.tokens.append(tuple(tokens))
+        postings = self.postings
+        source_postings = self.source_postings.setdefault(source, {})
+        for t in set(tokens):
+            ids = postings.get(t)
+            if ids is None:
+                postings[t] = [i]
+            else:
+                ids.append(i)
+            ids = source_postings.get(t)
+            if ids is None:
+                source_postings[t] = [i]
+            else:
+                ids.append(i)
+        if alternatives is not None:
+            self.alternatives[i] = alternatives
+            for groups in alternatives:
+                for a, b in zip(groups, groups[1:]):
+                    for x in a:
+                        self.successors.setdefault(x, set()).update(b)
+        else:
+            self.link(tokens)
+        return i
+
+    def link(self, tokens):
+        successors = self.successors
+        for a, b in zip(tokens, tokens[1:]):
+            s = successors.get(a)
+            if s is None:
+                successors[a] = {b}
+            else:
+                s.add(b)
+        # 'ENTRY J501 EXIT' -> J501 is flown from ENTRY to EXIT
+        kinds = _kinds
+        for a, b, c in zip(tokens, tokens[1:], tokens[2:]):
+            if (kinds.get(b) or token_kind(b)) == AIRWAY:
+                self.airways.setdefault(b, set()).add((a, c))
+
+    def add_faa_routes(self, faa_routes):
+        columns = faa_routes.columns
+        for orig, dest, text in zip(columns['Orig'], columns['Dest'], columns['Route String']):
+            self.add(FAA, (orig, dest), text, route_tokens(text, orig, dest))
+
+    def add_loa_routes(self, loa_routes):
+        for row in loa_routes:
+            alternatives = loa_alternatives(row['Route'])
+            tokens = [t for groups in alternatives for options in groups for t in sorted(options)]
+            self.add(LOA, (row['Departure_Regex'], row['Arrival_Regex']), row['Route'], tokens, alternatives)
+
+    def add_aliases(self, aliases):
+        for command, text in aliases.items():
+            self.add(ALIAS, command, text, alias_route_tokens(text))
+
+    def add_flightaware_routes(self, departure, arrival, routes):
+        for r in routes:
+            self.add(FLIGHTAWARE, (departure, arrival), r['Full Route'], route_tokens(r['Full Route'], departure, arrival))
+
+    def ids(self, source=None):
+        return range(len(self.texts)) if source is None else [i for i, s in enumerate(self.sources) if s == source]
+
+    def postings_for(self, source=None):
+        return self.postings if source is None else self.source_postings.get(source, {})
+
+    def through(self, *fixes, source=None):
+        # Ids of the routes passing through every one of the fixes
+        postings = self.postings_for(source)
+        ids = None
+        for fix in fixes:
+            fix_ids = set(postings.get(normalize_token(fix.upper()), ()))
+            ids = fix_ids if ids is None else ids & fix_ids
+            if not ids:
+                return []
+        return sorted(ids or ())
+
+    def covered_by(self, route, source=None, departure='', arrival=''):
+        # Ids of the routes whose every fix (or, for LOA routes, one option of
+        # every group of one alternative) appears in the given route. Only
+        # routes sharing at least one token with it are examined.
+        filed = set(route_tokens(route, departure, arrival) if isinstance(route, str) else route)
+        postings = self.postings_for(source)
+        candidates = set()
+        for t in filed:
+            candidates.update(postings.get(t, ()))
+        results = []
+        for i in sorted(candidates):
+            alternatives = self.alternatives.get(i)
+            if alternatives is not None:
+                if any(groups and all(options & filed for options in groups) for groups in alternatives):
+                    results.append(i)
+            elif filed.issuperset(self.tokens[i]):
+                results.append(i)
+        return results
+
+    def next_fixes(self, fix):
+        return sorted(self.successors.get(normalize_token(fix.upper()), ()))
+
+    def airway_segments(self, airway):
+        # (entry, exit) pairs the airway is used between in the indexed routes
+        return sorted(self.airways.get(airway.upper(), ()))
+
+    def route(self, i):
+        return {'source': self.sources[i], 'key': self.keys[i], 'text': self.texts[i], 'tokens': self.tokens[i]}
+
+def build_route_index(faa_routes=None, loa_routes=None, aliases=None):
+    index = RouteIndex()
+    if faa_routes is not None:
+        index.add_faa_routes(faa_routes)
+    if loa_routes is not None:
+        index.add_loa_routes(loa_routes)
+    if aliases is not None:
+        index.add_aliases(aliases)
+    return index
+
+if __name__ == '__main__':
+    import argparse
+    from zoa_data import DataRegistry
+
+    parser = argparse.ArgumentParser(description='Find preferred, LOA and alias routes by fix')
+    parser.add_argument('fixes', nargs='*', help='routes through all of these fixes/airways/procedures')
+    parser.add_argument('--covered-by', metavar='ROUTE', help='routes fully contained in this filed route')
+    parser.add_argument('--source', choices=[FAA, LOA, ALIAS])
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args()
+
+    index = DataRegistry(args.data_dir).route_index
+    if args.covered_by:
+        ids = index.covered_by(args.covered_by, args.source)
+    else:
+        ids = index.through(*args.fixes, source=args.source)
+    for i in ids:
+        key = index.keys[i] if isinstance(index.keys[i], str) else '%s-%s' % index.keys[i]
+        print('%-6s %-22s %s' % (index.sources[i], key, index.texts[i]))
+    print('%d routes' % len(ids))
@@ -0,0 +1,130 @@
+import io
+import os
+import csv
+import threading
+import numpy as np
+
+FALLBACK = -1
+FALLBACK_TEXT = 'Use Runway %s with headwind %d kts'
+
+class AirportRunways:
+    # Runway headings and configurations of one airport as NumPy arrays.
+    # Configurations are sorted by priority; members[c, r] says whether
+    # runway r is used by configuration c.
+    def __init__(self, airport, runways, configs):
+        self.airport = airport
+        self.runways = [r['Runway'] for r in runways]
+        self.headings = np.radians([float(r['Heading']) for r in runways])
+        configs = sorted(configs, key=lambda c: int(c['Priority']))
+        self.configs = [c['Config'] for c in configs]
+        self.members = np.array([[rw in c['Runways'].split() for rw in self.runways] for c in configs], dtype=bool)
+        self.max_tailwind = np.array([float(c['Max_Tailwind']) for c in configs])
+        self.max_crosswind = np.array([float(c['Max_Crosswind']) for c in configs])
+        self.calm_wind = float(configs[0]['Calm_Wind']) if configs else 0.0
+
+    def components(self, wind_deg, wind_kts):
+        # (N, R) headwind and crosswind for N winds; NaN directions (VRB) give 0
+        wind_deg = np.asarray(wind_deg, dtype=float)
+        wind_kts = np.asarray(wind_kts, dtype=float)
+        alpha = np.radians(wind_deg)[:, None] - self.headings[None, :]
+        speed = np.where(np.isnan(wind_deg), 0.0, wind_kts)[:, None]
+        return np.nan_to_num(speed * np.cos(alpha)), np.nan_to_num(speed * np.sin(alpha))
+
+    def evaluate(self, wind_deg, wind_kts, gust_kts=None):
+        # Returns (headwind, crosswind, config index or FALLBACK, best headwind runway).
+        # Limits are checked against the gust where one is reported; below
+        # the calm wind threshold the first configuration is always used.
+        headwind, crosswind = self.components(wind_deg, wind_kts)
+        limit_head, limit_cross = headwind, crosswind
+        if gust_kts is not None:
+            gust = np.asarray(gust_kts, dtype=float)
+            gust = np.where(np.isnan(gust), np.asarray(wind_kts, dtype=float), gust)
+            limit_head, limit_cross = self.components(wind_deg, gust)
+        ok = ((limit_head[:, None, :] > -self.max_tailwind[None, :, None]) &
+              (np.abs(limit_cross)[:, None, :] < self.max_crosswind[None, :, None]))
+        config_ok = np.all(ok | ~self.members[None, :, :], axis=2)
+        config = np.where(config_ok.any(axis=1), np.argmax(config_ok, axis=1), FALLBACK)
+        config = np.where(np.asarray(wind_kts, dtype=float) < self.calm_wind, 0, config)
+        return headwind, crosswind, config, np.argmax(headwind, axis=1)
+
+    def describe(self, config, best_runway, headwind):
+        if config == FALLBACK:
+            return FALLBACK_TEXT % (self.runways[best_runway], headwind[best_runway])
+        return self.configs[config]
+
+class RunwayConfigEngine:
+    def __init__(self, runway_rows, config_rows):
+        runways = {}
+        configs = {}
+        for row in runway_rows:
+            runways.setdefault(row['Airport'], []).append(row)
+        for row in config_rows:
+            configs.setdefault(row['Airport'], []).append(row)
+        self.airports = {a: AirportRunways(a, rws, configs.get(a, [])) for a, rws in runways.items()}
+
+    def __contains__(self, airport):
+        return airport in self.airports
+
+    def recommend(self, airport, wind_deg, wind_kts, gust_kts=None):
+        a = self.airports[airport]
+        headwind, crosswind, config, best = a.evaluate([wind_deg], [wind_kts], None if gust_kts is None else [gust_kts])
+        return a.describe(config[0], best[0], headwind[0])
+
+    def components(self, airport, wind_deg, wind_kts):
+        # [(runway, headwind, crosswind)] for one wind
+        a = self.airports[airport]
+        headwind, crosswind = a.components([wind_deg], [wind_kts])
+        return [(rw, headwind[0, i], crosswind[0, i]) for i, rw in enumerate(a.runways)]
+
+    def recommend_batch(self, metars):
+        # metars: iterable of METAR records (station_id, wind_dir_degrees,
+        # wind_speed_kt, wind_gust_kt). Evaluates every airport's METARs in one
+        # vectorized pass and returns the recommendation for each record, in
+        # order; None for stations without runway data.
+        metars = list(metars)
+        results = [None] * len(metars)
+        groups = {}
+        for i, m in enumerate(metars):
+            if m.get('station_id') in self.airports:
+                groups.setdefault(m['station_id'], []).append(i)
+        for airport, idx in groups.items():
+            a = self.airports[airport]
+            winds = np.array([metar_wind(metars[i]) for i in idx], dtype=float).reshape(-1, 3)
+            headwind, crosswind, config, best = a.evaluate(winds[:, 0], winds[:, 1], winds[:, 2])
+            for j, i in enumerate(idx):
+                results[i] = a.describe(config[j], best[j], headwind[j])
+        return results
+
+    def recommend_all(self, metars):
+        # {station: recommendation} for a station -> METAR map
+        stations = [s for s in metars if s in self.airports]
+        return dict(zip(stations, self.recommend_batch(metars[s] for s in stations)))
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+def metar_wind(metar):
+    # (direction, speed, gust) from a METAR record; VRB/missing values are NaN
+    return (to_float(metar.get('wind_dir_degrees')), to_float(metar.get('wind_speed_kt')) if metar.get('wind_speed_kt') else 0.0,
+            to_float(metar.get('wind_gust_kt')))
+
+def load_csv(csv_filename):
+    with io.open(csv_filename, 'r', encoding='utf8') as file:
+        return list(csv.DictReader(file, delimiter=','))
+
+def load_runway_engine(data_dir='data'):
+    return RunwayConfigEngine(load_csv(os.path.join(data_dir, 'runways.csv')),
+                              load_csv(os.path.join(data_dir, 'runway_configs.csv')))
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def default_runway_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = load_runway_engine()
+    return _engine
@@ -0,0 +1,213 @@
+import sys
+if __name__ == '__main__' and '--gevent' in sys.argv:
+    # gevent has to patch the standard library before anything else imports it
+    from gevent import monkey
+    monkey.patch_all()
+
+import os
+import json
+import time
+import argparse
+import threading
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+import bottle
+import zoa_perf
+from zoa_data import DataRegistry
+from zoa_cache import TTLCache
+from zoa_compliance import ComplianceChecker
+from zoa_prefroutes import faa_identifier
+from zoa_codes import sanitize_airport
+
+HOST = '127.0.0.1'
+PORT = 8080
+
+# Seconds a serialized response is reused. Data responses only change when a
+# data file is edited (they are dropped then); weather has its own cache in
+# zoa_wx behind this.
+RESPONSE_TTLS = {
+    'data'    : 60 * 60,
+    'weather' : 30
+}
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+class ThreadedServer(bottle.ServerAdapter):
+    # wsgiref with a thread per request, so slow weather requests don't hold
+    # up data lookups
+    def run(self, app):
+        self.srv = make_server(self.host, self.port, app, ThreadingWSGIServer, QuietHandler)
+        self.port = self.srv.server_port
+        self.srv.serve_forever()
+
+class LookupAPI:
+    # JSON endpoints over one DataRegistry. Successful responses are
+    # serialized once and kept in a TTL cache keyed by path and query.
+    def __init__(self, data, weather=None, runway_engine=None):
+        self.data = data
+        self.weather = weather
+        self.runway_engine = runway_engine
+        self.compliance = ComplianceChecker(data)
+        self.cache = TTLCache(max_entries=10000, ttls=RESPONSE_TTLS)
+        self.started = time.time()
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.app = bottle.Bottle()
+        routes = [
+            ('/api/health', self.health, None),
+            ('/api/stats', self.stats, None),
+            ('/api/airports/<code>', self.airport, 'data'),
+            ('/api/airlines/<code>', self.airline, 'data'),
+            ('/api/aircraft/<code>', self.aircraft, 'data'),
+            ('/api/aliases', self.aliases, 'data'),
+            ('/api/routes/faa/<departure>/<arrival>', self.faa_routes, 'data'),
+            ('/api/routes/loa/<departure>/<arrival>', self.loa_routes, 'data'),
+            ('/api/routes/check/<departure>/<arrival>', self.check_route, 'data'),
+            ('/api/routes/digest/<departure>/<arrival>', self.route_digest, 'data'),
+            ('/api/weather/<airport>', self.airport_weather, 'weather'),
+            ('/api/weather', self.briefing, 'weather')
+        ]
+        for path, handler, namespace in routes:
+            self.app.route(path, 'GET', self.endpoint(path, handler, namespace))
+
+    def data_changed(self, names):
+        # Runs on the registry's watcher thread after a data file was reloaded
+        self.compliance.clear()
+        self.cache.invalidate('data')
+
+    def endpoint(self, path, handler, namespace):
+        def serve(**kwargs):
+            with self.lock:
+                self.requests += 1
+            key = bottle.request.fullpath + '?' + bottle.request.query_string
+            with zoa_perf.action(path):
+                if namespace:
+                    found, cached = self.cache.get(namespace, key)
+                    if found:
+                        return self.respond(*cached)
+                with zoa_perf.timer('handle'):
+                    try:
+                        status, payload = handler(**kwargs)
+                    except FileNotFoundError as e:
+                        # A data file that isn't installed (e.g. airports.csv)
+                        status, payload = 503, {'error': '%s is not available' % os.path.basename(e.filename)}
+                with zoa_perf.timer('render.json'):
+                    body = json.dumps(payload).encode('utf8')
+            if namespace and status == 200:
+                self.cache.set(namespace, key, (status, body))
+            return self.respond(status, body)
+        return serve
+
+    def respond(self, status, body):
+        bottle.response.status = status
+        bottle.response.content_type = 'application/json'
+        return body
+
+    def not_found(self, what):
+        return 404, {'error': '%s not found' % what}
+
+    def health(self):
+        return 200, {'status': 'ok', 'uptime': round(time.time() - self.started, 1),
+                     'loaded': sorted(name for name in ('airports', 'airlines', 'aircraft', 'faa_routes', 'loa_routes', 'aliases')
+                                      if self.data.is_loaded(name))}
+
+    def stats(self):
+        return 200, {'requests': self.requests, 'cache': self.cache.stats()}
+
+    def airport(self, code):
+        row = self.data.airports.get(sanitize_airport(code))
+        return (200, dict(row)) if row else self.not_found('Airport %s' % code)
+
+    def airline(self, code):
+        row = self.data.airlines.get(code.upper())
+        return (200, dict(row)) if row else self.not_found('Airline %s' % code)
+
+    def aircraft(self, code):
+        row = self.data.aircraft.get(code.upper())
+        return (200, dict(row)) if row else self.not_found('Aircraft %s' % code)
+
+    def aliases(self):
+        query = bottle.request.query.getunicode('q', default='')
+        limit = bottle.request.query.get('limit') or '50'
+        if not limit.isdigit():
+            return 400, {'error': 'limit must be a whole number'}
+        limit = int(limit)
+        return 200, [{'command': c, 'text': t} for c, t in self.data.alias_index.search(query, limit)]
+
+    def faa_routes(self, departure, arrival):
+        return 200, self.data.faa_routes.lookup(faa_identifier(departure), faa_identifier(arrival))
+
+    def loa_routes(self, departure, arrival):
+        return 200, self.data.loa_engine.match(sanitize_airport(departure), sanitize_airport(arrival))
+
+    def check_route(self, departure, arrival):
+        route = bottle.request.query.getunicode('route', default='')
+        return 200, self.compliance.check(sanitize_airport(departure), sanitize_airport(arrival), route)
+
+    def route_digest(self, departure, arrival):
+        # One keyed read of the precomputed digest (python zoa_digest.py)
+        from zoa_digest import lookup_digest
+        return 200, lookup_digest(self.data, sanitize_airport(departure), sanitize_airport(arrival))
+
+    def airport_weather(self, airport):
+        airport = sanitize_airport(airport)
+        return 200, self.weather_report(airport, *self.weather.briefing([airport])[airport])
+
+    def briefing(self):
+        airports = [sanitize_airport(a) for a in bottle.request.query.get('airports', '').split(',') if a]
+        if not airports:
+            return 400, {'error': 'airports=KSFO,KOAK,... is required'}
+        return 200, {a: self.weather_report(a, atis, metar) for a, (atis, metar) in self.weather.briefing(airports).items()}
+
+    def weather_report(self, airport, atis, metar):
+        report = {'airport': airport, 'atis': atis, 'metar': metar, 'runway_config': None}
+        if isinstance(metar, dict) and self.runway_engine and airport in self.runway_engine:
+            report['runway_config'] = self.runway_engine.recommend_all({airport: metar}).get(airport)
+        return report
+
+def make_api(data_dir='data', preload=True):
+    from zoa_wx import default_client
+    from zoa_runways import load_runway_engine
+    data = DataRegistry(data_dir)
+    if preload:
+        data.prefetch(['airports', 'airlines', 'aircraft', 'faa_routes', 'alias_index', 'loa_engine'], background=False)
+    api = LookupAPI(data, default_client(), load_runway_engine(data_dir))
+    data.watch(callback=api.data_changed)
+    return api
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve ZOA lookups, routes and weather as JSON')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--gevent', action='store_true', help='serve with gevent instead of a thread per request')
+    parser.add_argument('--weather-standin', metavar='URL', help='send weather requests to a stand-in (benchmarks/standin.py)')
+    parser.add_argument('--profile', nargs='?', const='1', metavar='TRACE',
+                        help='report time per endpoint at exit, optionally with a .prof or .folded trace (see zoa_perf)')
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        # SIGTERM exits normally so the report is still printed
+        import signal
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        zoa_perf.enable(None if args.profile == '1' else args.profile)
+
+    if args.weather_standin:
+        # Stand-in weather is kept out of the on-disk cache
+        import zoa_wx, zoa_cache
+        zoa_cache.DISK_CACHE_PATH = None
+        zoa_wx.DATIS_URL = args.weather_standin.rstrip('/') + '/api/'
+        zoa_wx.METAR_URL = args.weather_standin.rstrip('/') + '/metar?'
+    start = time.perf_counter()
+    api = make_api(args.data_dir)
+    print('Loaded data in %.2fs' % (time.perf_counter() - start))
+    bottle.run(api.app, server='gevent' if args.gevent else ThreadedServer, host=args.host, port=args.port, quiet=True)
+
+if __name__ == '__main__':
+    main()
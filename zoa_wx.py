@@ -1,32 +1,31 @@
-from cgitb import text
-from http.client import REQUESTED_RANGE_NOT_SATISFIABLE
 import os
-import requests
 import json
-from bs4 import BeautifulSoup
 import math
-from InquirerPy import inquirer
-import xmltodict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
 import re
-from tabulate import tabulate
+import urllib.parse
+from zoa_cache import default_cache, not_error
+from zoa_metar import parse_metars, parse_raw_metar
+from zoa_perf import timer, count, bind
 
 h = {
     "Cache-Control": "no-cache",
     "Pragma": "no-cache"
 }
 
-def get_atis(airport):
-    try:
-        base_url = 'http://datis.clowd.io/api/'
-        full_url = base_url + airport
-        r = requests.get(full_url, headers=h)
-        return json.loads(r.text)[0]['datis']
-    except:
-        return "ERROR: NO D-ATIS FOUND"
+DATIS_URL = 'http://datis.clowd.io/api/'
+METAR_URL = 'https://www.aviationweather.gov/adds/dataserver_current/httpparam?'
 
-def get_latest_metar(airport, last_hours=2):
-    base_url = 'https://www.aviationweather.gov/adds/dataserver_current/httpparam?'
-    full_url = base_url
+# (connect, read) timeouts in seconds for every weather request
+DEFAULT_TIMEOUT = (3.05, 10)
+ZOA_MAJORS = ['KSFO', 'KOAK', 'KSJC', 'KSMF', 'KRNO']
+
+ATIS_ERROR = 'ERROR: NO D-ATIS FOUND'
+METAR_ERROR = 'ERROR: METAR NOT FOUND OR UNAVAILABLE'
+
+def metar_url(airport, last_hours=2):
     params = {
         'dataSource' : 'metars',
         'requestType' : 'retrieve',
@@ -35,96 +34,248 @@ def get_latest_metar(airport, last_hours=2):
         'stationString' : airport,
         'hoursBeforeNow' : last_hours
     }
-    first = True
-    for k, v in params.items():
-        if first:
-            full_url += '%s=%s' % (k, v)
-            first = False
-        else:
-            full_url += '&%s=%s' % (k,v)
-    r = requests.get(full_url, headers=h)
-    print(full_url)
-    soup = BeautifulSoup(r.text, features='xml')
-
-    x = xmltodict.parse(r.text)
-    metar_dict = x['response']['data']['METAR']
-    return metar_dict
-
-    #metars = soup.find_all('METAR')
-    #metar_dicts = []
-    #for m in metars:
-    #    m_dict = {}
-    #    for v in m.children:
-    #        m_dict[v.name] = v.text
-    #return soup.find('raw_text').text
-
-def calc_wind_components(headwind_deg, wind_deg, wind_kts):
-    alpha = wind_deg - headwind_deg 
-    return (wind_kts * math.cos(math.radians(alpha)), wind_kts * math.sin(math.radians(alpha)))
-
-def max_headwind(runway_components):
-    max = -999
-    max_rw = None
-    for rw, (headwind, crosswind) in runway_components.items():
-        if headwind > max:
-            max = headwind
-            max_rw = rw
-    return rw
-
-def sfo_runway_config(metar=None, print_table=True):
-    wind_deg = 0
-    wind_speed = 0
-    runways = {
-        '28' : 284.5,
-        '10' : 104.5,
-        '01' : 14.5,
-        '19' : 194.5
+    return METAR_URL + urllib.parse.urlencode(params)
 
+def bulk_metar_url(airports, last_hours=2):
+    # One request for many stations, latest observation of each
+    params = {
+        'dataSource' : 'metars',
+        'requestType' : 'retrieve',
+        'format' : 'xml',
+        'mostRecentForEachStation' : 'constraint',
+        'stationString' : ','.join(airports),
+        'hoursBeforeNow' : last_hours
     }
-    wind_components = {}
-    if metar:
-        exp = re.compile(r'(?P<wind_deg>[0-9]{3})(?P<wind_spd>[0-9]{2})KT')
-        m = exp.match(metar)
-        wind_deg = int(m.group('wind_deg'))
-        wind_speed = int(m.group('wind_spd'))
-    else:
-        metar = get_latest_metar('KSFO')
-        wind_deg = int(metar['wind_dir_degrees'])
-        wind_speed = int(metar['wind_speed_kt'])
-    
-    for rw, rw_deg in runways.items():
-        wind_components[rw] = calc_wind_components(rw_deg, wind_deg, wind_speed)
-    
-    if print_table:
-        table = []
-        for k, v in wind_components.items():
-            table.append([k, v[0], v[1]])
-        print(tabulate(table, headers=['Runway', 'Headwind', 'Crosswind'], floatfmt='.0f'))
-
-    if wind_speed < 10:
-        return 'Norm Ops'
-    else:
-        if wind_components['01'][0] > -10 and abs(wind_components['01'][1]) < 20: 
-            if wind_components['28'][0] > -10 and abs(wind_components['28'][1]) < 20:
-                return 'Norm Ops'
-            else:
-                if wind_components['19'][0] > -10 and abs(wind_components['19'][1]) < 20 and wind_components['10'][0] > -10 and abs(wind_components['10'][1]):
-                    return 'East Ops'
-                else:
-                    max_hw_rw = max_headwind(wind_components)
-                    return 'Use Runway %s with headwind %d kts' % (max_hw_rw, wind_components[max_hw_rw][0])
-        else:
-            if wind_components['28'][0] > -10 and abs(wind_components['28'][1]) < 20:
-                return 'West Ops'
+    return METAR_URL + urllib.parse.urlencode(params)
+
+class WeatherClient:
+    # Fetches D-ATIS and METARs over one pooled keep-alive session on a small
+    # thread pool. Concurrent requests for the same station share one fetch and
+    # successful responses are kept in the TTL cache.
+    def __init__(self, max_workers=10, timeout=DEFAULT_TIMEOUT, cache=None):
+        self.timeout = timeout
+        self.cache = cache
+        self.max_workers = max_workers
+        self._session = None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='zoa-wx')
+        self._inflight = {}
+        self._validators = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Created on first use, so cache hits never import requests
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    session.headers.update(h)
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def get_if_changed(self, url, **kwargs):
+        # Conditional GET: sends the ETag/Last-Modified of the previous response
+        # for this url and returns None when the server answers 304 or the body
+        # is byte-for-byte the same as last time, else the response
+        validators = self._validators.get(url, {})
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        r = self.get(url, headers=headers, **kwargs)
+        if r.status_code == 304:
+            return None
+        r.raise_for_status()
+        digest = hash(r.content)
+        if digest == validators.get('digest'):
+            return None
+        self._validators[url] = {'etag': r.headers.get('ETag'), 'last_modified': r.headers.get('Last-Modified'), 'digest': digest}
+        return r
+
+    def submit(self, key, fn, *args):
+        if self.cache:
+            found, value = self.cache.get(*key)
+            if found:
+                future = Future()
+                future.set_result(value)
+                return future
+        with self._lock:
+            future = self._inflight.get(key)
+            started = future is None
+            if started:
+                future = self.executor.submit(bind(fn), *args)
+                self._inflight[key] = future
+        # Outside the lock: a future that is already done runs the callback
+        # right away, and _done takes the lock
+        if started:
+            future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def cached(self, namespace, key, fetch):
+        if self.cache is None:
+            return fetch()
+        return self.cache.get_or_fetch(namespace, key, fetch, cacheable=not_error)
+
+    def fetch_atis(self, airport):
+        def fetch():
+            try:
+                with timer('fetch.atis'):
+                    r = self.get(DATIS_URL + airport)
+                count('bytes.atis', len(r.content))
+                return json.loads(r.text)[0]['datis']
+            except:
+                return ATIS_ERROR
+        return self.cached('atis', airport, fetch)
+
+    def fetch_metar(self, airport, last_hours=2):
+        def fetch():
+            try:
+                import xmltodict
+                with timer('fetch.metar'):
+                    r = self.get(metar_url(airport, last_hours))
+                count('bytes.metar', len(r.content))
+                with timer('parse.metar'):
+                    x = xmltodict.parse(r.text)
+                return x['response']['data']['METAR']
+            except:
+                return METAR_ERROR
+        if last_hours != 2:
+            return fetch()
+        return self.cached('metar', airport, fetch)
+
+    def fetch_metars(self, airports, last_hours=2):
+        # Bulk METAR fetch: stations still in the cache are skipped and the
+        # response is parsed while it streams in. Returns {station: record},
+        # stations without a METAR are left out.
+        metars = {}
+        missing = []
+        for airport in airports:
+            found, value = self.cache.get('metar', airport) if self.cache else (False, None)
+            if found:
+                metars[airport] = value
             else:
-                if wind_components['19'][0] > -10 and abs(wind_components['19'][1]) < 20 and wind_components['10'][0] > -10 and abs(wind_components['10'][1]):
-                    return 'East Ops'
-                else:
-                    max_hw_rw = max_headwind(wind_components)
-                    return 'Use Runway %s with headwind %d kts' % (max_hw_rw, wind_components[max_hw_rw][0])
+                missing.append(airport)
+        if missing:
+            try:
+                start = time.perf_counter()
+                # Parsed while it streams in, so the timer covers both
+                with timer('fetch.metars'), self.get(bulk_metar_url(missing, last_hours), stream=True) as r:
+                    r.raw.decode_content = True
+                    fetched = parse_metars(r.raw)
+                    count('bytes.metar', r.raw.tell())
+                if self.cache:
+                    self.cache.count('metar', 'misses')
+                    self.cache.count('metar', 'fetch_seconds', time.perf_counter() - start)
+                    for station, metar in fetched.items():
+                        self.cache.set('metar', station, metar)
+                metars.update(fetched)
+            except:
+                pass
+        return metars
+
+    def metars_async(self, airports):
+        # {airport: future} backed by a single bulk request
+        futures = {a: Future() for a in airports}
+        def resolve(bulk):
+            metars = bulk.result() if not bulk.exception() else {}
+            for a, f in futures.items():
+                f.set_result(metars.get(a, METAR_ERROR))
+        bulk = self.submit(('metars', ','.join(airports)), self.fetch_metars, airports)
+        bulk.add_done_callback(resolve)
+        return futures
+
+    def atis_async(self, airport):
+        return self.submit(('atis', airport), self.fetch_atis, airport)
+
+    def metar_async(self, airport):
+        return self.submit(('metar', airport), self.fetch_metar, airport)
+
+    def briefing_async(self, airports):
+        # Starts every fetch immediately (all METARs in one request);
+        # returns {airport: (atis future, metar future)}
+        metars = self.metars_async(airports)
+        return {a: (self.atis_async(a), metars[a]) for a in airports}
+
+    def briefing(self, airports):
+        futures = self.briefing_async(airports)
+        return {a: (atis.result(), metar.result()) for a, (atis, metar) in futures.items()}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+
+_client = None
+_client_lock = threading.Lock()
 
+def default_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = WeatherClient(cache=default_cache())
+    return _client
+
+def get_atis(airport):
+    return default_client().atis_async(airport).result()
+
+def get_latest_metar(airport, last_hours=2):
+    if last_hours != 2:
+        return default_client().fetch_metar(airport, last_hours)
+    return default_client().metar_async(airport).result()
+
+def parse_wind_group(text):
+    # None if there is no wind group (e.g. the error text of a failed fetch)
+    m = re.search(r'(?P<wind_deg>[0-9]{3}|VRB)(?P<wind_spd>[0-9]{2,3})(G(?P<gust>[0-9]{2,3}))?KT', text)
+    if m is None:
+        return None
+    return {'wind_dir_degrees': m.group('wind_deg'), 'wind_speed_kt': m.group('wind_spd'), 'wind_gust_kt': m.group('gust')}
+
+def runway_config(airport, metar=None, print_table=True):
+    # metar can be raw METAR text, a bare wind group ('28015G25KT'), a METAR dict from get_latest_metar
+    # (avoids fetching it twice) or None to fetch the latest METAR for the airport.
+    # Runways, configurations and limits come from data/runways.csv and
+    # data/runway_configs.csv. None for an airport without runway data or
+    # when there is no wind to go by (failed fetch, no wind group).
+    from zoa_runways import default_runway_engine, metar_wind
+    engine = default_runway_engine()
+    if airport not in engine:
+        return None
+    if isinstance(metar, str):
+        metar = parse_raw_metar(metar) or parse_wind_group(metar)
+    elif metar is None:
+        metar = get_latest_metar(airport)
+    if not isinstance(metar, dict):
+        return None
+    wind_deg, wind_speed, gust = metar_wind(metar)
+    gust = None if math.isnan(gust) else gust
+
+    if print_table:
+        from tabulate import tabulate
+        table = [[rw, headwind, crosswind] for rw, headwind, crosswind in engine.components(airport, wind_deg, wind_speed)]
+        with timer('render.table'):
+            print(tabulate(table, headers=['Runway', 'Headwind', 'Crosswind'], floatfmt='.0f'))
+    return engine.recommend(airport, wind_deg, wind_speed, gust)
+
+def sfo_runway_config(metar=None, print_table=True):
+    return runway_config('KSFO', metar, print_table)
 
 if __name__ == '__main__':
+    from InquirerPy import inquirer
     os.system('cls' if os.name == 'nt' else 'clear')
 
     while True:
@@ -133,8 +284,9 @@ if __name__ == '__main__':
         ).execute()
         if len(airport) == 3:
             airport = 'k' + airport
-        print(get_atis(airport.upper()), end='\n\n')
-        print(get_latest_metar(airport.upper())['raw_text'], end='\n\n')
+        atis, metar = default_client().briefing([airport.upper()])[airport.upper()]
+        print(atis, end='\n\n')
+        print(metar['raw_text'] if isinstance(metar, dict) else metar, end='\n\n')
         #x = sfo_runway_config('25030KT')
-        x = sfo_runway_config()
-        print(x)
\ No newline at end of file
+        x = sfo_runway_config(metar if airport.upper() == 'KSFO' else None)
+        print(x)